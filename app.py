@@ -1,163 +1,290 @@
 import pygame
 import numpy as np
-import time
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-from tkinter import Tk, filedialog
 import platform
 import os
-from typing import Optional, Generator
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
-from components.buttons import draw_button, draw_radio_button, handle_hover_effect
+from components.buttons import handle_hover_effect
+from components.overview_strip import OverviewStrip
+from components.profiling_overlay import ProfilingOverlay
+from components.signal_plot import SignalPlot
+from components.widgets import Button, RadioButton, Label, TextBox, get_font
 
 from utils.signal_loader import SignalReader, get_signal_reader
-from utils.signal_analyser import HPSignalAnalyser, DLSignalAnalyser
-from utils.tagging_helpers import TaggedSignal
+from utils.live_signal_reader import BackpressurePolicy, LiveSignalReader
+from utils.signal_analyser import HPSignalAnalyser, IncrementalSignalAnalyser, DLSignalAnalyser
+from utils.analysis_cache import AnalysisCache, file_digests, model_fingerprint
+from utils.analysis_worker import AnalysisWorker
+from utils.signal_quality import SignalQualityGate
+from utils.metrics_calculations import calculate_rmssd
+from utils.tagging_helpers import TaggedSignal, merge_peaks, shift_peaks, toggle_peak
+from utils.tag_store import TagStore, TagWriter
+from utils.overview_index import OverviewIndex, overview_cache_path
+from utils.profiling import profiler
 from utils.constants import *
 
 
 class ECGViewer:
-    def __init__(self, window_size=1536, window_step=128, model_path=None):
+    # Signal plot and the whole-recording overview strip below it
+    PLOT_RECT = pygame.Rect(SIDEBAR_WIDTH + 5, SCREEN_HEIGHT * 0.05, (SCREEN_WIDTH - SIDEBAR_WIDTH) * 0.95, SCREEN_HEIGHT * 0.8)
+    OVERVIEW_RECT = pygame.Rect(PLOT_RECT.left + SignalPlot.LABEL_MARGIN, PLOT_RECT.bottom + 5,
+                                PLOT_RECT.width - SignalPlot.LABEL_MARGIN, SCREEN_HEIGHT * 0.1 - 10)
+    # Zooming out multiplies the visible span by this factor
+    ZOOM_FACTOR = 4
+    # Clicks in the peak editor snap to the highest sample within this many seconds
+    PEAK_SNAP_SECONDS = 0.06
+    # Windows tagged from the suggestions after the current one when bulk tagging
+    BULK_TAG_WINDOWS = 16
+    # Detected peaks of this many recently analysed windows are kept as tagging suggestions
+    DETECTED_PEAKS_KEPT = 256
+
+    def __init__(self, window_size=1536, window_step=128, model_path=None, prefetch_windows=32, model_backend="eager",
+                 incremental=False, use_cache=True, profile=False, trace_path=None, live_policy="drop",
+                 live_buffer_seconds=LiveSignalReader.BUFFER_SECONDS, quality_gating=True, resample_rate=None):
         self.window_size: int = window_size
         self.window_step: int = window_step
+        self.prefetch_windows: int = prefetch_windows
+        # Records are resampled to the model's rate unless another rate is given, 0 analyses them at their own rate
+        if resample_rate is None and model_path:
+            resample_rate = DLSignalAnalyser.MODEL_SAMPLING_RATE
+        self.resample_rate: Optional[float] = resample_rate or None
 
         self.signal_path: str = None
         self.signal_name: str = ""
         self.current_position: str = ""
         self.selected_reader: str = "apple"
-        self.signal_reader: SignalReader = get_signal_reader(self.selected_reader)
+        self.signal_reader: SignalReader = get_signal_reader(self.selected_reader, target_rate=self.resample_rate)
 
         # Sampling rate input defaults to 512 Hz which is used in attached signals
         self.sampling_rate_input = "512"
         self.sampling_rate_active = False
+        # Rate of files whose header has none, committed from the sampling rate box
+        self.default_sampling_rate: float = 512.0
 
-        self.max_analysed_index = 0
-        self.hp_signal_analyser = HPSignalAnalyser(int(self.sampling_rate_input), 100)
-        self.dl_signal_analyser = DLSignalAnalyser(int(self.sampling_rate_input), 100, model_path) if model_path else None
+        # Highest window index whose RMSSD was added to each rolling buffer
+        self.last_buffered_index = {"classic": -1, "ml": -1}
+        if incremental:
+            self.hp_signal_analyser = IncrementalSignalAnalyser(int(self.sampling_rate_input), 100, window_step)
+        else:
+            self.hp_signal_analyser = HPSignalAnalyser(int(self.sampling_rate_input), 100)
+        self.analysis_worker = AnalysisWorker(self.hp_signal_analyser)
+
+        # Flat, clipped and noisy windows are not sent to the analysers, the reason is shown instead
+        self.quality_gate = SignalQualityGate(int(self.sampling_rate_input)) if quality_gating else None
+        self.window_quality: str = ""
+
+        # The model loads in the background so the window shows up before TensorFlow is imported
+        self.dl_signal_analyser: Optional[DLSignalAnalyser] = None
+        self.model_error: Optional[str] = None
+        self.model_future = None
+        if model_path:
+            self.model_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+            self.model_future = self.model_executor.submit(self.load_model, int(self.sampling_rate_input), model_path,
+                                                           model_backend)
+
+        # Results of windows analysed in earlier sessions, keyed by window index. Cached records are
+        # keyed by the analysers too, so with a model the key is only known once the model has loaded
+        self.analysis_cache = AnalysisCache() if use_cache else None
+        self.analyser_fingerprint: Optional[str] = None if model_path else f"{type(self.hp_signal_analyser).__name__}:"
+        self.cache_key: Optional[str] = None
+        self.cached_windows: dict[int, dict] = {}
+        self.uncommitted_windows = 0
+        # Hashing a record on first open takes seconds for large files, so it runs off the render thread
+        # and windows are analysed uncached until the key is known
+        self.cache_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-key")
+        self.cache_key_future = None
 
         self.algo_rmssd = ""
         self.total_algo_rmssd = ""
         self.ml_rmssd = ""
         self.total_ml_rmssd = ""
 
-        self.signal_generator: Optional[Generator[list[float], None, None]] = None
-        self.current_window: Optional[list[float]] = None
+        self.current_window: Optional[np.ndarray] = None
         self.playing: bool = False
+        self.playback_elapsed: int = 0
+
+        self.tag_store: Optional[TagStore] = None
+        self.tag_writer: Optional[TagWriter] = None
+
+        # Peak editor state, the suggested peaks are replaced by results arriving until the user edits them
+        self.editing: bool = False
+        self.edited_peaks: list[int] = []
+        self.peaks_touched: bool = False
+        # (window index, future) of a saved tag being read for the editor
+        self.tag_future = None
+        self.detected_peaks: OrderedDict[int, np.ndarray] = OrderedDict()
+        # (window index, peaks) of the last tagged window, carried over to the windows overlapping it
+        self.last_tagged: Optional[tuple[int, list[int]]] = None
+        self.bulk_tag_queue: deque[int] = deque()
+
+        # A live stream replaces the file reader until the signal is closed
+        self.live: bool = False
+        self.live_policy = BackpressurePolicy(live_policy)
+        self.live_buffer_seconds: float = live_buffer_seconds
+
+        # The overview pyramid is built off the render thread when a signal is opened
+        self.overview_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="overview")
+        self.overview_future = None
+        self.overview: Optional[OverviewIndex] = None
+        # Number of windows spanned by the plot and the (position, zoom) currently drawn
+        self.zoom: int = 1
+        self.plotted_view: Optional[tuple[int, int]] = None
+
+        # The profiler stays disabled, and nearly free, unless the overlay or a trace was requested
+        profiler.configure(profile, tracing=trace_path is not None)
+        self.show_profiler: bool = profile
+        self.trace_path: Optional[str] = trace_path
 
         pygame.init()
+        self.button_font = get_font(BUTTON_FONT_SIZE)
         self.screen: pygame.Surface = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("ECG Signal Viewer")
 
-    def draw_sidebar(self):
+        self.build_widgets()
+        self.full_redraw: bool = True
+
+    def build_widgets(self):
+        # Sidebar buttons and controls, rendered only when their state changes
+        self.open_button = Button(pygame.Rect(20, 80, 160, 40), "Open Signal", LIGHT_GRAY, self.button_font)
+        self.close_button = Button(pygame.Rect(20, 130, 160, 40), "Close Signal", LIGHT_GRAY, self.button_font)
+        self.apple_radio = RadioButton(pygame.Rect(20, 180, 20, 20), "Apple Watch Reader", DARK_GRAY, self.button_font)
+        self.physionet_radio = RadioButton(pygame.Rect(20, 210, 20, 20), "PhysioNet Reader", DARK_GRAY, self.button_font)
+        self.tag_button = Button(pygame.Rect(20, 260, 160, 40), "Tag Current Window", LIGHT_GRAY, self.button_font)
+        self.sampling_rate_box = TextBox(pygame.Rect(20, 350, 160, 30), self.button_font, self.sampling_rate_input)
+        self.overview_strip = OverviewStrip(self.OVERVIEW_RECT)
+
+        # Info bar labels
+        info_font = get_font(24)
+        self.signal_name_label = Label(pygame.Rect(SIDEBAR_WIDTH + 10, 5, SCREEN_WIDTH * 0.5 - SIDEBAR_WIDTH - 20, 20), info_font)
+        self.tagged_label = Label(pygame.Rect(SCREEN_WIDTH * 0.5, 5, SCREEN_WIDTH * 0.3 - 10, 20), info_font)
+        self.position_label = Label(pygame.Rect(SCREEN_WIDTH * 0.8, 5, SCREEN_WIDTH * 0.2, 20), info_font)
+        self.algo_rmssd_label = Label(pygame.Rect(SIDEBAR_WIDTH + 10, SCREEN_HEIGHT - 15, SCREEN_WIDTH * 0.7 - SIDEBAR_WIDTH - 20, 15), info_font)
+        self.ml_rmssd_label = Label(pygame.Rect(SCREEN_WIDTH * 0.7, SCREEN_HEIGHT - 15, SCREEN_WIDTH * 0.3, 15), info_font)
+
+        self.widgets = [self.open_button, self.close_button, self.apple_radio, self.physionet_radio, self.tag_button,
+                        self.sampling_rate_box, self.signal_name_label, self.tagged_label, self.position_label,
+                        self.algo_rmssd_label, self.ml_rmssd_label, self.overview_strip]
+
+        # Store button and radio button rects for event handling
+        self.open_button_rect = self.open_button.rect
+        self.apple_radio_rect = self.apple_radio.rect
+        self.physionet_radio_rect = self.physionet_radio.rect
+        self.close_button_rect = self.close_button.rect
+        self.tag_button_rect = self.tag_button.rect
+        self.sampling_rate_rect = self.sampling_rate_box.rect
+
+    def draw_sidebar_background(self):
         # Draw the sidebar area
         pygame.draw.rect(self.screen, GREY, (0, 0, SIDEBAR_WIDTH, SCREEN_HEIGHT))
 
         # Draw the sidebar title
-        font = pygame.font.Font(None, 36)
-        text_surface = font.render("Menu", True, BLACK)
+        text_surface = get_font(36).render("Menu", True, BLACK)
         self.screen.blit(text_surface, (20, 20))
 
         # Draw the sidebar border
         pygame.draw.line(self.screen, BLACK, (SIDEBAR_WIDTH, 0), (SIDEBAR_WIDTH, SCREEN_HEIGHT), 2)
 
-        # Add "Open Signal" button
-        open_button_rect = pygame.Rect(20, 80, 160, 40)
-        hover = handle_hover_effect(open_button_rect, pygame.mouse.get_pos())
-        draw_button(self.screen, open_button_rect, LIGHT_GRAY, "Open Signal", BUTTON_FONT, WHITE, hover)
-
-        # Add "Close Signal" button
-        close_button_rect = pygame.Rect(20, 130, 160, 40)
-        hover = handle_hover_effect(close_button_rect, pygame.mouse.get_pos())
-        draw_button(self.screen, close_button_rect, LIGHT_GRAY, "Close Signal", BUTTON_FONT, WHITE, hover)
-
-        # Draw radio buttons for selecting reader
-        apple_radio_rect = pygame.Rect(20, 180, 20, 20)
-        draw_radio_button(self.screen, apple_radio_rect, DARK_GRAY, "Apple Watch Reader", BUTTON_FONT, BLACK, self.selected_reader == "apple")
-
-        physionet_radio_rect = pygame.Rect(20, 210, 20, 20)
-        draw_radio_button(self.screen, physionet_radio_rect, DARK_GRAY, "PhysioNet Reader", BUTTON_FONT, BLACK, self.selected_reader == "physionet")
-
-        # Add "Tag Window" button
-        tag_button_rect = pygame.Rect(20, 260, 160, 40)
-        hover = handle_hover_effect(tag_button_rect, pygame.mouse.get_pos())
-        draw_button(self.screen, tag_button_rect, LIGHT_GRAY, "Tag Current Window", BUTTON_FONT, WHITE, hover)
-
         # Draw "Sampling Rate [Hz]" label
-        label_surface = BUTTON_FONT.render("Sampling Rate [Hz]:", True, BLACK)
+        label_surface = self.button_font.render("Sampling Rate [Hz]:", True, BLACK)
         self.screen.blit(label_surface, (20, 320))
 
-        # Add textbox for sampling rate input
-        sampling_rate_rect = pygame.Rect(20, 350, 160, 30)
-        pygame.draw.rect(self.screen, WHITE, sampling_rate_rect, 2)
-
-        # Render current value in textbox
-        sampling_rate_text = BUTTON_FONT.render(self.sampling_rate_input, True, BLACK)
-        self.screen.blit(sampling_rate_text, (sampling_rate_rect.x + 5, sampling_rate_rect.y + 5))
-
-        # Store button and radio button rects for event handling
-        self.open_button_rect = open_button_rect
-        self.apple_radio_rect = apple_radio_rect
-        self.physionet_radio_rect = physionet_radio_rect
-        self.close_button_rect = close_button_rect
-        self.tag_button_rect = tag_button_rect
-        self.sampling_rate_rect = sampling_rate_rect
-
-    def draw_menu(self):
-        self.screen.fill(GREY)
-        self.draw_sidebar()
-        self.draw_signal_info()
-
-    def draw_signal(self, window_rect):
-        if not self.current_window:
+    def update_sidebar(self):
+        mouse_pos = pygame.mouse.get_pos()
+        self.open_button.set_hover(handle_hover_effect(self.open_button.rect, mouse_pos))
+        self.close_button.set_hover(handle_hover_effect(self.close_button.rect, mouse_pos))
+        self.tag_button.set_hover(handle_hover_effect(self.tag_button.rect, mouse_pos))
+
+        self.apple_radio.set_selected(self.selected_reader == "apple")
+        self.physionet_radio.set_selected(self.selected_reader == "physionet")
+        self.sampling_rate_box.set_text(self.sampling_rate_input)
+
+    def draw_menu(self) -> list[pygame.Rect]:
+        """Repaints the widgets whose state changed and returns the dirty rects."""
+        if self.full_redraw:
+            self.screen.fill(GREY)
+            self.draw_sidebar_background()
+            for widget in self.widgets:
+                widget.mark_dirty()
+
+        self.update_sidebar()
+        self.update_signal_info()
+
+        dirty_rects = [rect for rect in (widget.draw(self.screen) for widget in self.widgets) if rect]
+        return [self.screen.get_rect()] if self.full_redraw else dirty_rects
+
+    def draw_signal(self, window_rect) -> Optional[pygame.Rect]:
+        self.signal_plot.set_rect(window_rect)
+
+        if self.current_window is None:
+            # Clear the plot area once after the signal is closed
+            if self.signal_plot.set_window(None):
+                self.screen.fill(GREY, self.signal_plot.rect)
+                self.signal_plot.dirty = False
+                return self.signal_plot.rect
+            return None
+
+        # Zoomed-out spans are drawn from the overview pyramid instead of the raw samples
+        if self.zoom > 1 and self.overview:
+            view = (int(self.current_position), self.zoom)
+            if view != self.plotted_view:
+                self.plotted_view = view
+                start = view[0] * self.window_step
+                mins, maxs = self.overview.envelope(start, start + self.window_size * self.zoom,
+                                                    self.signal_plot.plot_rect.width, self.signal_reader.signal)
+                self.signal_plot.set_envelope(mins, maxs)
+        else:
+            # The plot keeps its rendered surface until the window or the viewport changes
+            self.plotted_view = None
+            self.signal_plot.set_window(self.current_window)
+            self.signal_plot.set_peaks(self.edited_peaks if self.editing else None)
+        return self.signal_plot.draw(self.screen, force=self.full_redraw)
+
+    def seek(self, index):
+        """Jumps straight to the window with the given index, clamped to the signal."""
+        windows = self.signal_reader.windows
+        if not self.signal_path or len(windows) == 0:
             return
 
-        # Create the matplotlib figure and axis
-        fig, ax = plt.subplots(figsize=(window_rect.width / PLOT_SCALE_FACTOR, window_rect.height / PLOT_SCALE_FACTOR), dpi=100)
-        ax.plot(self.current_window, color='blue')
-        ax.set_ylim(-0.1, 1.1)  # Match the scale to the normalized signal range
-        ax.set_xlim(0, len(self.current_window))
-        ax.grid()
-        y_ticks = np.arange(0, 1.1, 0.1)
-        ax.set_yticks(y_ticks)
-        ax.set_xticklabels([])
-
-        # Draw the figure on a canvas
-        canvas = FigureCanvas(fig)
-        canvas.draw()
-
-        # Get the raw RGBA data from the buffer
-        raw_data = canvas.buffer_rgba()
-
-        # Convert the raw data to a pygame surface
-        size = canvas.get_width_height()
-        signal_surface = pygame.image.frombuffer(raw_data, size, "RGBA")
-
-        # Blit the surface onto the pygame screen
-        self.screen.blit(signal_surface, (window_rect.left, window_rect.top))
-
-        # Close the figure to release memory
-        plt.close(fig)
+        index = max(self.signal_reader.first_window_index, min(index, len(windows) - 1))
+        with profiler.section("reader.next_window"):
+            self.current_window = windows[index]
+        self.current_position = str(index)
+        self.update_rmssd()
+        if self.editing:
+            self.start_editing()
+
+    def set_zoom(self, zoom):
+        # Zooming stops once the whole recording fits on screen
+        max_zoom = 1
+        while self.window_size * max_zoom < len(self.signal_reader.signal):
+            max_zoom *= self.ZOOM_FACTOR
+        self.zoom = max(1, min(zoom, max_zoom))
 
     def next_frame(self):
-        if self.signal_generator:
-            next_window = next(self.signal_generator, None)
-            
-            if next_window is not None:
-                self.current_window = next_window
-                self.current_position = str(self.signal_reader.position_to_index())
-                self.update_rmssd()
+        if not self.signal_path or self.current_window is None:
+            return
 
-                if int(self.current_position) > self.max_analysed_index:
-                    self.max_analysed_index = int(self.current_position)
-            else:
-                self.playing = False
-                self.signal_reader.current_position -= self.window_step
+        index = int(self.current_position) + 1
+        if index < len(self.signal_reader.windows):
+            self.seek(index)
+        else:
+            self.playing = False
+
+    def previous_frame(self):
+        if self.signal_path and self.current_window is not None and int(self.current_position) > 0:
+            self.seek(int(self.current_position) - 1)
 
     def open_signal_file(self):
         if platform.system() == "Darwin":
             # Use macOS specific method to open file dialog
             file_path = os.popen('osascript -e "POSIX path of (choose file)"').read().strip()
         else:
+            # tkinter is only needed for the file dialog
+            from tkinter import Tk, filedialog
+
             root = Tk()
             root.withdraw()
             file_path = filedialog.askopenfilename()
@@ -165,43 +292,245 @@ class ECGViewer:
             root.destroy()
 
         if file_path:
+            if self.live:
+                self.close_signal()
             self.signal_path = file_path
             self.signal_name = os.path.split(file_path)[-1][:-4]
             self.current_position = "0"
-            self.signal_reader.configure_reader(file_path, self.window_size, self.window_step)
-            self.signal_generator = self.signal_reader.stream_normalized_signal()
-            self.current_window = next(self.signal_generator, None)
+            self.reset_analysis()
+            with profiler.section("reader.open"):
+                self.signal_reader.configure_reader(file_path, self.window_size, self.window_step,
+                                                    self.default_sampling_rate)
+            self.apply_sampling_rate(self.signal_reader.sampling_rate)
+            windows = self.signal_reader.windows
+            self.current_window = windows[0] if len(windows) else None
+            self.open_tag_store()
+            self.build_overview()
+            with profiler.section("cache.load"):
+                self.load_cached_windows()
             self.update_rmssd()
-            
+
+    def open_live_signal(self, source):
+        """Starts showing and analysing samples streamed from a socket or stdin as they arrive."""
+        self.close_signal()
+        self.signal_reader = LiveSignalReader(self.live_buffer_seconds, target_rate=self.resample_rate)
+        self.signal_reader.configure_reader(source, self.window_size, self.window_step)
+        self.live = True
+        self.signal_path = source
+        self.signal_name = f"live_{time.strftime('%Y%m%d_%H%M%S')}"
+        self.current_position = "0"
+        self.current_window = None
+        self.playing = True
+        self.open_tag_store()
+
+    def follow_live_signal(self):
+        """Advances to the next live window the backpressure policy allows, while following the stream."""
+        reader = self.signal_reader
+        if reader.sampling_rate and reader.sampling_rate != self.hp_signal_analyser.sampling_frequency:
+            self.apply_sampling_rate(reader.sampling_rate)
+            # Tags are stored per rate, the stream only announces its rate with the first samples
+            self.open_tag_store()
+
+        newest = len(reader.windows) - 1
+        if not self.playing or newest < 0:
+            return
+
+        current = int(self.current_position) if self.current_window is not None else reader.first_window_index - 1
+        skipped = self.live_policy.skipped
+        index = self.live_policy.next_index(current, newest, self.analysis_worker.queue_depth())
+        if index is not None:
+            profiler.count("live.skipped_windows", self.live_policy.skipped - skipped)
+            self.seek(index)
+
+    def apply_sampling_rate(self, sampling_rate):
+        """Sets the rate the analysers and the quality gate work at, and shows it in the sampling rate box."""
+        if not sampling_rate:
+            return
+
+        self.sampling_rate_input = f"{sampling_rate:g}"
+        for analyser in (self.hp_signal_analyser, self.dl_signal_analyser, self.quality_gate):
+            if analyser:
+                analyser.sampling_frequency = sampling_rate
+
     def update_rmssd(self):
-        self.algo_rmssd= self.hp_signal_analyser.calculate_RMSSD(self.current_window)
-        if int(self.current_position) > self.max_analysed_index or self.max_analysed_index == 0:
-            self.total_algo_rmssd = round(self.hp_signal_analyser.buffer.update(self.algo_rmssd),2)
+        """Queues the current window for analysis, the values arrive later through collect_rmssd."""
+        index = int(self.current_position)
+        reader = self.signal_reader
+
+        self.window_quality = self.quality_gate.reasons(self.current_window)[0] if self.quality_gate else ""
+        if self.window_quality:
+            self.apply_rmssd("classic", index, np.nan)
+            if self.dl_signal_analyser:
+                self.apply_rmssd("ml", index, np.nan)
+            return
+
+        # Windows analysed before are served from the cache
+        cached = self.cached_windows.get(index, {})
+        if cached.get("classic_rmssd") is not None and (not self.dl_signal_analyser or cached.get("ml_rmssd") is not None):
+            self.apply_rmssd("classic", index, cached["classic_rmssd"])
+            if self.dl_signal_analyser:
+                self.apply_rmssd("ml", index, cached["ml_rmssd"])
+            return
 
-        if self.dl_signal_analyser:
-            self.ml_rmssd = self.dl_signal_analyser.calculate_RMSSD(self.current_window)
-            if int(self.current_position) > self.max_analysed_index or self.max_analysed_index == 0:
-                self.total_ml_rmssd = round(self.dl_signal_analyser.buffer.update(self.ml_rmssd),2)
+        load_upcoming_windows = None
+        if self.prefetch_windows:
+            load_upcoming_windows = lambda: reader.windows[index:index + self.prefetch_windows]
+
+        self.analysis_worker.submit(index, self.current_window, load_upcoming_windows)
+
+    def collect_rmssd(self):
+        for kind, index, rmssd, peaks in self.analysis_worker.poll():
+            self.apply_rmssd(kind, index, rmssd)
+            self.cache_rmssd(kind, index, rmssd, peaks)
+
+            if peaks is not None:
+                self.detected_peaks[index] = peaks
+                while len(self.detected_peaks) > self.DETECTED_PEAKS_KEPT:
+                    self.detected_peaks.popitem(last=False)
+                if self.editing and not self.peaks_touched and str(index) == self.current_position:
+                    self.edited_peaks = self.suggested_peaks(index)
+
+    def apply_rmssd(self, kind, index, rmssd):
+        analyser = self.hp_signal_analyser if kind == "classic" else self.dl_signal_analyser
+
+        # Every window is added to the rolling buffer only once, even when revisited
+        if index > self.last_buffered_index[kind]:
+            self.last_buffered_index[kind] = index
+            total_rmssd = analyser.buffer.update(rmssd)
+            total_rmssd = "" if total_rmssd is None else round(total_rmssd, 2)
+            if kind == "classic":
+                self.total_algo_rmssd = total_rmssd
+            else:
+                self.total_ml_rmssd = total_rmssd
 
+        if str(index) == self.current_position:
+            if kind == "classic":
+                self.algo_rmssd = rmssd
+            else:
+                self.ml_rmssd = rmssd
+
+    def load_cached_windows(self):
+        self.commit_cache()
+        self.cached_windows = {}
+        self.cache_key = None
+        self.cache_key_future = None
+
+        if self.analysis_cache and self.signal_path:
+            stale_files = self.analysis_cache.stale_files(self.signal_path)
+            if stale_files:
+                self.cache_key_future = self.cache_executor.submit(file_digests, stale_files)
+            else:
+                self.open_cache_record()
+
+    def collect_cache_key(self):
+        if self.cache_key_future is None or not self.cache_key_future.done():
+            return
+
+        future, self.cache_key_future = self.cache_key_future, None
+        if future.exception() is not None:
+            print(f"Could not hash {self.signal_path}, analysis results are not cached: {future.exception()}")
+            return
+        self.analysis_cache.store_digests(future.result())
+        self.open_cache_record()
+        if self.current_window is not None:
+            self.update_rmssd()
+
+    def open_cache_record(self):
+        # Every record file has a stored digest by now, so keying only reads the cache
+        if self.analyser_fingerprint is None:
+            return
+        self.cache_key = self.analysis_cache.record_key(self.signal_path, self.window_size, self.window_step,
+                                                        self.hp_signal_analyser.sampling_frequency,
+                                                        self.analyser_fingerprint, self.signal_reader.lead or "")
+        self.cached_windows = self.analysis_cache.load_record(self.cache_key)
+
+    def cache_rmssd(self, kind, index, rmssd, peaks):
+        if not self.cache_key:
+            return
+
+        values = self.cached_windows.setdefault(index, {})
+        if kind == "classic":
+            values.update(classic_rmssd=rmssd, peaks=peaks)
+            values["norm_min"], values["norm_max"] = self.signal_reader.window_range(index)
+        else:
+            values["ml_rmssd"] = rmssd
+
+        self.analysis_cache.put(self.cache_key, index, **values)
+        self.uncommitted_windows += 1
+        if self.uncommitted_windows >= 64:
+            self.commit_cache()
+
+    def commit_cache(self):
+        if self.analysis_cache and self.cache_key and self.uncommitted_windows:
+            self.analysis_cache.commit(self.cache_key)
+        self.uncommitted_windows = 0
+
+    def reset_analysis(self):
+        self.analysis_worker.reset()
+        self.last_buffered_index = {"classic": -1, "ml": -1}
+        self.detected_peaks.clear()
+        self.last_tagged = None
+        self.stop_editing()
 
     def update_reader(self):
-        self.signal_reader = get_signal_reader(self.selected_reader)
+        # The live stream keeps its reader, the selection applies to the next opened file
+        if self.live:
+            return
+
+        self.signal_reader = get_signal_reader(self.selected_reader, target_rate=self.resample_rate)
+        self.reset_analysis()
+        self.commit_cache()
 
+        # The open file is re-read with the new reader
         if self.signal_path:
-            self.signal_generator = self.signal_reader.stream_normalized_signal(self.signal_path, self.window_size, self.window_step)
-            self.current_window = next(self.signal_generator, None)
+            self.reopen_signal()
+
+    def reopen_signal(self):
+        """Re-reads the open file, e.g. at another rate, staying on the same window where possible."""
+        index = int(self.current_position or 0)
+        self.reset_analysis()
+        self.signal_reader.configure_reader(self.signal_path, self.window_size, self.window_step, self.default_sampling_rate)
+        self.apply_sampling_rate(self.signal_reader.sampling_rate)
+        self.build_overview()
+        self.load_cached_windows()
+        self.open_tag_store()
+        self.current_position = "0"
+        self.current_window = None
+        self.seek(index)
+
+    def commit_sampling_rate(self):
+        """Applies the typed rate to files whose header has none, the open one is re-read at it."""
+        self.sampling_rate_active = False
+        rate = float(self.sampling_rate_input) if self.sampling_rate_input else 0.0
+        if rate <= 0 or self.signal_reader.header_sampling_rate:
+            # The header rate of the open file always wins, the box shows the rate in use again
+            self.sampling_rate_input = f"{self.hp_signal_analyser.sampling_frequency:g}"
+            return
+
+        self.default_sampling_rate = rate
+        if self.signal_path and not self.live:
+            self.commit_cache()
+            self.reopen_signal()
+        elif rate != self.hp_signal_analyser.sampling_frequency:
+            self.apply_sampling_rate(rate)
+            self.reset_analysis()
+            self.load_cached_windows()
+            if self.current_window is not None:
+                self.update_rmssd()
 
     def handle_event(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN:
             if self.sampling_rate_rect.collidepoint(event.pos):
                 self.sampling_rate_active = True
             else:
-                self.sampling_rate_active = False
+                if self.sampling_rate_active:
+                    self.commit_sampling_rate()
                 if self.open_button_rect.collidepoint(event.pos):
                     try:
                         self.open_signal_file()
                     except:
                         self.close_signal()
+                    self.full_redraw = True
 
                 elif self.close_button_rect.collidepoint(event.pos):
                     self.close_signal()
@@ -220,111 +549,381 @@ class ECGViewer:
                     except:
                         self.close_signal()
 
-                elif self.tag_button_rect.collidepoint(event.pos):
-                    tagged_signal = TaggedSignal(self.current_window, [], None)
-                    tagged_signal.tag_window(self.sampling_rate_input)
+                elif self.overview_strip.area.collidepoint(event.pos) and self.overview:
+                    self.seek(self.overview_strip.position_at(event.pos[0]) // self.window_step)
 
-                    signal_name = self.signal_name
+                elif self.tag_button_rect.collidepoint(event.pos) and self.tag_writer:
+                    self.toggle_editing()
 
-                    dir_path = os.path.join(TAGGED_SIGNALS_DIR_NAME, f"size_{self.window_size}", f"step_{self.window_step}")
-
-                    filename = f"{signal_name}_pos_{self.current_position}.json"
-
-                    tagged_signal.save_to_json(dir_path, filename)
+                elif self.editing and self.signal_plot.rect.collidepoint(event.pos):
+                    sample = self.signal_plot.sample_at(event.pos[0])
+                    if sample is not None:
+                        self.edited_peaks = toggle_peak(self.edited_peaks, self.current_window, sample, self.peak_radius())
+                        self.peaks_touched = True
 
         if event.type == pygame.KEYDOWN and self.sampling_rate_active:
             if event.key == pygame.K_BACKSPACE:
                 self.sampling_rate_input = self.sampling_rate_input[:-1]
+            elif event.key in (pygame.K_RETURN, pygame.K_KP_ENTER):
+                self.commit_sampling_rate()
             elif event.unicode.isdigit():
                 self.sampling_rate_input += event.unicode
 
     def close_signal(self):
         self.signal_path = None
         self.signal_name = ""
+        self.close_tag_store()
         self.current_position = ""
-        self.signal_generator = None
         self.current_window = None
         self.playing = False
         self.signal_reader.clear_reader()
+        if self.live:
+            self.live = False
+            self.signal_reader = get_signal_reader(self.selected_reader, target_rate=self.resample_rate)
+        self.overview_future = None
+        self.overview = None
+        self.overview_strip.set_index(None)
+        self.zoom = 1
+        self.reset_analysis()
+        self.commit_cache()
+        self.cache_key = None
+        self.cache_key_future = None
+        self.cached_windows = {}
+
+    def build_overview(self):
+        self.overview = None
+        self.overview_strip.set_index(None)
+        cache_path = overview_cache_path(self.signal_path, self.signal_reader.lead or "",
+                                         self.signal_reader.sampling_rate if self.signal_reader.is_resampled else None)
+        self.overview_future = self.overview_executor.submit(OverviewIndex.load_or_build, self.signal_reader.signal, cache_path)
+
+    @staticmethod
+    def load_model(sampling_rate, model_path, model_backend):
+        """Runs on the model loader thread, which also hashes the model for the analysis cache as it can be large."""
+        return DLSignalAnalyser(sampling_rate, 100, model_path, backend=model_backend), model_fingerprint(model_path)
+
+    def collect_model(self):
+        if self.model_future is None or not self.model_future.done():
+            return
 
-    def draw_signal_info(self):
-        font = pygame.font.Font(None, 24)
+        future, self.model_future = self.model_future, None
+        self.model_executor.shutdown(wait=False)
+        analyser_name = type(self.hp_signal_analyser).__name__
+        if future.exception() is not None:
+            self.model_error = str(future.exception())
+            print(f"Could not load the ML model: {self.model_error}")
+            # Only the classic analyser runs, so its results are cached as without a model
+            self.analyser_fingerprint = f"{analyser_name}:"
+            self.open_pending_cache_record()
+            return
 
-        # Draw the signal name
-        text_surface = font.render(f"Signal: {self.signal_name}", True, BLACK)
-        self.screen.blit(text_surface, (SIDEBAR_WIDTH + 10, 5))
+        self.dl_signal_analyser, fingerprint = future.result()
+        self.analyser_fingerprint = f"{analyser_name}:{fingerprint}"
+        self.open_pending_cache_record()
+        # The sampling rate may have been taken from a file opened while the model was loading
+        self.dl_signal_analyser.sampling_frequency = self.hp_signal_analyser.sampling_frequency
+        self.analysis_worker.set_dl_signal_analyser(self.dl_signal_analyser)
+        if self.signal_path and self.current_window is not None:
+            self.update_rmssd()
 
-        # Draw the status of the signal annotation
-        if self.signal_name != "":
-            if os.path.exists(os.path.join(TAGGED_SIGNALS_DIR_NAME, f"size_{self.window_size}", f"step_{self.window_step}", f"{self.signal_name}_pos_{self.current_position}.json")):
-                tagged_state = "Tagged"
-                tagged_color = DARK_GREEN
-            else:
-                tagged_state = "Not tagged"
-                tagged_color = RED
-            
-            text_surface = font.render(tagged_state, True, tagged_color)
-            self.screen.blit(text_surface, (SCREEN_WIDTH * 0.5, 5))
+    def open_pending_cache_record(self):
+        """Keys the open record once the analysers are known, unless its files are still being hashed."""
+        if self.analysis_cache and self.signal_path and not self.live and self.cache_key is None \
+                and self.cache_key_future is None and not self.analysis_cache.stale_files(self.signal_path):
+            self.open_cache_record()
 
-        # Draw the current window position
-        text_surface = font.render(f"Window number: {self.current_position}", True, BLACK)
-        self.screen.blit(text_surface, (SCREEN_WIDTH * 0.8, 5))
+    def collect_overview(self):
+        if self.overview_future is None or not self.overview_future.done():
+            return
+
+        # Without an overview the viewer still works, only zooming out and the strip are unavailable
+        future, self.overview_future = self.overview_future, None
+        if future.exception() is None:
+            self.overview = future.result()
+            self.overview_strip.set_index(self.overview)
+
+    def open_tag_store(self):
+        self.close_tag_store()
+        # Tags saved by earlier versions hold windows at the record's native rate, so only native-rate stores take them over
+        native = not self.signal_reader.is_resampled
+        self.tag_store = TagStore(TAGGED_SIGNALS_DIR_NAME, self.signal_name, self.window_size, self.window_step,
+                                  self.hp_signal_analyser.sampling_frequency, adopt_unrated=native)
+
+        # Tags saved as per-window JSON files by earlier versions are moved into the store
+        if native:
+            legacy_dir = os.path.join(TAGGED_SIGNALS_DIR_NAME, f"size_{self.window_size}", f"step_{self.window_step}")
+            self.tag_store.import_json(legacy_dir)
+        self.tag_writer = TagWriter(self.tag_store)
+
+    def close_tag_store(self):
+        if self.tag_writer:
+            self.tag_writer.close()
+        self.tag_writer = None
+        self.tag_store = None
+
+    def peak_radius(self) -> int:
+        return max(1, int(self.PEAK_SNAP_SECONDS * self.hp_signal_analyser.sampling_frequency))
+
+    def detected_peaks_for(self, index) -> Optional[np.ndarray]:
+        detected = self.detected_peaks.get(index)
+        return self.cached_windows.get(index, {}).get("peaks") if detected is None else detected
+
+    def suggested_peaks(self, index) -> list[int]:
+        """Peaks of the last tagged window shifted onto this one, completed with the analyser's detections."""
+        carried = []
+        if self.last_tagged:
+            tagged_index, tagged_peaks = self.last_tagged
+            carried = shift_peaks(tagged_peaks, (index - tagged_index) * self.window_step, self.window_size)
+
+        detected = self.detected_peaks_for(index)
+        return merge_peaks(carried, [] if detected is None else detected, self.peak_radius())
+
+    def toggle_editing(self):
+        if self.editing:
+            self.stop_editing()
+        elif self.tag_writer and self.current_window is not None:
+            self.start_editing()
+
+    def start_editing(self):
+        """Opens the peak editor on the current window, with its saved peaks or the suggested ones."""
+        self.editing = True
+        self.zoom = 1
+        index = int(self.current_position)
+        self.edited_peaks = self.suggested_peaks(index)
+        self.peaks_touched = False
+        # Saved peaks replace the suggestions once they are read, unless the user edited them first
+        self.tag_future = (index, self.tag_writer.load(index)) if self.tag_writer.is_tagged(index) else None
+        self.collect_tag()
+
+    def collect_tag(self):
+        if self.tag_future is None or not self.tag_future[1].done():
+            return
+
+        (index, future), self.tag_future = self.tag_future, None
+        if future.exception() is not None:
+            print(f"Could not load the tag of window {index}: {future.exception()}")
+            return
+        tagged = future.result()
+        if tagged and self.editing and not self.peaks_touched and str(index) == self.current_position:
+            self.edited_peaks = [int(peak) for peak in tagged.peaks]
+            self.peaks_touched = True
+
+    def stop_editing(self):
+        self.editing = False
+        self.edited_peaks = []
+        self.tag_future = None
+        self.bulk_tag_queue.clear()
+
+    def save_tag(self, index, window, peaks):
+        """Queues a tag for writing, the RMSSD is computed from the peaks right away as it is cheap."""
+        rmssd = calculate_rmssd(peaks, self.hp_signal_analyser.sampling_frequency) if len(peaks) >= 3 else None
+        self.tag_writer.append(index, TaggedSignal(np.asarray(window, dtype=np.float32), list(peaks), rmssd))
+        self.last_tagged = (index, list(peaks))
+
+    def accept_peaks(self):
+        """Saves the edited peaks and moves the editor to the next window."""
+        self.save_tag(int(self.current_position), self.current_window, self.edited_peaks)
+        self.next_frame()
+
+    def queue_bulk_tagging(self):
+        """Saves the current window and queues the following ones to be tagged from their suggestions."""
+        index = int(self.current_position)
+        self.save_tag(index, self.current_window, self.edited_peaks)
+        stop = min(len(self.signal_reader.windows), index + 1 + self.BULK_TAG_WINDOWS)
+        self.bulk_tag_queue = deque(range(index + 1, stop))
+
+    def advance_bulk_tagging(self):
+        """Tags the next queued window once its peaks were detected, stopping at windows that need a human."""
+        index = self.bulk_tag_queue[0]
+        if self.current_position != str(index):
+            self.seek(index)
+            return
+
+        if self.detected_peaks_for(index) is None:
+            # Windows skipped on quality or without detected beats are left open in the editor
+            if self.window_quality or not self.analysis_worker.is_pending("classic", index):
+                self.bulk_tag_queue.clear()
+            return
 
+        self.save_tag(index, self.current_window, self.suggested_peaks(index))
+        self.bulk_tag_queue.popleft()
+        if not self.bulk_tag_queue:
+            self.next_frame()
 
-        # Draw the classic RMSSD value
-        text_surface = font.render(f"Classic RMSSD: {self.algo_rmssd} total RMSSD: {self.total_algo_rmssd}", True, BLACK)
-        self.screen.blit(text_surface, (SIDEBAR_WIDTH + 10, SCREEN_HEIGHT - 15))
+    def update_signal_info(self):
+        zoom = f" (zoom x{self.zoom})" if self.zoom > 1 else ""
+        status = " (waiting for data)" if self.live and not self.signal_reader.connected else ""
+        reader = self.signal_reader
+        resampled = f" ({reader.native_sampling_rate:g} -> {reader.sampling_rate:g} Hz)" if reader.is_resampled else ""
+        self.signal_name_label.set_text(f"Signal: {self.signal_name}{resampled}{zoom}{status}")
 
-        if self.dl_signal_analyser:
-            # Draw the ML RMSSD value
+        # Draw the status of the signal annotation
+        if self.signal_name != "":
+            if self.bulk_tag_queue:
+                self.tagged_label.set_text(f"Bulk tagging, {len(self.bulk_tag_queue)} left", BLUE)
+            elif self.editing:
+                self.tagged_label.set_text(f"Editing, {len(self.edited_peaks)} peaks", BLUE)
+            elif self.tag_writer and self.tag_writer.is_tagged(int(self.current_position)):
+                self.tagged_label.set_text("Tagged", DARK_GREEN)
+            else:
+                self.tagged_label.set_text("Not tagged", RED)
+        else:
+            self.tagged_label.set_text("")
+
+        self.position_label.set_text(f"Window number: {self.current_position}")
+        if self.current_position:
+            start = int(self.current_position) * self.window_step
+            self.overview_strip.set_viewport(start, start + self.window_size * self.zoom)
+
+        # The last available value stays on screen while the current window is analysed
+        index = int(self.current_position) if self.current_position else None
+        algo_pending = " (pending)" if self.analysis_worker.is_pending("classic", index) else ""
+        skipped = f"skipped, {self.window_quality}" if self.window_quality and self.current_window is not None else ""
+        if skipped:
+            self.algo_rmssd_label.set_text(f"Classic RMSSD: {skipped} total RMSSD: {self.total_algo_rmssd}", RED)
+        else:
+            self.algo_rmssd_label.set_text(f"Classic RMSSD: {self.algo_rmssd}{algo_pending} total RMSSD: {self.total_algo_rmssd}", BLACK)
+
+        if self.model_future:
+            self.ml_rmssd_label.set_text("ML RMSSD: loading model...")
+        elif self.model_error:
+            self.ml_rmssd_label.set_text("ML RMSSD: model failed to load", RED)
+        elif self.dl_signal_analyser and skipped:
+            self.ml_rmssd_label.set_text(f"ML RMSSD: {skipped} total RMSSD: {self.total_ml_rmssd}", RED)
+        elif self.dl_signal_analyser:
             disp_ml = round(float(self.ml_rmssd),2) if self.ml_rmssd != "" else ""
-            text_surface = font.render(f"ML RMSSD: {disp_ml} total RMSSD: {self.total_ml_rmssd}", True, BLACK)
-            self.screen.blit(text_surface, (SCREEN_WIDTH * 0.7, SCREEN_HEIGHT - 15))
+            ml_pending = " (pending)" if self.analysis_worker.is_pending("ml", index) else ""
+            self.ml_rmssd_label.set_text(f"ML RMSSD: {disp_ml}{ml_pending} total RMSSD: {self.total_ml_rmssd}", BLACK)
 
     def run(self):
         clock = pygame.time.Clock()
         running = True
 
-        # Define the signal display window dimensions
-        window_rect = pygame.Rect(SIDEBAR_WIDTH + 5, SCREEN_HEIGHT * 0.05, (SCREEN_WIDTH - SIDEBAR_WIDTH) * 0.95,
-                                  SCREEN_HEIGHT * 0.9)
-
-        self.draw_menu()
+        window_rect = self.PLOT_RECT
+        self.signal_plot = SignalPlot(window_rect)
+        self.profiling_overlay = ProfilingOverlay(pygame.Rect(window_rect.right - 235, window_rect.top + 5, 230, 240),
+                                                  profiler)
 
         while running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_RIGHT:
-                        self.next_frame()
-                    elif event.key == pygame.K_LEFT:
-                        if self.current_position != "0":
-                            self.signal_reader.go_back()
+            with profiler.section("frame.events"):
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        running = False
+                    elif event.type in (pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED):
+                        self.full_redraw = True
+                    elif event.type == pygame.KEYDOWN:
+                        if event.key == pygame.K_RIGHT:
                             self.next_frame()
-                    elif event.key == pygame.K_SPACE:
-                        self.playing = not self.playing
-                self.handle_event(event)
-
-            if self.playing:
+                        elif event.key == pygame.K_LEFT:
+                            self.previous_frame()
+                        elif event.key == pygame.K_SPACE:
+                            self.playing = not self.playing
+                        elif event.key == pygame.K_e and self.signal_path and not self.sampling_rate_active:
+                            self.toggle_editing()
+                        elif event.key == pygame.K_RETURN and self.editing and not self.sampling_rate_active:
+                            self.accept_peaks()
+                        elif event.key == pygame.K_b and self.editing:
+                            self.queue_bulk_tagging()
+                        elif event.key == pygame.K_ESCAPE:
+                            self.stop_editing()
+                        elif event.key == pygame.K_UP and self.signal_path and not self.editing:
+                            self.set_zoom(self.zoom * self.ZOOM_FACTOR)
+                        elif event.key == pygame.K_DOWN and self.signal_path:
+                            self.set_zoom(self.zoom // self.ZOOM_FACTOR)
+                        elif event.key == pygame.K_F3:
+                            self.toggle_profiler()
+                    self.handle_event(event)
+
+            # Live windows are taken as they complete, playback advances on the frame clock
+            if self.bulk_tag_queue:
+                self.advance_bulk_tagging()
+            elif self.live:
+                self.follow_live_signal()
+            elif self.playing and self.playback_elapsed >= AUTO_DELAY_TIME * 1000:
+                self.playback_elapsed = 0
                 self.next_frame()
-                time.sleep(AUTO_DELAY_TIME)
-
-            self.draw_menu()
-            self.draw_signal(window_rect)
-            pygame.display.flip()
-            clock.tick(30)
 
+            with profiler.section("analysis.collect"):
+                self.collect_rmssd()
+            self.collect_overview()
+            self.collect_cache_key()
+            self.collect_tag()
+            self.collect_model()
+
+            # Only the regions that changed are sent to the display
+            with profiler.section("draw.menu"):
+                dirty_rects = self.draw_menu()
+            with profiler.section("draw.signal"):
+                signal_rect = self.draw_signal(window_rect)
+            if signal_rect:
+                dirty_rects.append(signal_rect)
+            if self.show_profiler:
+                dirty_rects += self.draw_profiling_overlay(clock, force=signal_rect is not None)
+            if dirty_rects:
+                with profiler.section("draw.flip"):
+                    pygame.display.update(dirty_rects)
+
+            self.full_redraw = False
+            elapsed = clock.tick(30)
+            self.playback_elapsed = self.playback_elapsed + elapsed if self.playing else 0
+
+        self.analysis_worker.shutdown()
+        if self.live:
+            self.signal_reader.clear_reader()
+        self.overview_executor.shutdown(wait=False, cancel_futures=True)
+        self.cache_executor.shutdown(wait=False, cancel_futures=True)
+        if self.model_future:
+            self.model_executor.shutdown(wait=False, cancel_futures=True)
+        self.commit_cache()
+        self.close_tag_store()
+        if self.trace_path:
+            events = profiler.dump_chrome_trace(self.trace_path)
+            print(f"Wrote {events} trace events to {self.trace_path}")
         pygame.quit()
 
+    def toggle_profiler(self):
+        self.show_profiler = not self.show_profiler
+        # Sections are only timed while the overlay or a trace needs them
+        profiler.enabled = self.show_profiler or profiler.tracing
+        # Hiding the overlay needs the plot underneath repainted
+        self.full_redraw = True
+
+    def draw_profiling_overlay(self, clock, force=False) -> list[pygame.Rect]:
+        self.profiling_overlay.update(clock.get_fps(), self.analysis_worker.queue_depth())
+        if force:
+            self.profiling_overlay.mark_dirty()
+        rect = self.profiling_overlay.draw(self.screen)
+        return [rect] if rect else []
+
 
 if __name__ == "__main__":
     from argparse import ArgumentParser
 
     parser = ArgumentParser()
     parser.add_argument("--model_path", type=str, default=None)
+    parser.add_argument("--prefetch_windows", type=int, default=32)
+    parser.add_argument("--model_backend", type=str, default="eager", choices=MODEL_BACKENDS)
+    parser.add_argument("--incremental", action="store_true", help="Track R-peaks incrementally instead of running heartpy per window")
+    parser.add_argument("--no_cache", action="store_true", help="Do not read or write the persistent analysis cache")
+    parser.add_argument("--profile", action="store_true", help="Show the profiling overlay, F3 toggles it")
+    parser.add_argument("--trace", type=str, default=None, help="Write a Chrome trace JSON file on exit")
+    parser.add_argument("--no_quality_gate", action="store_true",
+                        help="Analyse every window, including flat, clipped and noisy ones")
+    parser.add_argument("--resample_rate", type=float, default=None,
+                        help="Resample records to this rate, the model's rate by default when a model is loaded, 0 disables")
+    parser.add_argument("--live", type=str, default=None,
+                        help="Stream samples from '-' (stdin), tcp://host:port or unix:///path instead of a file")
+    parser.add_argument("--live_policy", type=str, default="drop", choices=BackpressurePolicy.MODES,
+                        help="What to do with live windows when the analysers fall behind")
+    parser.add_argument("--live_buffer", type=float, default=LiveSignalReader.BUFFER_SECONDS,
+                        help="Seconds of the live stream kept for browsing back")
 
     args = parser.parse_args()
 
-    viewer = ECGViewer(model_path=args.model_path)
+    viewer = ECGViewer(model_path=args.model_path, prefetch_windows=args.prefetch_windows, model_backend=args.model_backend,
+                       incremental=args.incremental, use_cache=not args.no_cache, profile=args.profile,
+                       trace_path=args.trace, live_policy=args.live_policy, live_buffer_seconds=args.live_buffer,
+                       quality_gating=not args.no_quality_gate, resample_rate=args.resample_rate)
+    if args.live:
+        viewer.open_live_signal(args.live)
     viewer.run()
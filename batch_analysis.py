@@ -0,0 +1,376 @@
+import importlib.util
+import os
+import multiprocessing
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Optional, Union
+from tqdm import tqdm
+
+from utils.metrics_calculations import AgreementStatistics, match_peaks, peak_detection_scores
+from utils.signal_loader import SignalReader, get_signal_reader
+from utils.signal_analyser import SignalAnalyser, HPSignalAnalyser, IncrementalSignalAnalyser, DLSignalAnalyser
+from utils.signal_quality import SignalQualityGate
+from utils.constants import MODEL_BACKENDS
+
+READER_EXTENSIONS = {".csv": "apple", ".hea": "physionet"}
+# Detected peaks within this many seconds of a reference beat count as hits (AAMI EC57)
+PEAK_MATCH_TOLERANCE = 0.15
+# Beats this close to a window edge are not scored, the analysers may only report them in a later window
+PEAK_SCORING_MARGIN = 0.3
+
+# Analysers are created once per worker process by _init_worker
+_hp_signal_analyser: Optional[SignalAnalyser] = None
+_dl_signal_analyser: Optional[DLSignalAnalyser] = None
+# Runs the ML analyser next to the classic one, TensorFlow releases the GIL while scoring a batch
+_ml_executor: Optional[ThreadPoolExecutor] = None
+_quality_gate: Optional[SignalQualityGate] = None
+_default_sampling_rate: Optional[int] = None
+_resample_rate: Optional[float] = None
+
+
+def find_records(data_dir: str) -> list[tuple[str, str]]:
+    """Returns (signal_path, reader_type) for every readable record below data_dir."""
+    records = []
+    for root, _, files in os.walk(data_dir):
+        for file_name in sorted(files):
+            reader_type = READER_EXTENSIONS.get(os.path.splitext(file_name)[1].lower())
+            if reader_type:
+                records.append((os.path.join(root, file_name), reader_type))
+
+    return sorted(records)
+
+
+def count_windows(reader: SignalReader) -> int:
+    if len(reader.signal) < reader.window_size:
+        return 0
+    return reader.last_window_index + 1
+
+
+def _init_worker(sampling_rate: int, model_path: Optional[str], batch_size: int = 64, model_backend: str = "eager",
+                 window_step: Optional[int] = None, quality_gating: bool = True, resample_rate: Optional[float] = None):
+    global _hp_signal_analyser, _dl_signal_analyser, _ml_executor, _quality_gate, _default_sampling_rate, _resample_rate
+    _default_sampling_rate = sampling_rate
+    _resample_rate = resample_rate
+    if window_step:
+        _hp_signal_analyser = IncrementalSignalAnalyser(sampling_rate, 1, window_step)
+    else:
+        _hp_signal_analyser = HPSignalAnalyser(sampling_rate, 1)
+    _dl_signal_analyser = DLSignalAnalyser(sampling_rate, 1, model_path, batch_size, model_backend) if model_path else None
+    _ml_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ml-analysis") if model_path else None
+    _quality_gate = SignalQualityGate(sampling_rate) if quality_gating else None
+
+
+def _safe_rmssd(analyser: SignalAnalyser, window: np.ndarray, index: Optional[int] = None) -> float:
+    # heartpy raises on windows where no beats can be detected
+    try:
+        rmssd = analyser.calculate_RMSSD(window, index)
+    except Exception:
+        return np.nan
+    return np.nan if rmssd is None else float(rmssd)
+
+
+def analyse_chunk(signal_path: str, reader_type: str, window_size: int, window_step: int,
+                  start_index: int = 0, count: Optional[int] = None,
+                  channel: Union[int, str, None] = None) -> dict[str, np.ndarray]:
+    """
+    Computes per-window RMSSD for `count` windows of one record channel, starting at window start_index.
+    Records with reference annotations also get the classic analyser's peak hits, misses and false detections.
+    Windows rejected by the quality gate are not analysed, their `quality` column names the reason.
+    """
+    reader = get_signal_reader(reader_type, channel=channel, target_rate=_resample_rate)
+    reader.configure_reader(signal_path, window_size, window_step, _default_sampling_rate)
+    sampling_rate = reader.sampling_rate
+
+    # Analysers follow the rate of the windows, i.e. the header or default rate, or the resampling target
+    for analyser in (_hp_signal_analyser, _dl_signal_analyser, _quality_gate):
+        if analyser:
+            analyser.sampling_frequency = sampling_rate
+
+    stop_index = count_windows(reader) if count is None else min(count_windows(reader), start_index + count)
+    indices = np.arange(start_index, max(start_index, stop_index))
+
+    classic_rmssd = np.full(len(indices), np.nan)
+    ml_rmssd = np.full(len(indices), np.nan)
+    quality = np.full(len(indices), "", dtype=object)
+    _hp_signal_analyser.reset()
+
+    annotations = reader.read_annotations(signal_path)
+    peak_scores = np.full((len(indices), 3), np.nan)
+    tolerance = int(PEAK_MATCH_TOLERANCE * sampling_rate)
+    margin = int(PEAK_SCORING_MARGIN * sampling_rate)
+
+    for block_start in range(0, len(indices), reader.NORMALIZATION_BLOCK_SIZE):
+        block_count = min(reader.NORMALIZATION_BLOCK_SIZE, len(indices) - block_start)
+        windows = reader.windows[start_index + block_start:start_index + block_start + block_count]
+        if _quality_gate:
+            quality[block_start:block_start + block_count] = _quality_gate.reasons(windows)
+        accepted = quality[block_start:block_start + block_count] == ""
+
+        ml_future = None
+        if _dl_signal_analyser and accepted.any():
+            ml_future = _ml_executor.submit(_dl_signal_analyser.calculate_RMSSD_batch, windows[accepted])
+
+        for offset, window in enumerate(windows):
+            if not accepted[offset]:
+                continue
+            row = block_start + offset
+            classic_rmssd[row] = _safe_rmssd(_hp_signal_analyser, window, indices[row])
+
+            if annotations is not None and len(annotations) and _hp_signal_analyser.last_peaks is not None:
+                # Annotations may only cover part of a record, e.g. the first beats of ECG-ID records
+                window_start = indices[row] * window_step
+                score_from = max(margin, annotations[0] - tolerance - window_start)
+                score_to = min(window_size - margin, annotations[-1] + tolerance + 1 - window_start)
+                if score_from < score_to:
+                    first, last = np.searchsorted(annotations, [window_start, window_start + window_size])
+                    peak_scores[row] = match_peaks(_hp_signal_analyser.last_peaks, annotations[first:last] - window_start,
+                                                   tolerance, score_from, score_to)
+
+        if ml_future:
+            ml_rmssd[block_start:block_start + block_count][accepted] = ml_future.result()
+
+    return {
+        "record": np.full(len(indices), signal_path),
+        "channel": np.full(len(indices), reader.lead or ""),
+        "window_index": indices,
+        "position": indices * window_step,
+        "classic_rmssd": classic_rmssd,
+        "ml_rmssd": ml_rmssd,
+        "peak_tp": peak_scores[:, 0],
+        "peak_fp": peak_scores[:, 1],
+        "peak_fn": peak_scores[:, 2],
+        "quality": quality,
+    }
+
+
+def compare_chunk(signal_path: str, reader_type: str, window_size: int, window_step: int,
+                  start_index: int = 0, count: Optional[int] = None,
+                  channel: Union[int, str, None] = None) -> tuple[str, str, AgreementStatistics]:
+    """Scores a chunk like analyse_chunk, but only returns the classic vs. ML agreement of its windows."""
+    result = analyse_chunk(signal_path, reader_type, window_size, window_step, start_index, count, channel)
+    channel_name = result["channel"][0] if len(result["channel"]) else ""
+    return signal_path, channel_name, AgreementStatistics.from_values(result["classic_rmssd"], result["ml_rmssd"])
+
+
+def record_channels(signal_path: str, reader_type: str, channels: Optional[list]) -> list:
+    """Expands the requested channels of a record, where ["all"] selects every channel."""
+    if reader_type != "physionet":
+        return [None]
+    if not channels:
+        return [None]
+    if channels == ["all"]:
+        reader = get_signal_reader(reader_type)
+        reader.read_sampling_rate(signal_path)
+        return list(range(len(reader.channel_names)))
+    return channels
+
+
+def plan_tasks(records: list[tuple[str, str]], window_size: int, window_step: int,
+               chunk_windows: int = 0, channels: Optional[list] = None, resample_rate: Optional[float] = None,
+               sampling_rate: Optional[float] = None) -> list[tuple]:
+    """Splits records into (signal_path, reader_type, channel, start_index, count) tasks."""
+    tasks = []
+    for signal_path, reader_type in records:
+        for channel in record_channels(signal_path, reader_type, channels):
+            if chunk_windows <= 0:
+                tasks.append((signal_path, reader_type, channel, 0, None))
+                continue
+
+            # Lazy readers make opening a record cheap, so counting windows up front is fine
+            # Windows are counted at the rate the workers analyse them at
+            reader = get_signal_reader(reader_type, channel=channel, target_rate=resample_rate)
+            reader.configure_reader(signal_path, window_size, window_step, sampling_rate)
+            for start_index in range(0, count_windows(reader), chunk_windows):
+                tasks.append((signal_path, reader_type, channel, start_index, chunk_windows))
+
+    return tasks
+
+
+PARQUET_ENGINES = ("pyarrow", "fastparquet")
+
+
+def check_output_path(output_path: str) -> None:
+    """Fails before any analysis runs when the output format cannot be written."""
+    if output_path.endswith((".csv", ".npz")):
+        return
+    if not any(importlib.util.find_spec(engine) for engine in PARQUET_ENGINES):
+        raise ValueError(f"Writing {output_path} needs pyarrow or fastparquet, install one or write .csv or .npz")
+
+
+def write_table(table: pd.DataFrame, output_path: str) -> None:
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    if output_path.endswith(".csv"):
+        table.to_csv(output_path, index=False)
+    elif output_path.endswith(".npz"):
+        np.savez(output_path, **{column: table[column].to_numpy() for column in table.columns})
+    else:
+        table.to_parquet(output_path, index=False)
+
+
+def write_results(results: list[dict[str, np.ndarray]], output_path: str) -> pd.DataFrame:
+    columns = results[0].keys() if results else ["record", "channel", "window_index", "position", "classic_rmssd", "ml_rmssd",
+                                                 "peak_tp", "peak_fp", "peak_fn", "quality"]
+    table = pd.DataFrame({column: np.concatenate([result[column] for result in results]) if results else []
+                          for column in columns})
+    table = table.sort_values(["record", "channel", "window_index"], ignore_index=True)
+    write_table(table, output_path)
+    return table
+
+
+def summarise_peak_scores(table: pd.DataFrame) -> pd.DataFrame:
+    """Sums the peak matches of annotated records per record channel and over the whole dataset."""
+    scored = table.dropna(subset=["peak_tp"])
+    if scored.empty:
+        return pd.DataFrame()
+
+    counts = scored.groupby(["record", "channel"])[["peak_tp", "peak_fp", "peak_fn"]].sum()
+    counts.loc[("all", ""), :] = counts.sum()
+    scores = [peak_detection_scores(*row) for row in counts.itertuples(index=False)]
+    return counts.join(pd.DataFrame(scores, index=counts.index))
+
+
+def summarise_agreement(agreements: dict[tuple[str, str], AgreementStatistics], data_dir: str) -> pd.DataFrame:
+    """
+    One row per record channel, per dataset, i.e. top-level directory below data_dir, and over
+    everything. Differences are ML minus classic RMSSD.
+    """
+    datasets: dict[str, AgreementStatistics] = {}
+    total = AgreementStatistics()
+    rows = []
+    for (signal_path, channel), agreement in sorted(agreements.items()):
+        relative_path = os.path.relpath(signal_path, data_dir)
+        dataset = relative_path.split(os.sep)[0] if os.sep in relative_path else ""
+        datasets.setdefault(dataset, AgreementStatistics()).merge(agreement)
+        total.merge(agreement)
+        rows.append({"level": "record", "dataset": dataset, "record": signal_path, "channel": channel, **agreement.summary()})
+
+    rows += [{"level": "dataset", "dataset": dataset, "record": "", "channel": "", **agreement.summary()}
+             for dataset, agreement in sorted(datasets.items())]
+    rows.append({"level": "all", "dataset": "", "record": "", "channel": "", **total.summary()})
+
+    return pd.DataFrame(rows).rename(columns={"mean_a": "mean_classic", "mean_b": "mean_ml"})
+
+
+def default_resample_rate(resample_rate: Optional[float], model_path: Optional[str]) -> Optional[float]:
+    """Records are resampled to the model's rate unless another rate is given, 0 analyses them at their own rate."""
+    if resample_rate is None and model_path:
+        return DLSignalAnalyser.MODEL_SAMPLING_RATE
+    return resample_rate or None
+
+
+def _worker_pool(workers: Optional[int], sampling_rate: int, model_path: Optional[str], batch_size: int,
+                 model_backend: str, window_step: Optional[int], quality_gating: bool,
+                 resample_rate: Optional[float]) -> ProcessPoolExecutor:
+    # TensorFlow is not fork-safe, so workers are always spawned
+    context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                               initargs=(sampling_rate, model_path, batch_size, model_backend, window_step,
+                                         quality_gating, resample_rate))
+
+
+def run_batch(data_dir: str, output_path: str, window_size: int = 1536, window_step: int = 128,
+              sampling_rate: int = 512, model_path: Optional[str] = None, workers: Optional[int] = None,
+              chunk_windows: int = 0, batch_size: int = 64, model_backend: str = "eager",
+              incremental: bool = False, channels: Optional[list] = None, quality_gating: bool = True,
+              resample_rate: Optional[float] = None) -> pd.DataFrame:
+    check_output_path(output_path)
+    records = find_records(data_dir)
+    resample_rate = default_resample_rate(resample_rate, model_path)
+    tasks = plan_tasks(records, window_size, window_step, chunk_windows, channels, resample_rate, sampling_rate)
+
+    results = []
+    with _worker_pool(workers, sampling_rate, model_path, batch_size, model_backend,
+                      window_step if incremental else None, quality_gating, resample_rate) as executor:
+        futures = [executor.submit(analyse_chunk, signal_path, reader_type, window_size, window_step, start, count, channel)
+                   for signal_path, reader_type, channel, start, count in tasks]
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Analysing"):
+            results.append(future.result())
+
+    return write_results(results, output_path)
+
+
+def run_comparison(data_dir: str, output_path: str, model_path: str, window_size: int = 1536, window_step: int = 128,
+                   sampling_rate: int = 512, workers: Optional[int] = None, chunk_windows: int = 0,
+                   batch_size: int = 64, model_backend: str = "eager", incremental: bool = False,
+                   channels: Optional[list] = None, quality_gating: bool = True,
+                   resample_rate: Optional[float] = None) -> pd.DataFrame:
+    """Scores every record with both analysers and writes their agreement per record, per dataset and overall."""
+    check_output_path(output_path)
+    records = find_records(data_dir)
+    resample_rate = default_resample_rate(resample_rate, model_path)
+    tasks = plan_tasks(records, window_size, window_step, chunk_windows, channels, resample_rate, sampling_rate)
+
+    # Chunks are merged as they finish, per-window values never leave the workers
+    agreements: dict[tuple[str, str], AgreementStatistics] = {}
+    with _worker_pool(workers, sampling_rate, model_path, batch_size, model_backend,
+                      window_step if incremental else None, quality_gating, resample_rate) as executor:
+        futures = [executor.submit(compare_chunk, signal_path, reader_type, window_size, window_step, start, count, channel)
+                   for signal_path, reader_type, channel, start, count in tasks]
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Comparing"):
+            signal_path, channel, agreement = future.result()
+            agreements.setdefault((signal_path, channel), AgreementStatistics()).merge(agreement)
+
+    table = summarise_agreement(agreements, data_dir)
+    write_table(table, output_path)
+    return table
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Compute windowed RMSSD for every record in a directory.")
+    parser.add_argument("data_dir", type=str)
+    parser.add_argument("--output", type=str, default="rmssd_results.parquet",
+                        help="Output file, .parquet, .csv or .npz")
+    parser.add_argument("--window_size", type=int, default=1536)
+    parser.add_argument("--window_step", type=int, default=128)
+    parser.add_argument("--sampling_rate", type=int, default=512)
+    parser.add_argument("--model_path", type=str, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch_size", type=int, default=64, help="Windows per model call")
+    parser.add_argument("--model_backend", type=str, default="eager", choices=MODEL_BACKENDS)
+    parser.add_argument("--incremental", action="store_true", help="Track R-peaks incrementally instead of running heartpy per window")
+    parser.add_argument("--chunk_windows", type=int, default=0,
+                        help="Split records into chunks of this many windows, 0 processes whole records")
+    parser.add_argument("--channels", type=str, nargs="+", default=None,
+                        help="PhysioNet channels to analyse by index or name, or 'all'. Defaults to channel 1")
+    parser.add_argument("--no_quality_gate", action="store_true",
+                        help="Analyse every window, including flat, clipped and noisy ones")
+    parser.add_argument("--resample_rate", type=float, default=None,
+                        help="Resample records to this rate, the model's rate by default when a model is given, 0 disables")
+    parser.add_argument("--compare", action="store_true",
+                        help="Write classic vs. ML agreement per record and dataset instead of per-window values")
+
+    args = parser.parse_args()
+    try:
+        check_output_path(args.output)
+    except ValueError as error:
+        parser.error(str(error))
+
+    channels = [int(channel) if channel.isdigit() else channel for channel in args.channels] if args.channels else None
+
+    if args.compare:
+        if not args.model_path:
+            parser.error("--compare needs --model_path")
+        table = run_comparison(args.data_dir, args.output, args.model_path, args.window_size, args.window_step,
+                               args.sampling_rate, args.workers, args.chunk_windows, args.batch_size,
+                               args.model_backend, args.incremental, channels, not args.no_quality_gate,
+                               args.resample_rate)
+        print(table.to_string(index=False))
+    else:
+        table = run_batch(args.data_dir, args.output, args.window_size, args.window_step, args.sampling_rate,
+                          args.model_path, args.workers, args.chunk_windows, args.batch_size, args.model_backend,
+                          args.incremental, channels, not args.no_quality_gate, args.resample_rate)
+
+        rejected = table["quality"][table["quality"] != ""].value_counts()
+        if not rejected.empty:
+            print(f"Skipped {rejected.sum()} of {len(table)} windows on quality: "
+                  + ", ".join(f"{reason} {count}" for reason, count in rejected.items()))
+
+        peak_scores = summarise_peak_scores(table)
+        if not peak_scores.empty:
+            print(peak_scores.to_string())
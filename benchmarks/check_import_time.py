@@ -0,0 +1,62 @@
+import json
+import os
+import subprocess
+import sys
+
+# Cold import of the viewer module, measured in a fresh interpreter
+IMPORT_BUDGET_SECONDS = 1.0
+# Modules that must only be imported once the feature using them is needed
+DEFERRED_MODULES = ["tensorflow", "matplotlib", "tkinter", "wfdb", "heartpy", "pandas", "scipy"]
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {deferred!r} if name in sys.modules]}}))
+"""
+
+
+def measure_import(module: str = "app", repeats: int = 3) -> dict:
+    """Returns the fastest cold import time of `module` and the deferred modules it pulled in."""
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_DIR, env.get("PYTHONPATH")]))
+    script = MEASURE_SCRIPT.format(module=module, deferred=DEFERRED_MODULES)
+
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", script], env=env, cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return min(runs, key=lambda run: run["seconds"])
+
+
+def check_import_time(module: str = "app", budget: float = IMPORT_BUDGET_SECONDS, repeats: int = 3) -> list[str]:
+    """Returns the violated rules, empty if the import is within budget and defers every heavy module."""
+    result = measure_import(module, repeats)
+    problems = []
+    if result["seconds"] > budget:
+        problems.append(f"importing {module} took {result['seconds']:.2f}s, budget is {budget:.2f}s")
+    for name in result["loaded"]:
+        problems.append(f"importing {module} also imported {name}")
+    return problems
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Fail if the viewer's cold import exceeds its budget or loads deferred modules.")
+    parser.add_argument("--module", type=str, default="app")
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_SECONDS, help="Seconds")
+    parser.add_argument("--repeats", type=int, default=3)
+
+    args = parser.parse_args()
+
+    problems = check_import_time(args.module, args.budget, args.repeats)
+    for problem in problems:
+        print(problem)
+    if problems:
+        raise SystemExit(1)
+    print(f"import {args.module} is within {args.budget:.2f}s and defers {', '.join(DEFERRED_MODULES)}")
@@ -0,0 +1,271 @@
+import os
+import sys
+
+# Run as a script only the benchmarks directory is on the path, the imports below start at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Rendering benchmarks run headless
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import json
+import platform
+import tempfile
+import time
+import numpy as np
+
+from typing import Callable, Optional
+
+from benchmarks.check_import_time import measure_import
+from benchmarks.synthetic_ecg import synthetic_ecg, write_apple_watch_csv, write_physionet_record
+from utils.circular_buffer import CircularBuffer
+from utils.signal_analyser import HPSignalAnalyser, IncrementalSignalAnalyser, DLSignalAnalyser
+from utils.signal_loader import get_signal_reader
+
+SAMPLE_SIGNALS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_signals")
+SAMPLE_RECORDS = {
+    "apple": os.path.join(SAMPLE_SIGNALS_DIR, "apple_watch", "ecg_2024-06-02.csv"),
+    "physionet": os.path.join(SAMPLE_SIGNALS_DIR, "physionet", "rec_1.hea"),
+}
+
+# Relative change of a metric, in its bad direction, that counts as a regression
+DEFAULT_REGRESSION_THRESHOLD = 0.2
+
+
+def timed(function: Callable, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def best_of(function: Callable, repeats: int, *args) -> float:
+    """Fastest of several runs, which is the least noisy estimate of a pure function."""
+    return min(timed(function, *args) for _ in range(repeats))
+
+
+def stream_all_windows(reader) -> None:
+    reader.current_position = 0
+    for _ in reader.stream_normalized_signal():
+        pass
+
+
+def metric(value: float, unit: str, lower_is_better: bool = True) -> dict:
+    return {"value": float(value), "unit": unit, "lower_is_better": lower_is_better}
+
+
+def latency_metrics(name: str, latencies: list[float]) -> dict[str, dict]:
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        f"{name}.p50": metric(np.percentile(latencies_ms, 50), "ms"),
+        f"{name}.p99": metric(np.percentile(latencies_ms, 99), "ms"),
+        f"{name}.mean": metric(latencies_ms.mean(), "ms"),
+    }
+
+
+def prepare_records(data_dir: str, hours: float, sampling_rate: int = 512) -> dict[str, dict[str, str]]:
+    """Returns the sample records and synthetic records of the given length, generating missing ones."""
+    records = {"sample": dict(SAMPLE_RECORDS)}
+    if hours <= 0:
+        return records
+
+    os.makedirs(data_dir, exist_ok=True)
+    # WFDB record names cannot contain dots, so fractional hours are named in minutes
+    name = f"synthetic_{round(hours * 60)}min_{sampling_rate}hz"
+    csv_path = os.path.join(data_dir, f"{name}.csv")
+    record_path = os.path.join(data_dir, name)
+    if not (os.path.exists(csv_path) and os.path.exists(f"{record_path}.hea")):
+        signal, _ = synthetic_ecg(hours * 3600, sampling_rate)
+        write_apple_watch_csv(csv_path, signal, sampling_rate)
+        write_physionet_record(record_path, signal, sampling_rate)
+
+    records[f"synthetic_{round(hours * 60)}min"] = {"apple": csv_path, "physionet": f"{record_path}.hea"}
+    return records
+
+
+def bench_readers(records: dict[str, dict[str, str]], window_size: int, window_step: int,
+                  repeats: int) -> dict[str, dict]:
+    results = {}
+    for dataset, paths in records.items():
+        for reader_type, path in paths.items():
+            reader = get_signal_reader(reader_type, lazy=False)
+            n_samples = len(reader.read_signal(path))
+            seconds = best_of(reader.read_signal, repeats, path)
+            results[f"read_signal.{reader_type}.{dataset}"] = metric(seconds * 1000, "ms")
+            results[f"read_signal.{reader_type}.{dataset}.throughput"] = metric(n_samples / seconds / 1e6, "Msamples/s", False)
+
+            # Streaming goes through the lazy path the viewer uses
+            reader = get_signal_reader(reader_type)
+            reader.configure_reader(path, window_size, window_step)
+            n_windows = reader.last_window_index + 1
+            seconds = best_of(stream_all_windows, repeats, reader)
+            results[f"stream_normalized_signal.{reader_type}.{dataset}"] = metric(n_windows / seconds, "windows/s", False)
+
+    return results
+
+
+def load_windows(path: str, reader_type: str, window_size: int, window_step: int, count: int) -> tuple[np.ndarray, float]:
+    reader = get_signal_reader(reader_type)
+    reader.configure_reader(path, window_size, window_step)
+    count = min(count, reader.last_window_index + 1)
+    return reader.normalized_windows(0, count), reader.sampling_rate
+
+
+def bench_analysers(records: dict[str, dict[str, str]], window_size: int, window_step: int, n_windows: int,
+                    model_path: Optional[str]) -> dict[str, dict]:
+    results = {}
+    for dataset, paths in records.items():
+        windows, sampling_rate = load_windows(paths["apple"], "apple", window_size, window_step, n_windows)
+
+        for name, analyser in [("hp", HPSignalAnalyser(sampling_rate, 100)),
+                               ("incremental", IncrementalSignalAnalyser(sampling_rate, 100, window_step))]:
+            latencies = []
+            for index, window in enumerate(windows):
+                start = time.perf_counter()
+                try:
+                    analyser.calculate_RMSSD(window, index)
+                except Exception:
+                    pass
+                latencies.append(time.perf_counter() - start)
+            results.update(latency_metrics(f"calculate_RMSSD.{name}.{dataset}", latencies))
+
+        if model_path:
+            analyser = DLSignalAnalyser(sampling_rate, 100, model_path)
+            windows, _ = load_windows(paths["apple"], "apple", analyser.window_size, window_step, n_windows)
+            latencies = [timed(analyser.calculate_RMSSD, window, None) for window in windows]
+            results.update(latency_metrics(f"calculate_RMSSD.dl.{dataset}", latencies))
+            seconds = timed(analyser.calculate_RMSSD_batch, windows)
+            results[f"calculate_RMSSD_batch.dl.{dataset}"] = metric(len(windows) / seconds, "windows/s", False)
+
+    return results
+
+
+def bench_circular_buffer(n_updates: int) -> dict[str, dict]:
+    buffer = CircularBuffer(100)
+    values = np.random.default_rng(0).normal(50, 10, n_updates).tolist()
+    start = time.perf_counter()
+    for value in values:
+        buffer.update(value)
+    seconds = time.perf_counter() - start
+    return {"CircularBuffer.update": metric(seconds / n_updates * 1e9, "ns")}
+
+
+def bench_draw_signal(records: dict[str, dict[str, str]], window_size: int, window_step: int,
+                      n_frames: int) -> dict[str, dict]:
+    import pygame
+    from app import ECGViewer
+    from components.signal_plot import SignalPlot
+
+    viewer = ECGViewer(window_size, window_step, use_cache=False)
+    window_rect = ECGViewer.PLOT_RECT
+    viewer.signal_plot = SignalPlot(window_rect)
+    viewer.full_redraw = False
+    windows, _ = load_windows(records["sample"]["apple"], "apple", window_size, window_step, n_frames)
+
+    # Every frame shows a new window, the worst case of playback
+    latencies = []
+    for window in windows:
+        viewer.current_window = window
+        latencies.append(timed(viewer.draw_signal, window_rect))
+
+    # An unchanged window only re-checks the dirty state
+    idle_latencies = [timed(viewer.draw_signal, window_rect) for _ in range(n_frames)]
+
+    viewer.analysis_worker.shutdown()
+    pygame.quit()
+
+    results = latency_metrics("draw_signal.new_window", latencies)
+    results.update(latency_metrics("draw_signal.unchanged", idle_latencies))
+    return results
+
+
+def run_benchmarks(data_dir: str, hours: float = 2, window_size: int = 1536, window_step: int = 128,
+                   n_windows: int = 200, repeats: int = 3, model_path: Optional[str] = None) -> dict:
+    records = prepare_records(data_dir, hours)
+
+    results = {"import.app": metric(measure_import("app", repeats)["seconds"] * 1000, "ms")}
+    results.update(bench_readers(records, window_size, window_step, repeats))
+    results.update(bench_analysers(records, window_size, window_step, n_windows, model_path))
+    results.update(bench_circular_buffer(100_000))
+    results.update(bench_draw_signal(records, window_size, window_step, n_windows))
+
+    return {
+        "metadata": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "synthetic_hours": hours,
+            "window_size": window_size,
+            "window_step": window_step,
+        },
+        "results": results,
+    }
+
+
+def compare_to_baseline(results: dict, baseline: dict,
+                        threshold: float = DEFAULT_REGRESSION_THRESHOLD) -> list[tuple[str, float, float, float]]:
+    """Returns (name, baseline value, value, relative change) of every metric that got worse than threshold."""
+    regressions = []
+    for name, current in results["results"].items():
+        previous = baseline["results"].get(name)
+        if not previous or previous["value"] == 0:
+            continue
+
+        change = (current["value"] - previous["value"]) / previous["value"]
+        worse = change if current["lower_is_better"] else -change
+        if worse > threshold:
+            regressions.append((name, previous["value"], current["value"], change))
+    return regressions
+
+
+def print_results(results: dict, baseline: Optional[dict] = None) -> None:
+    for name, current in results["results"].items():
+        line = f"{name:<55} {current['value']:>12.3f} {current['unit']}"
+        previous = baseline["results"].get(name) if baseline else None
+        if previous and previous["value"]:
+            line += f"  ({(current['value'] - previous['value']) / previous['value']:+.1%} vs baseline)"
+        print(line)
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Benchmark the readers, analysers and rendering hot paths.")
+    parser.add_argument("--output", type=str, default="benchmark_results.json")
+    parser.add_argument("--baseline", type=str, default=os.path.join("benchmarks", "baseline.json"))
+    parser.add_argument("--save_baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="Relative slowdown that fails the run")
+    parser.add_argument("--hours", type=float, default=2, help="Length of the synthetic recordings, 0 skips them")
+    parser.add_argument("--data_dir", type=str, default=os.path.join(tempfile.gettempdir(), "ecg_benchmarks"),
+                        help="Where synthetic recordings are generated and reused")
+    parser.add_argument("--windows", type=int, default=200, help="Windows per latency measurement")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--model_path", type=str, default=None, help="Also benchmark the ML analyser")
+
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.data_dir, args.hours, n_windows=args.windows, repeats=args.repeats,
+                             model_path=args.model_path)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["metadata"].get("platform") != results["metadata"]["platform"]:
+            print("Warning: the baseline was recorded on a different platform, timings may not be comparable")
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    elif baseline:
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        for name, previous, current, change in regressions:
+            print(f"REGRESSION {name}: {previous:.3f} -> {current:.3f} ({change:+.1%})")
+        if regressions:
+            raise SystemExit(1)
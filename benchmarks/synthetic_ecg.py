@@ -0,0 +1,75 @@
+import os
+import numpy as np
+import wfdb
+
+# Waves of one beat as (offset from the R-peak in seconds, width in seconds, amplitude in mV)
+BEAT_WAVES = [
+    (-0.20, 0.025, 0.12),   # P
+    (-0.035, 0.010, -0.10),  # Q
+    (0.0, 0.012, 1.20),     # R
+    (0.035, 0.010, -0.25),  # S
+    (0.25, 0.045, 0.30),    # T
+]
+
+
+def beat_template(sampling_rate: int) -> tuple[np.ndarray, int]:
+    """Returns one beat sampled around its R-peak and the index of the R-peak in it."""
+    offsets = np.arange(int(-0.3 * sampling_rate), int(0.45 * sampling_rate)) / sampling_rate
+    template = np.zeros(len(offsets))
+    for center, width, amplitude in BEAT_WAVES:
+        template += amplitude * np.exp(-0.5 * ((offsets - center) / width) ** 2)
+    return template, int(0.3 * sampling_rate)
+
+
+def synthetic_ecg(duration: float, sampling_rate: int = 512, heart_rate: float = 70, hrv: float = 0.05,
+                  noise: float = 0.02, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Generates a single-lead ECG in mV with respiratory heart rate variability, baseline
+    wander and white noise. Returns the signal and the R-peak positions in samples.
+    """
+    rng = np.random.default_rng(seed)
+    n_samples = int(duration * sampling_rate)
+    mean_rr = 60 / heart_rate
+
+    # RR intervals modulated by breathing (~0.25 Hz) plus random variation
+    n_beats = int(duration / mean_rr) + 2
+    beat_times = np.arange(n_beats) * mean_rr
+    rr = mean_rr * (1 + hrv * np.sin(2 * np.pi * 0.25 * beat_times) + hrv / 2 * rng.standard_normal(n_beats))
+    peaks = (np.cumsum(rr) * sampling_rate).astype(np.int64)
+    template, r_index = beat_template(sampling_rate)
+    peaks = peaks[(peaks >= r_index) & (peaks < n_samples - len(template) + r_index)]
+
+    # Every beat adds the template at its position, done for all beats at once
+    signal = np.zeros(n_samples)
+    positions = peaks[:, None] - r_index + np.arange(len(template))
+    np.add.at(signal, positions.ravel(), np.tile(template, len(peaks)))
+
+    t = np.arange(n_samples) / sampling_rate
+    signal += 0.1 * np.sin(2 * np.pi * 0.2 * t) + noise * rng.standard_normal(n_samples)
+    return signal.astype(np.float32), peaks
+
+
+def write_physionet_record(record_path: str, signal: np.ndarray, sampling_rate: int) -> str:
+    """Writes a two-channel format 16 record whose channel 1 is the signal, like the sample records."""
+    write_dir, record_name = os.path.split(record_path)
+    channels = np.column_stack((signal, signal)).astype(np.float64)
+    wfdb.wrsamp(record_name, fs=sampling_rate, units=["mV", "mV"], sig_name=["ECG I", "ECG I filtered"],
+                p_signal=channels, fmt=["16", "16"], write_dir=write_dir or ".")
+    return f"{record_path}.hea"
+
+
+def write_apple_watch_csv(csv_path: str, signal: np.ndarray, sampling_rate: int) -> str:
+    """Writes the signal in µV as an English Apple Watch export."""
+    header = [
+        "Name,Synthetic",
+        "Recorded Date,2024-01-01 00:00:00 +0000",
+        "Classification,Sinus Rhythm",
+        f"Sample Rate,{sampling_rate} hertz",
+        "Lead,Lead I",
+        "Unit,µV",
+        "",
+    ]
+    with open(csv_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(header) + "\n")
+        np.savetxt(f, signal * 1000, fmt="%.3f")
+    return csv_path
@@ -1,19 +1,26 @@
 import pygame
 
+from functools import lru_cache
+
 from utils.constants import BLACK, DARK_GRAY, GRADIENT_COLOR_1, GRADIENT_COLOR_2
 
-def draw_button(screen, rect, color, text, font, text_color, hover=False):
-    # Gradient fill for the button
-    gradient_surface = pygame.Surface((rect.width, rect.height))
-    for y in range(rect.height):
-        blend_ratio = y / rect.height
+@lru_cache(maxsize=None)
+def gradient_surface(width, height):
+    # Gradients only depend on the button size, so each size is rendered once
+    surface = pygame.Surface((width, height))
+    for y in range(height):
+        blend_ratio = y / height
         blended_color = [
             int(GRADIENT_COLOR_1[i] * (1 - blend_ratio) + GRADIENT_COLOR_2[i] * blend_ratio)
             for i in range(3)
         ]
-        pygame.draw.line(gradient_surface, blended_color, (0, y), (rect.width, y))
-    
-    screen.blit(gradient_surface, (rect.x, rect.y))
+        pygame.draw.line(surface, blended_color, (0, y), (width, y))
+
+    return surface
+
+def draw_button(screen, rect, color, text, font, text_color, hover=False):
+    # Gradient fill for the button
+    screen.blit(gradient_surface(rect.width, rect.height), (rect.x, rect.y))
     
     # Rounded rectangle border
     border_radius = 10
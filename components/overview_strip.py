@@ -0,0 +1,64 @@
+import numpy as np
+import pygame
+
+from typing import Optional
+
+from components.widgets import Widget
+from utils.constants import BLACK, BLUE, GRID_COLOR, RED, WHITE
+from utils.overview_index import OverviewIndex
+
+
+class OverviewStrip(Widget):
+    """Whole-recording min/max trace with the visible span highlighted. Clicks map to a sample position."""
+
+    def __init__(self, area: pygame.Rect):
+        super().__init__(area)
+        self.index: Optional[OverviewIndex] = None
+        self.viewport = (0, 0)
+        self.trace_surface = None
+
+    def set_index(self, index: Optional[OverviewIndex]) -> None:
+        if index is not self.index:
+            self.index = index
+            self.trace_surface = None
+            self.dirty = True
+
+    def set_viewport(self, start: int, stop: int) -> None:
+        self._set("viewport", (start, stop))
+
+    def position_at(self, x: int) -> Optional[int]:
+        """Sample position under the given screen x, None without an index."""
+        if self.index is None or not self.area.left <= x < self.area.right:
+            return None
+        return int((x - self.area.left) / self.area.width * self.index.n_samples)
+
+    def render(self, screen: pygame.Surface) -> None:
+        if self.trace_surface is None:
+            self.trace_surface = self._draw_trace()
+        screen.blit(self.trace_surface, self.area.topleft)
+
+        if self.index is not None and self.index.n_samples:
+            start, stop = self.viewport[0], min(self.viewport[1], self.index.n_samples)
+            left = self.area.left + start * self.area.width // self.index.n_samples
+            right = self.area.left + stop * self.area.width // self.index.n_samples
+            pygame.draw.rect(screen, RED, (left, self.area.top, max(2, right - left), self.area.height), 2)
+
+    def _draw_trace(self) -> pygame.Surface:
+        surface = pygame.Surface(self.area.size)
+        surface.fill(WHITE)
+        pygame.draw.rect(surface, GRID_COLOR, surface.get_rect(), 1)
+        if self.index is None or self.index.n_samples == 0:
+            return surface
+
+        # A few thousand pyramid values describe the whole recording
+        mins, maxs = self.index.envelope(0, self.index.n_samples, self.area.width)
+        low, high = float(mins.min()), float(maxs.max())
+        scale = (self.area.height - 4) / (high - low) if high > low else 0.0
+        x = np.arange(len(mins)) * self.area.width / len(mins)
+        tops = self.area.height - 2 - (maxs - low) * scale
+        bottoms = self.area.height - 2 - (mins - low) * scale
+        for column, top, bottom in zip(x.tolist(), tops.tolist(), bottoms.tolist()):
+            pygame.draw.line(surface, BLUE, (column, top), (column, bottom))
+
+        pygame.draw.rect(surface, BLACK, surface.get_rect(), 1)
+        return surface
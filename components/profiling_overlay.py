@@ -0,0 +1,45 @@
+import pygame
+
+from components.widgets import Widget, get_font
+from utils.constants import DARK_GRAY, WHITE
+from utils.profiling import Profiler, memory_usage_mb
+
+
+class ProfilingOverlay(Widget):
+    """Panel drawn over the plot with FPS, per-stage milliseconds, analysis queue depth and memory use."""
+    # The text only changes a few times per second to keep the overlay itself cheap
+    REFRESH_MS = 500
+    LINE_HEIGHT = 16
+
+    def __init__(self, area: pygame.Rect, profiler: Profiler):
+        super().__init__(area, background=DARK_GRAY)
+        self.profiler = profiler
+        self.font = get_font(18)
+        self.lines: list[str] = []
+        self.last_refresh = -self.REFRESH_MS
+        self.text_surface = None
+
+    def update(self, fps: float, queue_depth: int) -> None:
+        now = pygame.time.get_ticks()
+        if now - self.last_refresh < self.REFRESH_MS:
+            return
+        self.last_refresh = now
+
+        memory = memory_usage_mb()
+        lines = [f"FPS {fps:5.1f}", f"Analysis queue {queue_depth}",
+                 f"Memory {memory:.0f} MB" if memory is not None else "Memory n/a"]
+        lines += [f"{name} {ms:6.2f} ms" for name, ms in self.profiler.stage_ms().items()]
+
+        if lines != self.lines:
+            self.lines = lines
+            self.text_surface = None
+            self.dirty = True
+
+    def render(self, screen: pygame.Surface) -> None:
+        if self.text_surface is None:
+            self.text_surface = pygame.Surface(self.area.size)
+            self.text_surface.fill(self.background)
+            for line_number, line in enumerate(self.lines):
+                self.text_surface.blit(self.font.render(line, True, WHITE), (6, 4 + line_number * self.LINE_HEIGHT))
+
+        screen.blit(self.text_surface, self.area.topleft)
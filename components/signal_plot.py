@@ -0,0 +1,167 @@
+import numpy as np
+import pygame
+
+from typing import Optional
+
+from components.widgets import get_font
+from utils.constants import WHITE, BLACK, BLUE, RED, GRID_COLOR
+
+
+def min_max_decimate(signal: np.ndarray, n_columns: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Reduces the signal to at most two points (min and max) per pixel column.
+    Returns x positions in samples and the matching values.
+    """
+    signal = np.asarray(signal, dtype=float)
+    if len(signal) <= 2 * n_columns:
+        return np.arange(len(signal)), signal
+
+    edges = np.linspace(0, len(signal), n_columns + 1).astype(int)[:-1]
+    mins = np.minimum.reduceat(signal, edges)
+    maxs = np.maximum.reduceat(signal, edges)
+
+    x = np.repeat(edges, 2)
+    values = np.empty(2 * n_columns)
+    values[0::2] = mins
+    values[1::2] = maxs
+    return x, values
+
+
+class SignalPlot:
+    """Draws a normalized signal window with pygame, re-rendering only when the window or viewport changes."""
+    # Match the scale to the normalized signal range
+    Y_LIMITS = (-0.1, 1.1)
+    Y_TICKS = np.round(np.arange(0, 1.1, 0.1), 1)
+    X_GRID_LINES = 8
+    LABEL_MARGIN = 30
+    PEAK_MARKER_RADIUS = 4
+
+    def __init__(self, rect: pygame.Rect):
+        self.font = get_font(16)
+        self.window = None
+        self.envelope = None
+        self.peaks: Optional[tuple[int, ...]] = None
+        self.surface = None
+        self.set_rect(rect)
+
+    def set_rect(self, rect: pygame.Rect) -> None:
+        rect = pygame.Rect(rect)
+        if getattr(self, "rect", None) == rect:
+            return
+
+        self.rect = rect
+        self.plot_rect = pygame.Rect(self.LABEL_MARGIN, 0, rect.width - self.LABEL_MARGIN, rect.height)
+        self.grid_surface = self._draw_grid()
+        self.surface = None
+        self.dirty = True
+
+    def set_window(self, window: Optional[np.ndarray]) -> bool:
+        """Returns True if the window changed and the plot has to be redrawn."""
+        if window is self.window and self.envelope is None:
+            return False
+
+        self.window = window
+        self.envelope = None
+        self.surface = None
+        self.dirty = True
+        return True
+
+    def set_envelope(self, mins: np.ndarray, maxs: np.ndarray) -> bool:
+        """Shows per-column min/max values of a zoomed-out span instead of a single window."""
+        if self.envelope is not None and np.array_equal(self.envelope[0], mins) and np.array_equal(self.envelope[1], maxs):
+            return False
+
+        self.envelope = (mins, maxs)
+        self.surface = None
+        self.dirty = True
+        return True
+
+    def set_peaks(self, peaks) -> bool:
+        """Marks peaks, as sample indices of the window, on the trace. None hides the markers."""
+        peaks = None if peaks is None else tuple(int(peak) for peak in peaks)
+        if peaks == self.peaks:
+            return False
+
+        self.peaks = peaks
+        self.surface = None
+        self.dirty = True
+        return True
+
+    def sample_at(self, x: int) -> Optional[int]:
+        """Returns the window sample under a screen x coordinate, None outside the plot."""
+        if self.window is None or self.envelope is not None:
+            return None
+        offset = x - self.rect.left - self.plot_rect.left
+        if not 0 <= offset < self.plot_rect.width:
+            return None
+        return int(round(offset * (len(self.window) - 1) / max(1, self.plot_rect.width - 1)))
+
+    def draw(self, screen: pygame.Surface, force: bool = False) -> Optional[pygame.Rect]:
+        """Blits the plot if it changed since the last draw (or if forced) and returns the updated rect."""
+        if not (self.dirty or force):
+            return None
+
+        if self.surface is None:
+            self.surface = self._draw_trace()
+
+        screen.blit(self.surface, self.rect.topleft)
+        self.dirty = False
+        return self.rect
+
+    def _to_pixels(self, x: np.ndarray, values: np.ndarray, n_samples: int) -> np.ndarray:
+        y_min, y_max = self.Y_LIMITS
+        px = self.plot_rect.left + x * (self.plot_rect.width - 1) / max(1, n_samples - 1)
+        py = self.plot_rect.bottom - 1 - (values - y_min) * (self.plot_rect.height - 1) / (y_max - y_min)
+        return np.column_stack((px, py))
+
+    def _draw_grid(self) -> pygame.Surface:
+        surface = pygame.Surface(self.rect.size)
+        surface.fill(WHITE)
+
+        y_min, y_max = self.Y_LIMITS
+        for tick in self.Y_TICKS:
+            y = self.plot_rect.bottom - 1 - (tick - y_min) * (self.plot_rect.height - 1) / (y_max - y_min)
+            pygame.draw.line(surface, GRID_COLOR, (self.plot_rect.left, y), (self.plot_rect.right, y))
+
+            label = self.font.render(f"{tick:.1f}", True, BLACK)
+            surface.blit(label, label.get_rect(midright=(self.plot_rect.left - 4, y)))
+
+        for line in range(1, self.X_GRID_LINES):
+            x = self.plot_rect.left + line * self.plot_rect.width / self.X_GRID_LINES
+            pygame.draw.line(surface, GRID_COLOR, (x, self.plot_rect.top), (x, self.plot_rect.bottom))
+
+        pygame.draw.rect(surface, BLACK, self.plot_rect, 1)
+        return surface
+
+    def _draw_trace(self) -> pygame.Surface:
+        surface = self.grid_surface.copy()
+        if self.envelope is not None:
+            return self._draw_envelope(surface)
+        if self.window is None or len(self.window) < 2:
+            return surface
+
+        x, values = min_max_decimate(self.window, self.plot_rect.width)
+        points = self._to_pixels(x, values, len(self.window))
+        pygame.draw.lines(surface, BLUE, False, points.tolist())
+
+        if self.peaks:
+            peaks = np.asarray([peak for peak in self.peaks if 0 <= peak < len(self.window)], dtype=int)
+            for point in self._to_pixels(peaks, np.asarray(self.window)[peaks], len(self.window)).tolist():
+                pygame.draw.circle(surface, RED, point, self.PEAK_MARKER_RADIUS, 2)
+        return surface
+
+    def _draw_envelope(self, surface: pygame.Surface) -> pygame.Surface:
+        mins, maxs = self.envelope
+        if len(mins) < 2:
+            return surface
+
+        # The span is normalized as a whole, like a single window
+        low, high = float(mins.min()), float(maxs.max())
+        scale = 1 / (high - low) if high > low else 0.0
+        values = np.empty(2 * len(mins))
+        values[0::2] = (mins - low) * scale
+        values[1::2] = (maxs - low) * scale
+
+        points = self._to_pixels(np.repeat(np.arange(len(mins)), 2), values, len(mins))
+        pygame.draw.lines(surface, BLUE, False, points.tolist())
+        return surface
@@ -0,0 +1,117 @@
+import pygame
+
+from functools import lru_cache
+from typing import Optional
+
+from components.buttons import draw_button, draw_radio_button
+from utils.constants import BLACK, GREY, WHITE
+
+
+@lru_cache(maxsize=None)
+def get_font(size: int) -> pygame.font.Font:
+    return pygame.font.Font(None, size)
+
+
+class Widget:
+    """
+    Retained-mode UI element. State setters mark the widget dirty and draw()
+    only repaints dirty widgets, returning the rect that has to be flipped.
+    """
+
+    def __init__(self, area: pygame.Rect, background=GREY):
+        self.area = pygame.Rect(area)
+        self.background = background
+        self.dirty = True
+
+    def mark_dirty(self) -> None:
+        self.dirty = True
+
+    def _set(self, name: str, value) -> None:
+        if getattr(self, name) != value:
+            setattr(self, name, value)
+            self.dirty = True
+
+    def draw(self, screen: pygame.Surface) -> Optional[pygame.Rect]:
+        if not self.dirty:
+            return None
+
+        screen.fill(self.background, self.area)
+        self.render(screen)
+        self.dirty = False
+        return self.area
+
+    def render(self, screen: pygame.Surface) -> None:
+        pass
+
+
+class Button(Widget):
+    def __init__(self, rect: pygame.Rect, text: str, color, font: pygame.font.Font, text_color=WHITE):
+        super().__init__(rect)
+        self.rect = pygame.Rect(rect)
+        self.text = text
+        self.color = color
+        self.font = font
+        self.text_color = text_color
+        self.hover = False
+
+    def set_hover(self, hover: bool) -> None:
+        self._set("hover", hover)
+
+    def render(self, screen: pygame.Surface) -> None:
+        draw_button(screen, self.rect, self.color, self.text, self.font, self.text_color, self.hover)
+
+
+class RadioButton(Widget):
+    def __init__(self, rect: pygame.Rect, text: str, color, font: pygame.font.Font, text_color=BLACK, area_width: int = 170):
+        super().__init__(pygame.Rect(rect.x, rect.y, area_width, rect.height))
+        self.rect = pygame.Rect(rect)
+        self.text = text
+        self.color = color
+        self.font = font
+        self.text_color = text_color
+        self.selected = False
+
+    def set_selected(self, selected: bool) -> None:
+        self._set("selected", selected)
+
+    def render(self, screen: pygame.Surface) -> None:
+        draw_radio_button(screen, self.rect, self.color, self.text, self.font, self.text_color, self.selected)
+
+
+class Label(Widget):
+    """Text whose rendered surface is cached until the text or its colour changes."""
+
+    def __init__(self, area: pygame.Rect, font: pygame.font.Font, text: str = "", color=BLACK, background=GREY):
+        super().__init__(area, background)
+        self.font = font
+        self.text = text
+        self.color = color
+        self.text_surface = None
+
+    def set_text(self, text: str, color=None) -> None:
+        color = self.color if color is None else color
+        if text != self.text or color != self.color:
+            self.text = text
+            self.color = color
+            self.text_surface = None
+            self.dirty = True
+
+    def render(self, screen: pygame.Surface) -> None:
+        if self.text_surface is None:
+            self.text_surface = self.font.render(self.text, True, self.color)
+
+        # Clip to the widget area so longer texts never paint over neighbours
+        screen.blit(self.text_surface, self.area.topleft, pygame.Rect(0, 0, self.area.width, self.area.height))
+
+
+class TextBox(Label):
+    def __init__(self, rect: pygame.Rect, font: pygame.font.Font, text: str = "", color=BLACK, border_color=WHITE):
+        super().__init__(rect, font, text, color)
+        self.rect = pygame.Rect(rect)
+        self.border_color = border_color
+
+    def render(self, screen: pygame.Surface) -> None:
+        pygame.draw.rect(screen, self.border_color, self.rect, 2)
+        if self.text_surface is None:
+            self.text_surface = self.font.render(self.text, True, self.color)
+        screen.blit(self.text_surface, (self.rect.x + 5, self.rect.y + 5))
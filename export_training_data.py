@@ -0,0 +1,192 @@
+import hashlib
+import os
+import re
+import time
+import numpy as np
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from utils.constants import TAGGED_SIGNALS_DIR_NAME
+from utils.tag_store import LEGACY_TAG_FILE_PATTERN, RATE_DIR_PATTERN, TagStore
+from utils.tagging_helpers import TaggedSignal
+from utils.training_data import SHARD_FORMATS, ShardWriter
+
+STEP_DIR_PATTERN = re.compile(r"^step_(?P<step>\d+)$")
+# Windows of one record that share more than this fraction of their samples count as duplicates
+DEFAULT_MAX_OVERLAP = 0.5
+
+
+def find_tagged_records(root_dir: str, window_size: int) -> list[tuple[str, int, Optional[float]]]:
+    """
+    Returns (record_name, window_step, sampling_rate) of every record tagged with the given window
+    size. Tags saved before rates were recorded, in stores or legacy JSON files, have no rate.
+    """
+    size_dir = os.path.join(root_dir, f"size_{window_size}")
+    if not os.path.isdir(size_dir):
+        return []
+
+    records = set()
+    for step_name in sorted(os.listdir(size_dir)):
+        match = STEP_DIR_PATTERN.match(step_name)
+        if not match:
+            continue
+        step_dir = os.path.join(size_dir, step_name)
+        for name in os.listdir(step_dir):
+            path = os.path.join(step_dir, name)
+            rate = RATE_DIR_PATTERN.match(name)
+            if rate and os.path.isdir(path):
+                records.update((record_name, int(match["step"]), float(rate["rate"])) for record_name in os.listdir(path)
+                               if os.path.isdir(os.path.join(path, record_name)))
+            elif os.path.isdir(path):
+                records.add((name, int(match["step"]), None))
+            else:
+                # Legacy JSON tags that were never moved into a store
+                legacy = LEGACY_TAG_FILE_PATTERN.match(name)
+                if legacy:
+                    records.add((legacy["record"], int(match["step"]), None))
+    return sorted(records, key=lambda record: (record[0], record[1], record[2] or 0))
+
+
+def load_record(root_dir: str, record_name: str, window_size: int, window_step: int,
+                sampling_rate: Optional[float] = None) -> dict:
+    """Loads the latest tag of every window of a record, including legacy JSON tags missing from an unrated store."""
+    store = TagStore(root_dir, record_name, window_size, window_step, sampling_rate)
+    tags = store.load_all()
+    positions = list(tags["positions"])
+    windows, peaks, rmssd = list(tags["windows"]), list(tags["peaks"]), list(tags["rmssd"])
+    record = {"record": record_name, "window_step": window_step, "sampling_rate": sampling_rate,
+              "positions": positions, "windows": windows, "peaks": peaks, "rmssd": rmssd}
+    if sampling_rate:
+        return record
+
+    # The exporter only reads, so legacy tags are loaded directly instead of importing them
+    legacy_dir = os.path.dirname(store.dir_path)
+    tagged = set(int(position) for position in positions)
+    for file_name in sorted(os.listdir(legacy_dir)):
+        match = LEGACY_TAG_FILE_PATTERN.match(file_name)
+        if match and match["record"] == record_name and int(match["position"]) not in tagged:
+            tagged_signal = TaggedSignal.load_from_json(os.path.join(legacy_dir, file_name))
+            positions.append(int(match["position"]))
+            windows.append(np.asarray(tagged_signal.signal, dtype=np.float32))
+            peaks.append(np.asarray(tagged_signal.peaks, dtype=np.int32))
+            rmssd.append(np.nan if tagged_signal.rmssd is None else tagged_signal.rmssd)
+
+    return record
+
+
+def validation_error(window: np.ndarray, peaks: np.ndarray, rmssd: float, window_size: int) -> Optional[str]:
+    """Returns why a tagged window is unusable for training, None if it is valid."""
+    if len(window) != window_size:
+        return "window_length"
+    if not np.all(np.isfinite(window)):
+        return "window_not_finite"
+    if np.any(np.diff(peaks) <= 0):
+        return "peaks_not_sorted"
+    if len(peaks) and (peaks[0] < 0 or peaks[-1] >= window_size):
+        return "peaks_out_of_window"
+    if rmssd is None or not np.isfinite(rmssd):
+        return "rmssd_missing"
+    return None
+
+
+def thin_overlapping(positions: np.ndarray, window_size: int, window_step: int, max_overlap: float) -> np.ndarray:
+    """Returns the indices of positions to keep, so no two kept windows overlap by more than max_overlap."""
+    order = np.argsort(positions)
+    min_distance = (1 - max_overlap) * window_size
+    kept, last_start = [], None
+    for index in order:
+        start = positions[index] * window_step
+        if last_start is None or start - last_start >= min_distance:
+            kept.append(index)
+            last_start = start
+    return np.array(kept, dtype=int)
+
+
+def export_training_data(output_dir: str, window_size: int, root_dir: str = TAGGED_SIGNALS_DIR_NAME,
+                         shard_size: int = 4096, shard_format: str = "npy", max_overlap: float = DEFAULT_MAX_OVERLAP,
+                         workers: Optional[int] = None, sampling_rate: Optional[float] = None) -> dict:
+    """
+    Loads every tagged record on a thread pool, drops invalid windows, exact duplicates and
+    windows overlapping an already exported one, and writes the rest as training shards.
+    A dataset holds windows of one sampling rate, selected with sampling_rate when the tags
+    span several. Tags without a recorded rate are only exported when no rate is selected.
+    """
+    records = find_tagged_records(root_dir, window_size)
+    if sampling_rate:
+        records = [record for record in records if record[2] == sampling_rate]
+    rates = sorted({record[2] for record in records}, key=lambda rate: rate or 0)
+    if len(rates) > 1:
+        found = ", ".join("unknown" if rate is None else f"{rate:g} Hz" for rate in rates)
+        raise ValueError(f"Tags of {window_size}-sample windows were saved at several sampling rates ({found}), "
+                         f"select one to export")
+    writer = ShardWriter(output_dir, window_size, shard_size, shard_format)
+    rejected = Counter()
+    seen_windows = set()
+    exported_records = []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(load_record, root_dir, record_name, window_size, window_step, record_rate)
+                   for record_name, window_step, record_rate in records]
+
+        # Records are written in a stable order, whatever order they finish loading in
+        for future in futures:
+            record = future.result()
+            valid = []
+            for row, (window, peaks, rmssd) in enumerate(zip(record["windows"], record["peaks"], record["rmssd"])):
+                error = validation_error(window, np.asarray(peaks), rmssd, window_size)
+                if error:
+                    rejected[error] += 1
+                else:
+                    valid.append(row)
+
+            positions = np.asarray(record["positions"], dtype=np.int64)[valid]
+            kept = np.asarray(valid, dtype=int)[thin_overlapping(positions, window_size, record["window_step"], max_overlap)]
+            if len(kept) < len(valid):
+                rejected["overlapping"] += len(valid) - len(kept)
+
+            exported = 0
+            for row in kept:
+                window = np.asarray(record["windows"][row], dtype=np.float32)
+                digest = hashlib.sha1(window.tobytes()).digest()
+                if digest in seen_windows:
+                    rejected["duplicate"] += 1
+                    continue
+                seen_windows.add(digest)
+
+                writer.add(window, record["rmssd"][row], record["peaks"][row], record["record"], record["positions"][row])
+                exported += 1
+
+            exported_records.append({"record": record["record"], "window_step": record["window_step"],
+                                     "tagged": len(record["positions"]), "exported": exported})
+
+    return writer.close(created=time.strftime("%Y-%m-%dT%H:%M:%S"), source=os.path.abspath(root_dir),
+                        sampling_rate=rates[0] if rates else sampling_rate, max_overlap=max_overlap, records=exported_records, rejected=dict(rejected))
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Export tagged windows as sharded training data with a manifest.")
+    parser.add_argument("output_dir", type=str)
+    parser.add_argument("--window_size", type=int, default=1536)
+    parser.add_argument("--tags_dir", type=str, default=TAGGED_SIGNALS_DIR_NAME)
+    parser.add_argument("--shard_size", type=int, default=4096, help="Windows per shard")
+    parser.add_argument("--format", type=str, default="npy", choices=SHARD_FORMATS)
+    parser.add_argument("--max_overlap", type=float, default=DEFAULT_MAX_OVERLAP,
+                        help="Largest fraction of samples two exported windows of a record may share")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--sampling_rate", type=float, default=None,
+                        help="Export the windows tagged at this rate, needed when tags span several rates")
+
+    args = parser.parse_args()
+
+    try:
+        manifest = export_training_data(args.output_dir, args.window_size, args.tags_dir, args.shard_size, args.format,
+                                        args.max_overlap, args.workers, args.sampling_rate)
+    except ValueError as error:
+        parser.error(str(error))
+    print(f"Exported {manifest['count']} windows of {len(manifest['records'])} records "
+          f"into {len(manifest['shards'])} shards in {args.output_dir}")
+    for reason, count in sorted(manifest["rejected"].items()):
+        print(f"  skipped {count} windows: {reason}")
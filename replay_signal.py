@@ -0,0 +1,95 @@
+import os
+import socket
+import sys
+import time
+import numpy as np
+
+from typing import BinaryIO, Optional
+
+from utils.signal_loader import get_signal_reader
+
+READER_EXTENSIONS = {".csv": "apple", ".hea": "physionet"}
+
+
+def open_target(target: str) -> tuple[BinaryIO, Optional[socket.socket]]:
+    """Connects to a live viewer listening on tcp://host:port or unix:///path, '-' writes to stdout."""
+    if target == "-":
+        return sys.stdout.buffer, None
+
+    if target.startswith("unix://"):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(target[len("unix://"):])
+    elif target.startswith("tcp://"):
+        host, _, port = target[len("tcp://"):].rpartition(":")
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.connect((host or "127.0.0.1", int(port)))
+    else:
+        raise ValueError(f"Unknown target {target!r}, expected '-', tcp://host:port or unix:///path")
+    return sock.makefile('wb'), sock
+
+
+def replay_signal(signal: np.ndarray, sampling_rate: float, output: BinaryIO, speed: float = 1.0,
+                  chunk_seconds: float = 0.05, lead: Optional[str] = None) -> float:
+    """
+    Writes the samples in the live stream format, paced at `speed` times real time (0 sends
+    as fast as possible). Chunks are scheduled against the start time, so pacing does not
+    drift when a write is slow. Returns the seconds the replay took.
+    """
+    output.write(f"# sampling_rate={sampling_rate:g}\n".encode())
+    if lead:
+        output.write(f"# lead={lead}\n".encode())
+
+    chunk_size = max(1, int(sampling_rate * chunk_seconds))
+    start = time.perf_counter()
+    for offset in range(0, len(signal), chunk_size):
+        if speed > 0:
+            delay = start + offset / sampling_rate / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        chunk = signal[offset:offset + chunk_size]
+        output.write(("\n".join(f"{value:.6g}" for value in chunk.tolist()) + "\n").encode())
+        output.flush()
+
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Stream a recorded signal to a live viewer at real-time or N-times speed.")
+    parser.add_argument("signal_path", type=str)
+    parser.add_argument("--target", type=str, default="-", help="'-' (stdout), tcp://host:port or unix:///path")
+    parser.add_argument("--reader", type=str, default=None, choices=["apple", "physionet"],
+                        help="Taken from the file extension by default")
+    parser.add_argument("--channel", type=str, default=None, help="PhysioNet channel name or index")
+    parser.add_argument("--speed", type=float, default=1.0, help="Multiple of real time, 0 sends as fast as possible")
+    parser.add_argument("--sampling_rate", type=float, default=None, help="For files whose header has none")
+    parser.add_argument("--loop", action="store_true", help="Replay the signal until interrupted")
+
+    args = parser.parse_args()
+
+    reader_type = args.reader or READER_EXTENSIONS.get(os.path.splitext(args.signal_path)[1].lower())
+    if reader_type is None:
+        parser.error(f"Cannot tell the reader of {args.signal_path}, pass --reader")
+    channel = int(args.channel) if args.channel and args.channel.isdigit() else args.channel
+
+    reader = get_signal_reader(reader_type, lazy=False, channel=channel)
+    sampling_rate = reader.read_sampling_rate(args.signal_path) or args.sampling_rate
+    if not sampling_rate:
+        parser.error("The file has no sampling rate, pass --sampling_rate")
+    signal = np.asarray(reader.read_signal(args.signal_path), dtype=np.float32)
+
+    output, sock = open_target(args.target)
+    try:
+        while True:
+            seconds = replay_signal(signal, sampling_rate, output, args.speed, lead=reader.lead)
+            print(f"Replayed {len(signal) / sampling_rate:.1f}s of signal in {seconds:.1f}s", file=sys.stderr)
+            if not args.loop:
+                break
+    except (BrokenPipeError, ConnectionError):
+        print("The viewer closed the stream", file=sys.stderr)
+    finally:
+        output.close()
+        if sock is not None:
+            sock.close()
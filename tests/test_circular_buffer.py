@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from utils.circular_buffer import CircularBuffer
+
+
+def expected_statistics(values, size):
+    window = np.array([np.nan if value is None else value for value in values[-size:]], dtype=float)
+    window = window[~np.isnan(window)]
+    if not len(window):
+        return None
+    return window.mean(), window.std(), window.min(), window.max()
+
+
+@pytest.mark.parametrize("size", [1, 5, 32])
+def test_running_statistics_match_numpy(size):
+    rng = np.random.default_rng(size)
+    values = list(rng.normal(40, 15, 200))
+    # Failed windows take up a slot without being counted
+    for position in rng.choice(len(values), 30, replace=False):
+        values[position] = None if position % 2 else np.nan
+
+    buffer = CircularBuffer(size)
+    for count, value in enumerate(values, start=1):
+        buffer.update(value)
+        expected = expected_statistics(values[:count], size)
+        if expected is None:
+            assert buffer.mean() is None and buffer.min() is None
+            continue
+        assert buffer.mean() == pytest.approx(expected[0])
+        assert buffer.std() == pytest.approx(expected[1], abs=1e-9)
+        assert (buffer.min(), buffer.max()) == (expected[2], expected[3])
+
+
+def test_extend_matches_single_updates():
+    values = list(np.random.default_rng(0).normal(40, 15, 50))
+    for batch in (values[:3], values):
+        single, batched = CircularBuffer(8), CircularBuffer(8)
+        for value in [1.0, 2.0] + batch:
+            single.update(value)
+        batched.update(1.0)
+        batched.update(2.0)
+        batched.extend(batch)
+        assert batched.mean() == pytest.approx(single.mean())
+        assert batched.std() == pytest.approx(single.std())
+        assert (batched.min(), batched.max()) == (single.min(), single.max())
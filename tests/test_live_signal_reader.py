@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from scipy.signal import resample_poly
+
+from utils.live_signal_reader import LiveSignalReader, RingSignal
+
+
+def test_ring_signal_keeps_absolute_indices():
+    ring = RingSignal(8)
+    ring.append(np.arange(5))
+    ring.append(np.arange(5, 12))
+
+    assert len(ring) == 12 and ring.first_index == 4
+    np.testing.assert_array_equal(ring[4:12], np.arange(4, 12))
+    np.testing.assert_array_equal(np.asarray(ring), np.arange(4, 12))
+    assert ring[11] == 11
+
+
+def test_ring_signal_raises_for_evicted_samples():
+    ring = RingSignal(8)
+    ring.append(np.arange(12))
+
+    with pytest.raises(IndexError):
+        ring[3:6]
+    with pytest.raises(IndexError):
+        ring[0]
+
+
+def test_ring_signal_counts_chunks_longer_than_capacity():
+    ring = RingSignal(8)
+    ring.append(np.arange(3))
+    ring.append(np.arange(3, 23))
+
+    assert len(ring) == 23 and ring.first_index == 15
+    np.testing.assert_array_equal(ring[15:23], np.arange(15, 23))
+
+    ring.append(np.arange(23, 26))
+    np.testing.assert_array_equal(ring[18:26], np.arange(18, 26))
+
+
+def test_live_stream_is_resampled_to_the_target_rate():
+    reader = LiveSignalReader(buffer_seconds=60, target_rate=512)
+    reader.signal = RingSignal(reader.buffer_seconds * reader.DEFAULT_SAMPLING_RATE)
+    signal = np.random.default_rng(0).normal(0, 1, 3600).astype(np.float32)
+
+    reader._decode_lines(b"# sampling_rate=360\n")
+    assert reader.sampling_rate == 512 and reader.native_sampling_rate == 360 and reader.is_resampled
+    for chunk in np.array_split(signal, 37):
+        reader._decode_lines(("\n".join(f"{value:.9g}" for value in chunk) + "\n").encode())
+
+    # The newest samples wait for the filter to see the samples after them
+    expected = resample_poly(signal.astype(np.float64), 64, 45)
+    received = np.asarray(reader.signal)
+    assert 0 < len(expected) - len(received) < 128
+    np.testing.assert_allclose(received, expected[:len(received)], atol=1e-5)
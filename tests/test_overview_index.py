@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from utils.overview_index import OverviewIndex
+
+
+def brute_force_bins(signal, bin_size):
+    edges = range(0, len(signal), bin_size)
+    return (np.array([signal[edge:edge + bin_size].min() for edge in edges]),
+            np.array([signal[edge:edge + bin_size].max() for edge in edges]))
+
+
+@pytest.fixture
+def signal():
+    return np.random.default_rng(0).normal(size=100_003).astype(np.float32)
+
+
+def test_levels_match_brute_force(signal, monkeypatch):
+    # Small build blocks make sure bins are merged across block boundaries
+    monkeypatch.setattr(OverviewIndex, "BUILD_BLOCK_BINS", 7)
+    index = OverviewIndex.build(signal)
+
+    assert index.n_samples == len(signal)
+    assert len(index.mins[-1]) == 1
+    for level in range(len(index.mins)):
+        mins, maxs = brute_force_bins(signal, index.bin_size(level))
+        np.testing.assert_array_equal(index.mins[level], mins)
+        np.testing.assert_array_equal(index.maxs[level], maxs)
+
+
+@pytest.mark.parametrize("start, stop, n_columns", [(0, 100_003, 500), (12_345, 80_000, 300), (1000, 1900, 800)])
+def test_envelope_bounds_the_span(signal, start, stop, n_columns):
+    index = OverviewIndex.build(signal)
+    mins, maxs = index.envelope(start, stop, n_columns, signal)
+
+    assert 0 < len(mins) <= n_columns
+    # Columns are aligned to bins, so together they cover the span and at most one bin beyond each end
+    slack = index.bin_size(index.level_for((stop - start) / n_columns) or 0)
+    covered = signal[max(0, start - slack):stop + slack]
+    assert mins.min() <= signal[start:stop].min() and mins.min() >= covered.min()
+    assert maxs.max() >= signal[start:stop].max() and maxs.max() <= covered.max()
+
+
+def test_save_and_load_round_trip(signal, tmp_path):
+    index = OverviewIndex.build(signal)
+    cache_path = str(tmp_path / "overview.npz")
+    index.save(cache_path)
+
+    loaded = OverviewIndex.load(cache_path)
+    assert loaded.n_samples == index.n_samples
+    for level in range(len(index.mins)):
+        np.testing.assert_array_equal(loaded.mins[level], index.mins[level])
+        np.testing.assert_array_equal(loaded.maxs[level], index.maxs[level])
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from scipy.signal import resample_poly
+
+from utils.resampling import StreamResampler, iter_resampled, rate_ratio, resample_signal, resampled_length
+
+RATE_PAIRS = [(360, 512), (500, 512), (1000, 512), (128, 512), (512, 256)]
+
+
+@pytest.mark.parametrize("native_rate, target_rate", RATE_PAIRS)
+@pytest.mark.parametrize("n_samples", [1, 700, 10007])
+@pytest.mark.parametrize("block_samples", [1, 1000, 4096])
+def test_blocks_match_resample_poly(native_rate, target_rate, n_samples, block_samples):
+    signal = np.random.default_rng(n_samples).normal(0, 1, n_samples).astype(np.float32)
+    expected = resample_poly(signal.astype(np.float64), *rate_ratio(native_rate, target_rate))
+
+    resampled = np.concatenate(list(iter_resampled(signal, native_rate, target_rate, block_samples)))
+    assert len(resampled) == len(expected) == resampled_length(n_samples, native_rate, target_rate)
+    np.testing.assert_allclose(resampled, expected, atol=1e-5)
+
+
+@pytest.mark.parametrize("native_rate, target_rate", RATE_PAIRS)
+def test_stream_matches_resample_poly(native_rate, target_rate):
+    rng = np.random.default_rng(native_rate)
+    signal = rng.normal(0, 1, 20000)
+    resampler = StreamResampler(native_rate, target_rate)
+    chunks, start = [], 0
+    while start < len(signal):
+        size = int(rng.integers(1, 700))
+        chunks.append(resampler.push(signal[start:start + size]))
+        start += size
+
+    streamed = np.concatenate(chunks)
+    expected = resample_signal(signal, native_rate, target_rate)
+    assert 0 < len(streamed) <= len(expected)
+    np.testing.assert_allclose(streamed, expected[:len(streamed)], atol=1e-5)
+
+
+def test_rate_ratio_is_reduced():
+    assert rate_ratio(500, 512) == (128, 125)
+    assert rate_ratio(360, 512) == (64, 45)
+    assert rate_ratio(512, 512) == (1, 1)
@@ -0,0 +1,71 @@
+import numpy as np
+
+from utils.tag_store import TagStore, TagWriter
+from utils.tagging_helpers import TaggedSignal
+
+
+def tagged_signal(seed, rmssd=40.0):
+    rng = np.random.default_rng(seed)
+    return TaggedSignal(rng.random(64).astype(np.float32), sorted(rng.choice(64, 3, replace=False).tolist()), rmssd)
+
+
+def test_append_flush_and_reload(tmp_path, monkeypatch):
+    monkeypatch.setattr(TagStore, "CHUNK_SIZE", 4)
+    store = TagStore(str(tmp_path), "rec", 64, 8)
+    tags = {position: tagged_signal(position, None if position == 3 else float(position)) for position in range(10)}
+    for position, tag in tags.items():
+        store.append(position, tag)
+    store.flush()
+
+    reloaded = TagStore(str(tmp_path), "rec", 64, 8)
+    assert len(reloaded.chunk_paths) == 3
+    assert len(reloaded) == len(tags)
+    for position, tag in tags.items():
+        loaded = reloaded.load(position)
+        np.testing.assert_array_equal(loaded.signal, tag.signal)
+        assert loaded.peaks == tag.peaks
+        assert loaded.rmssd == tag.rmssd
+
+    # The partially filled last chunk is reopened and keeps growing
+    reloaded.append(10, tagged_signal(10))
+    reloaded.flush()
+    assert len(TagStore(str(tmp_path), "rec", 64, 8).chunk_paths) == 3
+
+
+def test_load_all_keeps_the_last_write(tmp_path, monkeypatch):
+    monkeypatch.setattr(TagStore, "CHUNK_SIZE", 2)
+    store = TagStore(str(tmp_path), "rec", 64, 8)
+    for position, seed in [(5, 0), (1, 1), (5, 2), (2, 3), (1, 4)]:
+        store.append(position, tagged_signal(seed, float(seed)))
+
+    store.flush()
+
+    tags = TagStore(str(tmp_path), "rec", 64, 8).load_all()
+    assert tags["positions"].tolist() == [5, 2, 1]
+    assert tags["rmssd"].tolist() == [2.0, 3.0, 4.0]
+    np.testing.assert_array_equal(tags["windows"][0], tagged_signal(2).signal)
+    assert tags["peaks"][2].tolist() == tagged_signal(4).peaks
+    assert store.load(5).rmssd == 2.0
+
+
+def test_writer_serves_queued_tags(tmp_path):
+    writer = TagWriter(TagStore(str(tmp_path), "rec", 64, 8))
+    writer.append(3, tagged_signal(3))
+    assert writer.is_tagged(3)
+    assert writer.load(3).result().peaks == tagged_signal(3).peaks
+    writer.close()
+    assert TagStore(str(tmp_path), "rec", 64, 8).load(3).rmssd == 40.0
+
+
+def test_rates_get_separate_stores(tmp_path):
+    unrated = TagStore(str(tmp_path), "rec", 64, 8)
+    unrated.append(1, tagged_signal(1))
+    unrated.flush()
+
+    # A store written before rates were recorded is adopted by the record's native rate only
+    assert len(TagStore(str(tmp_path), "rec", 64, 8, sampling_rate=512)) == 0
+    native = TagStore(str(tmp_path), "rec", 64, 8, sampling_rate=360, adopt_unrated=True)
+    assert native.dir_path == str(tmp_path / "size_64" / "step_8" / "rate_360" / "rec")
+    assert native.load(1).peaks == tagged_signal(1).peaks
+    assert not (tmp_path / "size_64" / "step_8" / "rec").exists()
+    assert len(TagStore(str(tmp_path), "rec", 64, 8, sampling_rate=512, adopt_unrated=True)) == 0
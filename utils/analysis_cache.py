@@ -0,0 +1,183 @@
+import hashlib
+import os
+import sqlite3
+import time
+import numpy as np
+
+from typing import Optional
+
+from utils.constants import ANALYSIS_CACHE_DIR_NAME
+
+HASH_CHUNK_SIZE = 1 << 20
+# Approximate storage of one window row without its peak array
+WINDOW_ROW_BYTES = 48
+
+WINDOW_COLUMNS = ["classic_rmssd", "ml_rmssd", "peaks", "norm_min", "norm_max"]
+# NaN results are stored as NULL, these flags tell them apart from windows that were never analysed
+ANALYSED_COLUMNS = {"classic_rmssd": "classic_analysed", "ml_rmssd": "ml_analysed"}
+
+
+def record_files(signal_path: str) -> list[str]:
+    """Returns the files whose content defines a record, e.g. both the .hea and .dat of a PhysioNet record."""
+    stem, extension = os.path.splitext(signal_path)
+    if extension.lower() in (".atr", ".dat", ".hea"):
+        return [path for path in (f"{stem}.hea", f"{stem}.dat") if os.path.exists(path)]
+    return [signal_path]
+
+
+def hash_files(paths: list[str]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        with open(path, 'rb') as f:
+            while chunk := f.read(HASH_CHUNK_SIZE):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_digests(paths: list[str]) -> list[tuple[str, int, int, str]]:
+    """Returns (path, size, mtime_ns, digest) of every file, stat'ed before hashing so later edits show up as stale."""
+    digests = []
+    for path in paths:
+        stat = os.stat(path)
+        digests.append((os.path.abspath(path), stat.st_size, stat.st_mtime_ns, hash_files([path])))
+    return digests
+
+
+def model_fingerprint(model_path: Optional[str]) -> str:
+    if not model_path:
+        return ""
+    if os.path.isdir(model_path):
+        paths = sorted(os.path.join(root, name) for root, _, files in os.walk(model_path) for name in files)
+        return hash_files(paths)
+    return hash_files([model_path])
+
+
+class AnalysisCache:
+    """
+    On-disk SQLite store of per-window analysis results. Records are keyed by the
+    content hash of the recording and every parameter that changes the results,
+    and whole records are evicted least recently used first once max_bytes is exceeded.
+    """
+
+    def __init__(self, cache_path: str = os.path.join(ANALYSIS_CACHE_DIR_NAME, "analysis_cache.sqlite"),
+                 max_bytes: int = 256 * 1024 * 1024):
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self.max_bytes = max_bytes
+        self.connection = sqlite3.connect(cache_path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT);
+            CREATE TABLE IF NOT EXISTS records (
+                key TEXT PRIMARY KEY, last_access REAL, size_bytes INTEGER DEFAULT 0);
+            CREATE TABLE IF NOT EXISTS windows (
+                key TEXT, window_index INTEGER, classic_rmssd REAL, ml_rmssd REAL, peaks BLOB,
+                norm_min REAL, norm_max REAL, PRIMARY KEY (key, window_index));
+        """)
+
+        # Caches created before the analysed flags get them added, their NaN rows hold the text 'nan'
+        existing = {row[1] for row in self.connection.execute("PRAGMA table_info(windows)")}
+        for column in ANALYSED_COLUMNS.values():
+            if column not in existing:
+                self.connection.execute(f"ALTER TABLE windows ADD COLUMN {column} INTEGER DEFAULT 0")
+        self.connection.commit()
+
+    def stored_digest(self, path: str) -> Optional[str]:
+        """Returns the stored digest of a file while its size and mtime are unchanged."""
+        stat = os.stat(path)
+        row = self.connection.execute("SELECT size, mtime_ns, digest FROM file_hashes WHERE path = ?",
+                                      (os.path.abspath(path),)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        return None
+
+    def stale_files(self, signal_path: str) -> list[str]:
+        """Returns the record files that have to be hashed before the record can be keyed."""
+        return [path for path in record_files(signal_path) if self.stored_digest(path) is None]
+
+    def store_digests(self, digests: list[tuple[str, int, int, str]]) -> None:
+        self.connection.executemany("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)", digests)
+        self.connection.commit()
+
+    def content_hash(self, signal_path: str) -> str:
+        """Hashes the record content, reusing the stored digest while size and mtime are unchanged."""
+        self.store_digests(file_digests(self.stale_files(signal_path)))
+        digests = [self.stored_digest(path) or "" for path in record_files(signal_path)]
+        return hashlib.blake2b("".join(digests).encode(), digest_size=16).hexdigest()
+
+    def record_key(self, signal_path: str, window_size: int, window_step: int, sampling_rate: int,
+                   analyser_fingerprint: str = "", channel: str = "") -> str:
+        """Keys a record, hashing its stale files first. The viewer stores their digests beforehand, off the render thread."""
+        parts = [self.content_hash(signal_path), channel, str(window_size), str(window_step), str(sampling_rate),
+                 analyser_fingerprint]
+        return hashlib.blake2b(":".join(parts).encode(), digest_size=16).hexdigest()
+
+    def load_record(self, key: str) -> dict[int, dict]:
+        """Returns every cached window of a record keyed by window index."""
+        self.connection.execute("INSERT OR IGNORE INTO records (key, last_access) VALUES (?, ?)", (key, time.time()))
+        self.connection.execute("UPDATE records SET last_access = ? WHERE key = ?", (time.time(), key))
+        self.connection.commit()
+
+        rows = self.connection.execute(
+            f"SELECT window_index, {', '.join(WINDOW_COLUMNS + list(ANALYSED_COLUMNS.values()))} "
+            f"FROM windows WHERE key = ?", (key,))
+        return {row[0]: self._decode_row(row[1:]) for row in rows}
+
+    def put(self, key: str, window_index: int, **values) -> None:
+        """Stores the given columns of one window, keeping columns that are not passed."""
+        columns = [column for column in WINDOW_COLUMNS if column in values]
+        encoded = [self._encode_value(column, values[column]) for column in columns]
+        for column in list(columns):
+            if column in ANALYSED_COLUMNS and values[column] is not None:
+                columns.append(ANALYSED_COLUMNS[column])
+                encoded.append(1)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns)
+
+        self.connection.execute(
+            f"INSERT INTO windows (key, window_index, {', '.join(columns)}) "
+            f"VALUES (?, ?, {', '.join('?' * len(columns))}) "
+            f"ON CONFLICT (key, window_index) DO UPDATE SET {updates}",
+            [key, window_index, *encoded])
+
+    def commit(self, key: Optional[str] = None) -> None:
+        if key:
+            self.connection.execute(
+                "UPDATE records SET last_access = ?, size_bytes = (SELECT COALESCE(SUM(LENGTH(peaks)), 0) + COUNT(*) * ? "
+                "FROM windows WHERE windows.key = records.key) WHERE key = ?", (time.time(), WINDOW_ROW_BYTES, key))
+        self.connection.commit()
+        self.evict()
+
+    def evict(self) -> None:
+        total_bytes = 0
+        records = self.connection.execute("SELECT key, size_bytes FROM records ORDER BY last_access DESC").fetchall()
+        for position, (key, size_bytes) in enumerate(records):
+            total_bytes += size_bytes or 0
+            # The most recently used record is always kept
+            if total_bytes > self.max_bytes and position > 0:
+                self.connection.execute("DELETE FROM windows WHERE key = ?", (key,))
+                self.connection.execute("DELETE FROM records WHERE key = ?", (key,))
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.commit()
+        self.connection.close()
+
+    @staticmethod
+    def _encode_value(column: str, value):
+        if value is None:
+            return None
+        if column == "peaks":
+            return np.asarray(value, dtype=np.int32).tobytes()
+        return None if np.isnan(value) else float(value)
+
+    @staticmethod
+    def _decode_row(row) -> dict:
+        values = dict(zip(WINDOW_COLUMNS, row))
+        analysed = dict(zip(ANALYSED_COLUMNS, row[len(WINDOW_COLUMNS):]))
+        if values["peaks"] is not None:
+            values["peaks"] = np.frombuffer(values["peaks"], dtype=np.int32)
+        for column in ANALYSED_COLUMNS:
+            if values[column] is None and analysed[column]:
+                values[column] = np.nan
+            elif isinstance(values[column], str):
+                values[column] = float(values[column])
+        return values
@@ -0,0 +1,110 @@
+import queue
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from utils.profiling import profiler
+from utils.signal_analyser import SignalAnalyser, DLSignalAnalyser
+
+
+class AnalysisWorker:
+    """
+    Runs the classic and ML analysers off the render thread. Every analyser gets a
+    single worker thread so stateful analysers still see windows in order, and
+    finished values are delivered through a queue as (kind, window index, rmssd, peaks).
+    """
+
+    def __init__(self, hp_signal_analyser: SignalAnalyser, dl_signal_analyser: Optional[DLSignalAnalyser] = None):
+        self.hp_signal_analyser = hp_signal_analyser
+        self.dl_signal_analyser = dl_signal_analyser
+
+        self.executors = {"classic": ThreadPoolExecutor(max_workers=1, thread_name_prefix="classic-analysis")}
+        if dl_signal_analyser:
+            self.executors["ml"] = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ml-analysis")
+
+        self.results: queue.Queue = queue.Queue()
+        self.pending: dict[str, set[int]] = {kind: set() for kind in self.executors}
+
+        # Results submitted before the last reset are dropped
+        self.generation = 0
+
+    def set_dl_signal_analyser(self, dl_signal_analyser: DLSignalAnalyser) -> None:
+        """Adds the ML analyser once its model finished loading in the background."""
+        self.dl_signal_analyser = dl_signal_analyser
+        if "ml" not in self.executors:
+            self.executors["ml"] = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ml-analysis")
+            self.pending["ml"] = set()
+
+    def submit(self, index: int, window: np.ndarray,
+               load_upcoming_windows: Optional[Callable[[], np.ndarray]] = None) -> None:
+        self.pending["classic"].add(index)
+        self.executors["classic"].submit(self._run, "classic", self.generation, index, self._classic_rmssd, window, index)
+
+        if self.dl_signal_analyser:
+            self.pending["ml"].add(index)
+            self.executors["ml"].submit(self._run, "ml", self.generation, index, self._ml_rmssd, window, index,
+                                        load_upcoming_windows)
+
+    def is_pending(self, kind: str, index: int) -> bool:
+        return index in self.pending.get(kind, ())
+
+    def queue_depth(self) -> int:
+        """Number of submitted windows whose results have not been collected yet."""
+        return sum(len(pending) for pending in self.pending.values())
+
+    def poll(self) -> list[tuple[str, int, float, Optional[np.ndarray]]]:
+        """Returns all results that arrived since the last poll, without blocking."""
+        results = []
+        while True:
+            try:
+                generation, kind, index, rmssd, peaks = self.results.get_nowait()
+            except queue.Empty:
+                return results
+
+            if generation == self.generation:
+                self.pending[kind].discard(index)
+                results.append((kind, index, rmssd, peaks))
+
+    def reset(self) -> None:
+        """Discards queued work and resets the analysers once the work already running has finished."""
+        self.generation += 1
+        for kind, executor in self.executors.items():
+            self.pending[kind].clear()
+            executor.submit(self._reset_analyser, kind)
+
+    def shutdown(self) -> None:
+        self.generation += 1
+        for executor in self.executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, kind: str, generation: int, index: int, calculate: Callable, *args) -> None:
+        if generation != self.generation:
+            return
+
+        # Analysers may raise on windows where no beats can be detected
+        try:
+            with profiler.section(f"analysis.{kind}"):
+                rmssd = calculate(*args)
+        except Exception:
+            rmssd = np.nan
+
+        peaks = self.hp_signal_analyser.last_peaks if kind == "classic" else None
+        self.results.put((generation, kind, index, rmssd, peaks))
+
+    def _classic_rmssd(self, window: np.ndarray, index: int) -> float:
+        return self.hp_signal_analyser.calculate_RMSSD(window, index)
+
+    def _ml_rmssd(self, window: np.ndarray, index: int,
+                  load_upcoming_windows: Optional[Callable[[], np.ndarray]]) -> float:
+        if load_upcoming_windows and index not in self.dl_signal_analyser.prefetched:
+            # Score the upcoming windows in one batch so playback finds them ready
+            with profiler.section("analysis.ml.prefetch"):
+                self.dl_signal_analyser.prefetch(index, load_upcoming_windows())
+        return self.dl_signal_analyser.calculate_RMSSD(window, index)
+
+    def _reset_analyser(self, kind: str) -> None:
+        if kind == "classic":
+            self.hp_signal_analyser.reset()
+        else:
+            self.dl_signal_analyser.clear_prefetched()
@@ -1,17 +1,190 @@
+import math
+import time
 import numpy as np
 
-class CircularBuffer:
+from collections import deque
+from typing import Iterable, Optional
+
+
+def is_valid(value) -> bool:
+    return value is not None and not math.isnan(value)
+
+
+class RollingStatistics:
+    """
+    Running count, mean, variance, min and max over a FIFO window of values,
+    updated in O(1) (amortized for min/max) per added or evicted value.
+    Values are identified by an increasing key so evictions can find their min/max entries.
+    """
+
+    def __init__(self):
+        self._reset_statistics()
+
+    def _reset_statistics(self) -> None:
+        self.count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        # Monotonic queues of (key, value) whose fronts hold the current min and max
+        self._min_queue = deque()
+        self._max_queue = deque()
+
+    def _add(self, key, value: float) -> None:
+        self.count += 1
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+
+        while self._min_queue and self._min_queue[-1][1] >= value:
+            self._min_queue.pop()
+        self._min_queue.append((key, value))
+        while self._max_queue and self._max_queue[-1][1] <= value:
+            self._max_queue.pop()
+        self._max_queue.append((key, value))
+
+    def _remove(self, key, value: float) -> None:
+        if self.count <= 1:
+            self._reset_statistics()
+            return
+
+        delta = value - self._mean
+        self._mean -= delta / (self.count - 1)
+        self._m2 = max(0.0, self._m2 - delta * (value - self._mean))
+        self.count -= 1
+
+        if self._min_queue and self._min_queue[0][0] == key:
+            self._min_queue.popleft()
+        if self._max_queue and self._max_queue[0][0] == key:
+            self._max_queue.popleft()
+
+    def mean(self) -> Optional[float]:
+        return self._mean if self.count > 0 else None
+
+    def variance(self) -> Optional[float]:
+        return self._m2 / self.count if self.count > 0 else None
+
+    def std(self) -> Optional[float]:
+        variance = self.variance()
+        return math.sqrt(variance) if variance is not None else None
+
+    def min(self) -> Optional[float]:
+        return self._min_queue[0][1] if self._min_queue else None
+
+    def max(self) -> Optional[float]:
+        return self._max_queue[0][1] if self._max_queue else None
+
+
+class CircularBuffer(RollingStatistics):
+    """Statistics over the last `size` updates. None and NaN take up a slot but are not counted."""
+
     def __init__(self, size: int):
+        super().__init__()
         self.size = size
         self.buffer = np.full(size, np.nan)
         self.index = 0
+        self.total_updates = 0
+
+    def update(self, value: float) -> Optional[float]:
+        value = float(value) if is_valid(value) else np.nan
+
+        evicted = self.buffer[self.index]
+        if not np.isnan(evicted):
+            self._remove(self.total_updates - self.size, evicted)
 
-    def update(self, value: float) -> float:
         self.buffer[self.index] = value
+        if not np.isnan(value):
+            self._add(self.total_updates, value)
+
         self.index = (self.index + 1) % self.size
+        self.total_updates += 1
+
+        return self.mean()
+
+    def extend(self, values: Iterable[float]) -> Optional[float]:
+        values = np.array([value if is_valid(value) else np.nan for value in values], dtype=float)
+
+        # Only the last `size` values survive, so a long batch replaces the whole buffer
+        if len(values) >= self.size:
+            skipped = len(values) - self.size
+            self.buffer = np.full(self.size, np.nan)
+            self.index = 0
+            self.total_updates += skipped
+            self._reset_statistics()
+            values = values[skipped:]
+
+        for value in values:
+            self.update(value)
+
+        return self.mean()
+
+
+class ExponentialMovingStatistics:
+    """Exponentially weighted mean and variance, where alpha is the weight of the newest value."""
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.count = 0
+        self._mean = 0.0
+        self._variance = 0.0
+
+    def update(self, value: float) -> Optional[float]:
+        if is_valid(value):
+            if self.count == 0:
+                self._mean = float(value)
+            else:
+                delta = value - self._mean
+                increment = self.alpha * delta
+                self._mean += increment
+                self._variance = (1 - self.alpha) * (self._variance + delta * increment)
+            self.count += 1
+
+        return self.mean()
+
+    def extend(self, values: Iterable[float]) -> Optional[float]:
+        for value in values:
+            self.update(value)
+        return self.mean()
+
+    def mean(self) -> Optional[float]:
+        return self._mean if self.count > 0 else None
+
+    def variance(self) -> Optional[float]:
+        return self._variance if self.count > 0 else None
+
+    def std(self) -> Optional[float]:
+        return math.sqrt(self._variance) if self.count > 0 else None
+
+
+class TimeWindowStatistics(RollingStatistics):
+    """Statistics over the values received in the last `duration` seconds."""
+
+    def __init__(self, duration: float):
+        super().__init__()
+        self.duration = duration
+        self.values = deque()
+        # Timestamps may repeat, so values are identified by their arrival order
+        self.total_updates = 0
+
+    def update(self, value: float, timestamp: Optional[float] = None) -> Optional[float]:
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        if is_valid(value):
+            self.values.append((self.total_updates, timestamp, float(value)))
+            self._add(self.total_updates, float(value))
+            self.total_updates += 1
+
+        self.expire(timestamp)
+        return self.mean()
+
+    def extend(self, values: Iterable[float], timestamps: Optional[Iterable[float]] = None) -> Optional[float]:
+        values = list(values)
+        if timestamps is None:
+            timestamps = [time.monotonic()] * len(values)
 
+        for value, timestamp in zip(values, timestamps):
+            self.update(value, timestamp)
         return self.mean()
 
-    def mean(self) -> float:
-        non_nan_values = self.buffer[~np.isnan(self.buffer)]
-        return np.mean(non_nan_values) if non_nan_values.size > 0 else None
+    def expire(self, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        while self.values and self.values[0][1] <= now - self.duration:
+            key, _, value = self.values.popleft()
+            self._remove(key, value)
@@ -1,9 +1,6 @@
-import pygame
-
 SCREEN_WIDTH = 1000
 SCREEN_HEIGHT = 600
 SIDEBAR_WIDTH = 200
-PLOT_SCALE_FACTOR = 200
 
 GRID_COLOR = (200, 200, 200)
 WHITE = (255, 255, 255)
@@ -19,7 +16,12 @@ GRADIENT_COLOR_2 = (70, 130, 180)
 
 AUTO_DELAY_TIME = 0.1
 
-pygame.init()
-BUTTON_FONT = pygame.font.Font(None, 20)
+BUTTON_FONT_SIZE = 20
 
 TAGGED_SIGNALS_DIR_NAME = "tagged_signals"
+SIGNAL_CACHE_DIR_NAME = "signal_cache"
+ANALYSIS_CACHE_DIR_NAME = "analysis_cache"
+OVERVIEW_CACHE_DIR_NAME = "overview_cache"
+
+# Ways of running the E2E model, see utils.model_loader.compile_E2E_Model
+MODEL_BACKENDS = ["eager", "function", "tflite"]
@@ -0,0 +1,267 @@
+import os
+import socket
+import sys
+import threading
+import numpy as np
+
+from typing import Optional
+
+from utils.resampling import StreamResampler
+from utils.signal_loader import SignalReader, WindowView
+
+
+class RingSignal:
+    """
+    Bounded buffer of the most recent samples of an unbounded stream. Indices are absolute
+    sample positions since the stream started, so windows keep their index while newer
+    samples arrive; samples older than the capacity are overwritten.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.samples = np.zeros(capacity, dtype=np.float32)
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.total
+
+    @property
+    def first_index(self) -> int:
+        """Oldest sample still held in the buffer."""
+        return max(0, self.total - self.capacity)
+
+    def append(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float32)
+        count = len(values)
+        # Of a chunk longer than the buffer only the newest samples are kept, they still all count
+        values = values[-self.capacity:]
+        with self.lock:
+            start = (self.total + count - len(values)) % self.capacity
+            head = min(len(values), self.capacity - start)
+            self.samples[start:start + head] = values[:head]
+            self.samples[:len(values) - head] = values[head:]
+            self.total += count
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+
+        with self.lock:
+            start, stop, _ = key.indices(self.total)
+            if start < self.first_index:
+                raise IndexError(f"Samples before {self.first_index} are no longer buffered")
+            positions = np.arange(start, max(start, stop)) % self.capacity
+            return self.samples[positions]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self[self.first_index:], dtype=dtype)
+
+
+class BackpressurePolicy:
+    """
+    Chooses the next live window to show and analyse. While the analysers keep up every
+    window is taken in order. Once they fall behind, "drop" jumps straight to the newest
+    window and "decimate" keeps every n-th window, doubling n until the backlog clears.
+    """
+    MODES = ("drop", "decimate")
+
+    def __init__(self, mode: str = "drop", max_lag: int = 4, max_pending: int = 4):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown backpressure mode {mode!r}, available: {self.MODES}")
+        self.mode = mode
+        self.max_lag = max_lag
+        self.max_pending = max_pending
+        self.stride = 1
+        self.skipped = 0
+
+    def next_index(self, current: int, newest: int, pending: int) -> Optional[int]:
+        """Returns the window to advance to, None to wait for the analysers or for new samples."""
+        if newest <= current or pending >= self.max_pending:
+            return None
+
+        lag = newest - current
+        if lag <= self.max_lag:
+            self.stride = 1
+            return current + 1
+
+        if self.mode == "drop":
+            self.skipped += lag - 1
+            return newest
+
+        self.stride = min(self.stride * 2, lag)
+        self.skipped += self.stride - 1
+        return current + self.stride
+
+
+class LiveWindowView(WindowView):
+    # Live windows are read one at a time as they complete, blocks would reach into evicted samples
+    CACHE_BLOCK_SIZE = 1
+
+
+class LiveSignalReader(SignalReader):
+    """
+    Reads samples from a live source into a ring buffer on a background thread. The source
+    is "-" for stdin, "tcp://host:port" or "unix:///path" for a local socket the reader
+    listens on. The stream is text with one or more samples per line; lines starting with
+    '#' carry "key=value" metadata such as "# sampling_rate=512". Streams announcing another
+    rate than target_rate are resampled as they arrive.
+    """
+    BUFFER_SECONDS = 600
+    # Capacity used until the stream announces its sampling rate
+    DEFAULT_SAMPLING_RATE = 512
+    CHUNK_BYTES = 1 << 16
+
+    def __init__(self, buffer_seconds: float = BUFFER_SECONDS, target_rate: Optional[float] = None):
+        super().__init__(lazy=True, target_rate=target_rate)
+        self.buffer_seconds = buffer_seconds
+        self.source = None
+        self.listener: Optional[socket.socket] = None
+        self.connection: Optional[socket.socket] = None
+        self.thread: Optional[threading.Thread] = None
+        self.stopped = threading.Event()
+        self.connected = False
+        self.resampler: Optional[StreamResampler] = None
+
+    @property
+    def last_window_index(self) -> int:
+        return (len(self.signal) - self.window_size) // self.window_step
+
+    @property
+    def first_window_index(self) -> int:
+        return -(-self.signal.first_index // self.window_step) if self.signal is not None else 0
+
+    def configure_reader(self, source: str, window_size: int, window_step: int):
+        self.stop()
+        self.source = source
+        self.window_size = window_size
+        self.window_step = window_step
+        self.signal = RingSignal(int(self.buffer_seconds * self.DEFAULT_SAMPLING_RATE))
+        self.windows = LiveWindowView(self)
+        self.resampler = None
+
+        self.stopped = threading.Event()
+        self.listener = self._listen(source)
+        self.thread = threading.Thread(target=self._receive, name="live-ingest", daemon=True)
+        self.thread.start()
+
+    def clear_reader(self):
+        self.stop()
+        super().clear_reader()
+        self.source = None
+
+    def stop(self) -> None:
+        self.stopped.set()
+        for sock in (self.connection, self.listener):
+            if sock is not None:
+                try:
+                    # Shutting down wakes up a recv blocked on the connection
+                    if sock is self.connection:
+                        sock.shutdown(socket.SHUT_RDWR)
+                    sock.close()
+                except OSError:
+                    pass
+        self.connection = self.listener = None
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1)
+        self.thread = None
+
+    def read_signal(self, signal_path: str) -> np.ndarray:
+        return np.asarray(self.signal) if self.signal is not None else np.empty(0, dtype=np.float32)
+
+    def _listen(self, source: str) -> Optional[socket.socket]:
+        if source in ("-", "stdin"):
+            return None
+
+        if source.startswith("unix://"):
+            path = source[len("unix://"):]
+            if os.path.exists(path):
+                os.unlink(path)
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(path)
+        elif source.startswith("tcp://"):
+            host, _, port = source[len("tcp://"):].rpartition(":")
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((host or "127.0.0.1", int(port)))
+        else:
+            raise ValueError(f"Unknown live source {source!r}, expected '-', tcp://host:port or unix:///path")
+
+        listener.listen(1)
+        # Accepting wakes up regularly to notice that the reader was stopped
+        listener.settimeout(0.5)
+        return listener
+
+    def _receive(self) -> None:
+        if self.listener is None:
+            self.connected = True
+            self._ingest(lambda: os.read(sys.stdin.fileno(), self.CHUNK_BYTES))
+            self.connected = False
+            return
+
+        # A sender that disconnects can reconnect and the stream continues in the same buffer
+        while not self.stopped.is_set():
+            try:
+                self.connection, _ = self.listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+
+            self.connection.settimeout(None)
+            self.connected = True
+            try:
+                self._ingest(lambda: self.connection.recv(self.CHUNK_BYTES))
+            except OSError:
+                pass
+            finally:
+                self.connected = False
+
+    def _ingest(self, read) -> None:
+        remainder = b""
+        while not self.stopped.is_set():
+            data = read()
+            if not data:
+                break
+
+            data = remainder + data
+            split = data.rfind(b"\n") + 1
+            remainder = data[split:]
+            if split:
+                self._decode_lines(data[:split])
+
+    def _decode_lines(self, data: bytes) -> None:
+        if b"#" in data:
+            lines = data.split(b"\n")
+            for line in lines:
+                if line.startswith(b"#"):
+                    self._apply_metadata(line[1:].decode('utf-8', errors='replace'))
+            data = b"\n".join(line for line in lines if not line.startswith(b"#"))
+
+        # Samples may be separated by whitespace or commas
+        values = np.fromstring(data.replace(b",", b" ").decode('ascii', errors='ignore'), dtype=np.float32, sep=' ')
+        if self.resampler is not None:
+            values = self.resampler.push(values)
+        if len(values):
+            self.signal.append(values)
+
+    def _apply_metadata(self, line: str) -> None:
+        key, _, value = line.strip().partition("=")
+        key, value = key.strip().lower(), value.strip()
+        if not key:
+            return
+
+        self.metadata[key] = value
+        if key == "lead":
+            self.lead = value
+        elif key == "sampling_rate":
+            native_rate = float(value)
+            resampled = bool(self.target_rate) and native_rate != self.target_rate
+            self.resampler = StreamResampler(native_rate, self.target_rate) if resampled else None
+            # The viewer reads the rates while they change, the native rate marks the stream resampled
+            self.sampling_rate = float(self.target_rate) if resampled else native_rate
+            self.native_sampling_rate = self.header_sampling_rate = native_rate
+            # The buffer is resized for the announced rate while it is still empty
+            capacity = int(self.buffer_seconds * self.sampling_rate)
+            if len(self.signal) == 0 and capacity != self.signal.capacity:
+                self.signal = RingSignal(capacity)
@@ -11,3 +11,137 @@ def calculate_rmssd(peak_indices: list[int], sampling_rate: int) -> float:
     mean_squared_diff = np.mean(squared_diffs)
 
     return np.sqrt(mean_squared_diff).astype(float)
+
+
+def match_peaks(detected: np.ndarray, reference: np.ndarray, tolerance: int,
+                start: int = None, stop: int = None) -> tuple[int, int, int]:
+    """
+    Matches detected peaks one-to-one to reference beats within `tolerance` samples and
+    returns (true positives, false positives, false negatives). Only reference beats and
+    unmatched detections in [start, stop) are counted, so beats at window edges can be skipped.
+    """
+    detected = np.sort(np.asarray(detected, dtype=np.int64))
+    reference = np.sort(np.asarray(reference, dtype=np.int64))
+    start = -np.inf if start is None else start
+    stop = np.inf if stop is None else stop
+
+    detected_matched = np.zeros(len(detected), dtype=bool)
+    reference_matched = np.zeros(len(reference), dtype=bool)
+    i = j = 0
+    while i < len(detected) and j < len(reference):
+        distance = detected[i] - reference[j]
+        if abs(distance) <= tolerance:
+            detected_matched[i] = reference_matched[j] = True
+            i += 1
+            j += 1
+        elif distance < 0:
+            i += 1
+        else:
+            j += 1
+
+    in_detected = (detected >= start) & (detected < stop)
+    in_reference = (reference >= start) & (reference < stop)
+    return (int(np.sum(reference_matched & in_reference)), int(np.sum(~detected_matched & in_detected)),
+            int(np.sum(~reference_matched & in_reference)))
+
+
+def peak_detection_scores(true_positives: int, false_positives: int, false_negatives: int) -> dict[str, float]:
+    """Sensitivity, positive predictive value and F1 score of a peak detector."""
+    sensitivity = true_positives / (true_positives + false_negatives) if true_positives + false_negatives else np.nan
+    ppv = true_positives / (true_positives + false_positives) if true_positives + false_positives else np.nan
+    f1 = 2 * true_positives / (2 * true_positives + false_positives + false_negatives) if true_positives else 0.0
+    return {"sensitivity": sensitivity, "ppv": ppv, "f1": f1}
+
+
+class AgreementStatistics:
+    """
+    Bland-Altman agreement of two estimators of the same quantity, accumulated in batches
+    with mergeable moments (Chan et al.), so records can be scored in chunks on different
+    workers and combined without keeping the per-window values. Differences are b - a.
+    """
+    # Limits of agreement span this many standard deviations of the differences around the bias
+    LIMITS_OF_AGREEMENT_SD = 1.96
+
+    def __init__(self):
+        self.count = 0
+        self.missing = 0
+        self.mean_a = 0.0
+        self.mean_b = 0.0
+        self.mean_diff = 0.0
+        self.m2_a = 0.0
+        self.m2_b = 0.0
+        self.m2_diff = 0.0
+        # Sum of products of the deviations of a and b, the numerator of their covariance
+        self.co_moment = 0.0
+        self.abs_diff_sum = 0.0
+
+    @classmethod
+    def from_values(cls, a: np.ndarray, b: np.ndarray) -> "AgreementStatistics":
+        statistics = cls()
+        statistics.update(a, b)
+        return statistics
+
+    def update(self, a: np.ndarray, b: np.ndarray) -> None:
+        """Adds the pairs where both estimates are finite, the others are only counted as missing."""
+        a = np.asarray(a, dtype=np.float64)
+        b = np.asarray(b, dtype=np.float64)
+        valid = np.isfinite(a) & np.isfinite(b)
+        a, b = a[valid], b[valid]
+
+        batch = AgreementStatistics()
+        batch.missing = int(np.sum(~valid))
+        batch.count = len(a)
+        if batch.count:
+            diff = b - a
+            batch.mean_a, batch.mean_b, batch.mean_diff = float(a.mean()), float(b.mean()), float(diff.mean())
+            batch.m2_a = float(np.sum((a - batch.mean_a) ** 2))
+            batch.m2_b = float(np.sum((b - batch.mean_b) ** 2))
+            batch.m2_diff = float(np.sum((diff - batch.mean_diff) ** 2))
+            batch.co_moment = float(np.sum((a - batch.mean_a) * (b - batch.mean_b)))
+            batch.abs_diff_sum = float(np.sum(np.abs(diff)))
+        self.merge(batch)
+
+    def merge(self, other: "AgreementStatistics") -> "AgreementStatistics":
+        self.missing += other.missing
+        if other.count == 0:
+            return self
+
+        count = self.count + other.count
+        weight = self.count * other.count / count
+        delta_a = other.mean_a - self.mean_a
+        delta_b = other.mean_b - self.mean_b
+        delta_diff = other.mean_diff - self.mean_diff
+
+        self.m2_a += other.m2_a + delta_a ** 2 * weight
+        self.m2_b += other.m2_b + delta_b ** 2 * weight
+        self.m2_diff += other.m2_diff + delta_diff ** 2 * weight
+        self.co_moment += other.co_moment + delta_a * delta_b * weight
+        self.mean_a += delta_a * other.count / count
+        self.mean_b += delta_b * other.count / count
+        self.mean_diff += delta_diff * other.count / count
+        self.abs_diff_sum += other.abs_diff_sum
+        self.count = count
+        return self
+
+    def summary(self) -> dict[str, float]:
+        """Bias, limits of agreement, MAE, RMSE and Pearson correlation of the accumulated pairs."""
+        if self.count == 0:
+            return {"n": 0, "missing": self.missing, "mean_a": np.nan, "mean_b": np.nan, "bias": np.nan,
+                    "sd_diff": np.nan, "loa_lower": np.nan, "loa_upper": np.nan, "mae": np.nan, "rmse": np.nan,
+                    "pearson_r": np.nan}
+
+        sd_diff = np.sqrt(self.m2_diff / (self.count - 1)) if self.count > 1 else np.nan
+        spread = np.sqrt(self.m2_a * self.m2_b)
+        return {
+            "n": self.count,
+            "missing": self.missing,
+            "mean_a": self.mean_a,
+            "mean_b": self.mean_b,
+            "bias": self.mean_diff,
+            "sd_diff": sd_diff,
+            "loa_lower": self.mean_diff - self.LIMITS_OF_AGREEMENT_SD * sd_diff,
+            "loa_upper": self.mean_diff + self.LIMITS_OF_AGREEMENT_SD * sd_diff,
+            "mae": self.abs_diff_sum / self.count,
+            "rmse": np.sqrt(self.m2_diff / self.count + self.mean_diff ** 2),
+            "pearson_r": self.co_moment / spread if spread > 0 else np.nan,
+        }
@@ -1,5 +1,9 @@
+import os
+import numpy as np
 import tensorflow as tf
 
+from utils.constants import MODEL_BACKENDS
+
 class ConditionalActivationLayer(tf.keras.layers.Layer):
 
     def __init__(self, f1, f2, **kwargs):
@@ -25,3 +29,77 @@ def load_E2E_Model(model_path):
     custom_objects = {"ConditionalActivationLayer": ConditionalActivationLayer}
     model = tf.keras.models.load_model(model_path, custom_objects=custom_objects)
     return model
+
+
+class TFLiteE2EModel:
+    """Callable wrapper around a TFLite interpreter that mimics the Keras model call."""
+
+    def __init__(self, tflite_path, num_threads=None):
+        self.interpreter = tf.lite.Interpreter(model_path=tflite_path, num_threads=num_threads)
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+        self.input_shape = None
+
+    def __call__(self, inputs):
+        inputs = np.asarray(inputs, dtype=np.float32)
+
+        # The interpreter is only resized when the batch shape changes
+        if self.input_shape != inputs.shape:
+            self.interpreter.resize_tensor_input(self.input_index, inputs.shape)
+            self.interpreter.allocate_tensors()
+            self.input_shape = inputs.shape
+
+        self.interpreter.set_tensor(self.input_index, inputs)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_index).copy()
+
+
+def trace_E2E_Model(model):
+    window_size = model.input_shape[1]
+    input_signature = [tf.TensorSpec([None, window_size, 1], tf.float32)]
+    return tf.function(lambda inputs: model(inputs, training=False), input_signature=input_signature)
+
+
+def newest_mtime(model_path):
+    """Modification time of the model, the newest of its files for SavedModel directories."""
+    if not os.path.isdir(model_path):
+        return os.path.getmtime(model_path)
+    return max([os.path.getmtime(os.path.join(root, name)) for root, _, files in os.walk(model_path) for name in files],
+               default=os.path.getmtime(model_path))
+
+
+def convert_E2E_Model_to_TFLite(model, model_path):
+    """Converts the model to TFLite, reusing the cached conversion next to the model if it is up to date."""
+    tflite_path = f"{model_path.rstrip(os.sep)}.tflite"
+    if os.path.exists(tflite_path) and os.path.getmtime(tflite_path) >= newest_mtime(model_path):
+        return tflite_path
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    tflite_model = converter.convert()
+
+    tmp_path = f"{tflite_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(tflite_model)
+    os.replace(tmp_path, tflite_path)
+
+    return tflite_path
+
+
+def compile_E2E_Model(model, model_path, backend="function"):
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"Unknown model backend {backend!r}, available: {MODEL_BACKENDS}")
+    if backend == "function":
+        return trace_E2E_Model(model)
+    elif backend == "tflite":
+        return TFLiteE2EModel(convert_E2E_Model_to_TFLite(model, model_path))
+    return model
+
+
+def compiled_model_matches(eager_model, compiled_model, window_size=None, batch_size=4, rtol=1e-3, atol=1e-2):
+    """Compares compiled and eager outputs on random windows in the normalized [0, 1] range."""
+    window_size = window_size or eager_model.input_shape[1]
+    inputs = np.random.default_rng(0).random((batch_size, window_size, 1), dtype=np.float32)
+
+    eager_output = np.asarray(eager_model(inputs, training=False))
+    compiled_output = np.asarray(compiled_model(inputs))
+    return np.allclose(eager_output, compiled_output, rtol=rtol, atol=atol)
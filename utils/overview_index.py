@@ -0,0 +1,135 @@
+import hashlib
+import os
+import numpy as np
+
+from typing import Optional
+
+from utils.analysis_cache import record_files
+from utils.constants import OVERVIEW_CACHE_DIR_NAME
+
+
+class OverviewIndex:
+    """
+    Min/max pyramid of a recording. Level 0 holds the min and max of every BASE_BIN_SIZE
+    samples and every further level merges LEVEL_FACTOR bins of the level below, so any
+    span of the record can be drawn at screen resolution from a few thousand values.
+    """
+    BASE_BIN_SIZE = 64
+    LEVEL_FACTOR = 4
+    # Level 0 bins computed per block while building, bounds the memory read at once
+    BUILD_BLOCK_BINS = 1 << 16
+
+    def __init__(self, mins: list[np.ndarray], maxs: list[np.ndarray], n_samples: int, base_bin_size: int = BASE_BIN_SIZE):
+        self.mins = mins
+        self.maxs = maxs
+        self.n_samples = n_samples
+        self.base_bin_size = base_bin_size
+
+    @classmethod
+    def build(cls, signal, base_bin_size: int = BASE_BIN_SIZE) -> "OverviewIndex":
+        """Builds the pyramid in blocks, so memory-mapped signals are never loaded as a whole."""
+        n_samples = len(signal)
+        block_size = base_bin_size * cls.BUILD_BLOCK_BINS
+        mins, maxs = [], []
+        for start in range(0, n_samples, block_size):
+            block = np.asarray(signal[start:min(n_samples, start + block_size)], dtype=np.float32)
+            block_mins, block_maxs = cls._reduce_bins(block, block, base_bin_size)
+            mins.append(block_mins)
+            maxs.append(block_maxs)
+
+        level_mins = np.concatenate(mins) if mins else np.empty(0, dtype=np.float32)
+        level_maxs = np.concatenate(maxs) if maxs else np.empty(0, dtype=np.float32)
+        pyramid_mins, pyramid_maxs = [level_mins], [level_maxs]
+        while len(level_mins) > 1:
+            level_mins, level_maxs = cls._reduce_bins(level_mins, level_maxs, cls.LEVEL_FACTOR)
+            pyramid_mins.append(level_mins)
+            pyramid_maxs.append(level_maxs)
+
+        return cls(pyramid_mins, pyramid_maxs, n_samples, base_bin_size)
+
+    @classmethod
+    def load_or_build(cls, signal, cache_path: str) -> "OverviewIndex":
+        if os.path.exists(cache_path):
+            try:
+                return cls.load(cache_path)
+            except (OSError, ValueError, KeyError):
+                pass
+
+        index = cls.build(signal)
+        index.save(cache_path)
+        return index
+
+    @classmethod
+    def load(cls, cache_path: str) -> "OverviewIndex":
+        with np.load(cache_path) as data:
+            n_levels = int(data["n_levels"])
+            return cls([data[f"mins_{level}"] for level in range(n_levels)],
+                       [data[f"maxs_{level}"] for level in range(n_levels)],
+                       int(data["n_samples"]), int(data["base_bin_size"]))
+
+    def save(self, cache_path: str) -> None:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        levels = {f"mins_{level}": mins for level, mins in enumerate(self.mins)}
+        levels.update({f"maxs_{level}": maxs for level, maxs in enumerate(self.maxs)})
+
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, n_levels=len(self.mins), n_samples=self.n_samples, base_bin_size=self.base_bin_size, **levels)
+        os.replace(tmp_path, cache_path)
+
+    def bin_size(self, level: int) -> int:
+        return self.base_bin_size * self.LEVEL_FACTOR ** level
+
+    def level_for(self, samples_per_column: float) -> Optional[int]:
+        """Returns the coarsest level with at least one bin per column, None if columns are finer than level 0."""
+        if samples_per_column < self.base_bin_size:
+            return None
+        level = int(np.log(samples_per_column / self.base_bin_size) / np.log(self.LEVEL_FACTOR))
+        return min(level, len(self.mins) - 1)
+
+    def envelope(self, start: int, stop: int, n_columns: int, signal=None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the min and max of every column when samples [start, stop) are spread over
+        n_columns. Spans too short for level 0 are reduced from the raw signal, if given.
+        """
+        start, stop = max(0, start), min(self.n_samples, stop)
+        if stop <= start:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32)
+
+        level = self.level_for((stop - start) / n_columns)
+        if level is None:
+            if signal is None:
+                level = 0
+            else:
+                values = np.asarray(signal[start:stop], dtype=np.float32)
+                edges = np.linspace(0, len(values), min(n_columns, len(values)) + 1).astype(int)[:-1]
+                return np.minimum.reduceat(values, edges), np.maximum.reduceat(values, edges)
+
+        bin_size = self.bin_size(level)
+        first_bin, last_bin = start // bin_size, -(-stop // bin_size)
+        mins, maxs = self.mins[level][first_bin:last_bin], self.maxs[level][first_bin:last_bin]
+
+        edges = np.linspace(0, len(mins), min(n_columns, len(mins)) + 1).astype(int)[:-1]
+        return np.minimum.reduceat(mins, edges), np.maximum.reduceat(maxs, edges)
+
+    @staticmethod
+    def _reduce_bins(mins: np.ndarray, maxs: np.ndarray, factor: int) -> tuple[np.ndarray, np.ndarray]:
+        # A partial last bin is padded with values that do not change its min and max
+        padding = -len(mins) % factor
+        if padding:
+            mins = np.concatenate((mins, np.full(padding, mins[-1], dtype=mins.dtype)))
+            maxs = np.concatenate((maxs, np.full(padding, maxs[-1], dtype=maxs.dtype)))
+        return mins.reshape(-1, factor).min(axis=1), maxs.reshape(-1, factor).max(axis=1)
+
+
+def overview_cache_path(signal_path: str, channel: str = "", sampling_rate: Optional[float] = None) -> str:
+    """
+    Cache file of a record channel's overview, invalidated when any file of the record changes.
+    Overviews of the channel resampled to sampling_rate are kept separately.
+    """
+    stats = [os.stat(path) for path in record_files(signal_path)]
+    parts = [os.path.abspath(signal_path), channel] + ([f"{sampling_rate:g}hz"] if sampling_rate else [])
+    key = ":".join(parts + [f"{stat.st_size}:{stat.st_mtime_ns}" for stat in stats])
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(signal_path))[0]
+    return os.path.join(OVERVIEW_CACHE_DIR_NAME, f"{name}_{digest}.npz")
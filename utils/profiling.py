@@ -0,0 +1,118 @@
+import json
+import os
+import threading
+import time
+
+from collections import deque
+from contextlib import nullcontext
+from typing import Optional
+
+from utils.circular_buffer import ExponentialMovingStatistics
+
+# Shared no-op section handed out while profiling is disabled
+NULL_SECTION = nullcontext()
+
+
+class Section:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class Profiler:
+    """
+    Timers and counters for the hot paths. Stage durations are smoothed per name, and when
+    tracing every section is also kept as a Chrome trace event. A disabled profiler hands
+    out a shared no-op context manager, so instrumented code only pays for one call.
+    """
+    # Upper bound of kept trace events, older events are dropped first
+    TRACE_LIMIT = 500_000
+
+    def __init__(self, enabled: bool = False, tracing: bool = False, smoothing: float = 0.1):
+        self.smoothing = smoothing
+        self.lock = threading.Lock()
+        self.configure(enabled, tracing)
+
+    def configure(self, enabled: bool, tracing: bool = False) -> None:
+        self.enabled = enabled or tracing
+        self.tracing = tracing
+        self.stages: dict[str, ExponentialMovingStatistics] = {}
+        self.counters: dict[str, int] = {}
+        self.events: deque = deque(maxlen=self.TRACE_LIMIT)
+        self.thread_names: dict[int, str] = {}
+        self.origin = time.perf_counter()
+
+    def section(self, name: str):
+        return Section(self, name) if self.enabled else NULL_SECTION
+
+    def record(self, name: str, start: float, end: float) -> None:
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = ExponentialMovingStatistics(self.smoothing)
+            stage.update((end - start) * 1000)
+
+            if self.tracing:
+                thread = threading.current_thread()
+                self.thread_names.setdefault(thread.ident, thread.name)
+                self.events.append((name, start, end, thread.ident))
+
+    def count(self, name: str, increment: int = 1) -> None:
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + increment
+
+    def stage_ms(self) -> dict[str, float]:
+        """Smoothed duration of every stage in milliseconds."""
+        with self.lock:
+            return {name: stage.mean() for name, stage in sorted(self.stages.items())}
+
+    def dump_chrome_trace(self, trace_path: str) -> int:
+        """Writes the trace events as Chrome trace JSON (chrome://tracing, Perfetto) and returns their count."""
+        with self.lock:
+            events = list(self.events)
+            thread_names = dict(self.thread_names)
+
+        pid = os.getpid()
+        trace_events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                        for tid, name in thread_names.items()]
+        trace_events += [{"name": name, "cat": name.split(".")[0], "ph": "X", "pid": pid, "tid": tid,
+                          "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6}
+                         for name, start, end, tid in events]
+        trace_events += [{"name": name, "ph": "C", "pid": pid, "ts": 0, "args": {"count": count}}
+                         for name, count in self.counters.items()]
+
+        with open(trace_path, 'w') as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+
+def memory_usage_mb() -> Optional[float]:
+    """Resident memory of this process, or its peak where the current value is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 2 ** 20 if os.uname().sysname == "Darwin" else peak / 2 ** 10
+
+
+# Process-wide profiler, configured by the entry points
+profiler = Profiler()
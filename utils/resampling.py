@@ -0,0 +1,136 @@
+import hashlib
+import os
+import numpy as np
+
+from fractions import Fraction
+from functools import lru_cache
+
+from utils.analysis_cache import record_files
+from utils.constants import SIGNAL_CACHE_DIR_NAME
+
+# Rate ratios are reduced to up/down factors with at most this denominator
+MAX_RATE_DENOMINATOR = 1000
+# Input samples resampled per block, bounds the memory read at once
+BLOCK_SAMPLES = 1 << 20
+
+
+def rate_ratio(native_rate: float, target_rate: float) -> tuple[int, int]:
+    """Returns the (up, down) factors that take native_rate to target_rate, e.g. (128, 125) for 500 -> 512 Hz."""
+    ratio = Fraction(target_rate / native_rate).limit_denominator(MAX_RATE_DENOMINATOR)
+    return ratio.numerator, ratio.denominator
+
+
+@lru_cache(maxsize=32)
+def polyphase_filter(up: int, down: int) -> tuple[np.ndarray, int]:
+    """
+    Designs the anti-aliasing filter of a rate pair once, the same Kaiser-windowed FIR that
+    scipy's resample_poly uses. The filter is front-padded so its delay is a whole number of
+    output samples, returned with it as the count of leading outputs to drop.
+    """
+    from scipy.signal import firwin
+
+    half_len = 10 * max(up, down)
+    taps = firwin(2 * half_len + 1, 1.0 / max(up, down), window=("kaiser", 5.0)) * up
+    pre_pad = down - half_len % down
+    return np.concatenate((np.zeros(pre_pad), taps)), (half_len + pre_pad) // down
+
+
+def resampled_length(n_samples: int, native_rate: float, target_rate: float) -> int:
+    up, down = rate_ratio(native_rate, target_rate)
+    return -(-n_samples * up // down)
+
+
+def iter_resampled(signal, native_rate: float, target_rate: float, block_samples: int = BLOCK_SAMPLES):
+    """
+    Yields the signal resampled to target_rate block by block, in one pass over the input.
+    Blocks start on multiples of the decimation factor, so each maps to a whole number of
+    output samples, and are read with enough margin for the filter that the output is
+    identical to resampling the record in one call.
+    """
+    from scipy.signal import upfirdn
+
+    up, down = rate_ratio(native_rate, target_rate)
+    taps, pre_remove = polyphase_filter(up, down)
+    n_samples = len(signal)
+    n_out = resampled_length(n_samples, native_rate, target_rate)
+
+    block_samples = max(down, block_samples // down * down)
+    margin = (-(-len(taps) // up) // down + 1) * down
+    for start in range(0, n_samples, block_samples):
+        first, last = start * up // down, min(n_out, (start + block_samples) * up // down)
+
+        # Samples outside the record are zeros, as resample_poly pads them
+        lower, upper = start - margin, start + block_samples + margin
+        segment = np.zeros(upper - lower, dtype=np.float64)
+        segment[max(0, -lower):min(n_samples, upper) - lower] = signal[max(0, lower):min(n_samples, upper)]
+
+        offset = first + pre_remove - lower * up // down
+        yield upfirdn(taps, segment, up, down)[offset:offset + last - first].astype(np.float32)
+
+
+class StreamResampler:
+    """
+    Resamples an unbounded stream chunk by chunk. Output is held back until the filter has
+    the samples it looks ahead at, so the samples produced match resampling the whole
+    stream in one call.
+    """
+
+    def __init__(self, native_rate: float, target_rate: float):
+        self.up, self.down = rate_ratio(native_rate, target_rate)
+        self.taps, self.pre_remove = polyphase_filter(self.up, self.down)
+        self.margin = (-(-len(self.taps) // self.up) // self.down + 1) * self.down
+        # Samples before the stream are zeros, as resample_poly pads them
+        self.history = np.zeros(self.margin, dtype=np.float64)
+        self.pending = np.empty(0, dtype=np.float64)
+        self.start = 0
+
+    def push(self, values: np.ndarray) -> np.ndarray:
+        """Returns the resampled samples that the input so far completes."""
+        from scipy.signal import upfirdn
+
+        self.pending = np.concatenate((self.pending, np.asarray(values, dtype=np.float64)))
+        ready = (len(self.pending) - self.margin) // self.down * self.down
+        if ready <= 0:
+            return np.empty(0, dtype=np.float32)
+
+        segment = np.concatenate((self.history, self.pending[:ready + self.margin]))
+        first, last = self.start * self.up // self.down, (self.start + ready) * self.up // self.down
+        offset = first + self.pre_remove - (self.start - self.margin) * self.up // self.down
+        resampled = upfirdn(self.taps, segment, self.up, self.down)[offset:offset + last - first]
+
+        self.history = np.concatenate((self.history, self.pending[:ready]))[-self.margin:]
+        self.pending = self.pending[ready:]
+        self.start += ready
+        return resampled.astype(np.float32)
+
+
+def resample_signal(signal, native_rate: float, target_rate: float) -> np.ndarray:
+    """Resamples a whole signal in memory."""
+    blocks = list(iter_resampled(signal, native_rate, target_rate))
+    return np.concatenate(blocks) if blocks else np.empty(0, dtype=np.float32)
+
+
+def resampled_cache_path(signal_path: str, channel: str, native_rate: float, target_rate: float) -> str:
+    files = record_files(signal_path)
+    stats = [os.stat(path) for path in files]
+    key = f"{os.path.abspath(signal_path)}:{channel}:{native_rate:g}:{target_rate:g}:" + \
+          ":".join(f"{stat.st_size}:{stat.st_mtime_ns}" for stat in stats)
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(signal_path))[0]
+    return os.path.join(SIGNAL_CACHE_DIR_NAME, f"{name}_{target_rate:g}hz_{digest}.f32")
+
+
+def open_resampled(signal, signal_path: str, channel: str, native_rate: float, target_rate: float) -> np.ndarray:
+    """Resamples the signal once into a raw float32 cache next to the decoded signals and memory-maps it."""
+    cache_path = resampled_cache_path(signal_path, channel, native_rate, target_rate)
+    if not os.path.exists(cache_path):
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            for block in iter_resampled(signal, native_rate, target_rate):
+                f.write(block.astype('<f4').tobytes())
+        os.replace(tmp_path, cache_path)
+
+    if os.path.getsize(cache_path) == 0:
+        return np.empty(0, dtype=np.float32)
+    return np.memmap(cache_path, dtype='<f4', mode='r')
@@ -1,38 +1,199 @@
-import heartpy as hp
 import numpy as np
 
 from abc import ABC, abstractmethod
+from collections import deque
+from numpy.lib.stride_tricks import sliding_window_view
 
-from utils.model_loader import load_E2E_Model
 from utils.circular_buffer import CircularBuffer
+from utils.metrics_calculations import calculate_rmssd
 
 class SignalAnalyser(ABC):
    def __init__(self, sampling_frequency, monitoring_buffer_size):
        self.sampling_frequency = sampling_frequency
        self.buffer = CircularBuffer(monitoring_buffer_size)
+       # R-peak indices found in the last analysed window, for analysers that detect peaks
+       self.last_peaks = None
        
    @abstractmethod
-   def calculate_RMSSD(self, signal: list[float]) -> float:
+   def calculate_RMSSD(self, signal: list[float], index: int = None) -> float:
+       pass
+
+   def calculate_RMSSD_batch(self, signals: np.ndarray, start_index: int = None) -> np.ndarray:
+       indices = [None] * len(signals) if start_index is None else range(start_index, start_index + len(signals))
+       return np.array([self.calculate_RMSSD(signal, index) for signal, index in zip(signals, indices)], dtype=float)
+
+   def reset(self) -> None:
+       """Drops any state carried between windows, e.g. when a new signal is opened."""
        pass
 
 
 class HPSignalAnalyser(SignalAnalyser):
-    def calculate_RMSSD(self, signal: list[float]) -> float:
-        _, m = hp.process(hp.scale_data(signal), self.sampling_frequency)
+    def calculate_RMSSD(self, signal: list[float], index: int = None) -> float:
+        # Imported on first use, which in the viewer happens on the analysis thread
+        import heartpy as hp
+
+        self.last_peaks = None
+        wd, m = hp.process(hp.scale_data(signal), self.sampling_frequency)
         rmssd = m['rmssd']
 
+        removed_beats = set(wd['removed_beats'])
+        self.last_peaks = np.array([peak for peak in wd['peaklist'] if peak not in removed_beats], dtype=int)
+
         return round(rmssd, 2)
 
 
+class IncrementalSignalAnalyser(SignalAnalyser):
+    """
+    Keeps a rolling list of R-peaks across consecutive overlapping windows and only
+    searches the samples that arrived since the previous window.
+    """
+    # Fraction of the running QRS slope energy a beat has to reach
+    ENERGY_THRESHOLD = 0.4
+    # Weight of a new beat in the running QRS slope energy
+    ENERGY_UPDATE_RATE = 0.125
+    # Minimum distance between two beats in seconds
+    REFRACTORY_PERIOD = 0.25
+    # Width of the slope energy smoothing and of the R-peak refinement in seconds
+    QRS_WIDTH = 0.05
+
+    def __init__(self, sampling_frequency, monitoring_buffer_size, window_step):
+        super().__init__(sampling_frequency, monitoring_buffer_size)
+        self.window_step = window_step
+        self.reset()
+
+    def reset(self) -> None:
+        self.last_index = None
+        self.peaks = deque()  # absolute sample positions
+        self.searched_until = 0
+        self.reference_energy = None
+        self.last_peaks = None
+
+    def calculate_RMSSD(self, signal: list[float], index: int = None) -> float:
+        self.last_peaks = None
+        signal = np.asarray(signal, dtype=float)
+        window_start = 0 if index is None else index * self.window_step
+        window_end = window_start + len(signal)
+        refractory = int(self.REFRACTORY_PERIOD * self.sampling_frequency)
+
+        # Anything other than the next consecutive window needs a full search
+        if index is None or self.last_index is None or index != self.last_index + 1:
+            self.peaks.clear()
+            self.searched_until = window_start
+            self.reference_energy = self._slope_energy(signal).max()
+        self.last_index = index
+
+        while self.peaks and self.peaks[0] < window_start:
+            self.peaks.popleft()
+
+        # Peaks close to the window end are only confirmed once their right side has arrived
+        confirm_until = window_end if index is None else window_end - refractory
+        self._detect_peaks(signal, window_start, self.searched_until, confirm_until, refractory)
+        self.searched_until = max(self.searched_until, confirm_until)
+
+        self.last_peaks = np.array(self.peaks, dtype=int) - window_start
+
+        if len(self.peaks) < 3:
+            return np.nan
+        return round(calculate_rmssd(list(self.peaks), self.sampling_frequency), 2)
+
+    def _slope_energy(self, signal: np.ndarray) -> np.ndarray:
+        width = max(1, int(self.QRS_WIDTH * self.sampling_frequency))
+        slope = np.abs(np.diff(signal, prepend=signal[:1]))
+        return np.convolve(slope, np.ones(width) / width, mode='same')
+
+    def _detect_peaks(self, signal: np.ndarray, window_start: int, search_from: int, search_to: int,
+                      refractory: int) -> None:
+        segment_start = max(0, search_from - window_start - refractory)
+        segment_end = min(len(signal), search_to - window_start + refractory)
+        if segment_end - segment_start < 3:
+            return
+
+        segment = signal[segment_start:segment_end]
+        threshold = self.ENERGY_THRESHOLD * self.reference_energy
+        half_qrs = max(1, int(self.QRS_WIDTH * self.sampling_frequency))
+
+        # The slope energy of a QRS complex peaks just before and after its R-peak
+        energy = self._slope_energy(segment)
+        qrs_energy = sliding_window_view(np.pad(energy, half_qrs, mode='edge'), 2 * half_qrs + 1).max(axis=1)
+
+        # Local signal maxima inside a QRS complex, visited from left to right
+        is_candidate = (segment[1:-1] >= segment[:-2]) & (segment[1:-1] > segment[2:]) & (qrs_energy[1:-1] >= threshold)
+        for candidate in np.flatnonzero(is_candidate) + 1:
+            position = window_start + segment_start + candidate
+            if not search_from <= position < search_to or position - window_start < half_qrs:
+                continue
+
+            # A beat has to dominate its refractory neighbourhood and be far enough from the last beat
+            if segment[candidate] < segment[max(0, candidate - refractory):candidate + refractory + 1].max():
+                continue
+            if self.peaks and position - self.peaks[-1] < refractory:
+                continue
+
+            self.peaks.append(position)
+            self.reference_energy += self.ENERGY_UPDATE_RATE * (qrs_energy[candidate] - self.reference_energy)
+
+
 class DLSignalAnalyser(SignalAnalyser):
-    def __init__(self, sampling_frequency, monitoring_buffer_size, model_path):
+    # Rate of the recordings the E2E model was trained on, its windows span window_size samples at this rate
+    MODEL_SAMPLING_RATE = 512
+    # Window length used for models whose time dimension is dynamic
+    WINDOW_SIZE = 1536
+
+    def __init__(self, sampling_frequency, monitoring_buffer_size, model_path, batch_size=64, backend="eager"):
+        # TensorFlow takes seconds to import, so it is only loaded once a model is configured
+        from utils.model_loader import load_E2E_Model, compile_E2E_Model, compiled_model_matches
+
         super().__init__(sampling_frequency, monitoring_buffer_size)
         self.model = load_E2E_Model(model_path)
+        self.window_size = self.model.input_shape[1] or self.WINDOW_SIZE
+        self.batch_size = batch_size
+        self.backend = backend
+
+        if backend != "eager":
+            compiled_model = compile_E2E_Model(self.model, model_path, backend)
+            if compiled_model_matches(self.model, compiled_model, self.window_size):
+                self.model = compiled_model
+            else:
+                print(f"Compiled '{backend}' model output does not match the eager model, using eager inference")
+                self.backend = "eager"
+
+        self.warm_up()
 
-    def calculate_RMSSD(self, signal: list[float]) -> float:
-        signal = np.array(signal)
+        # RMSSD values computed ahead of playback, keyed by window index
+        self.prefetched: dict[int, float] = {}
+
+    def calculate_RMSSD(self, signal: list[float], index: int = None) -> float:
+        if index in self.prefetched:
+            return self.prefetched[index]
+
+        signal = np.array(signal, dtype=np.float32)
         signal = signal.reshape((1, signal.shape[0], 1))
 
-        rmssd = self.model(signal).numpy()[0][0]
+        rmssd = np.asarray(self.model(signal))[0][0]
 
         return round(rmssd, 2)
+
+    def calculate_RMSSD_batch(self, signals: np.ndarray, start_index: int = None, batch_size: int = None) -> np.ndarray:
+        """Runs the model over a stack of windows with shape (n_windows, window_size)."""
+        signals = np.asarray(signals, dtype=np.float32)
+        batch_size = batch_size or self.batch_size
+
+        rmssd = np.empty(len(signals))
+        for start in range(0, len(signals), batch_size):
+            batch = signals[start:start + batch_size, :, np.newaxis]
+            rmssd[start:start + len(batch)] = np.asarray(self.model(batch))[:, 0]
+
+        return np.round(rmssd, 2)
+
+    def warm_up(self) -> None:
+        """Runs the single-window and full-batch shapes once so the first real window is not slowed by tracing."""
+        for batch_size in {1, self.batch_size}:
+            self.model(np.zeros((batch_size, self.window_size, 1), dtype=np.float32))
+
+    def prefetch(self, start_index: int, signals: np.ndarray) -> None:
+        """Computes RMSSD for consecutive windows starting at start_index, replacing earlier prefetches."""
+        rmssd = self.calculate_RMSSD_batch(signals)
+        self.prefetched = {start_index + offset: value for offset, value in enumerate(rmssd)}
+
+    def clear_prefetched(self) -> None:
+        self.prefetched = {}
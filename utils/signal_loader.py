@@ -1,78 +1,439 @@
 from abc import ABC, abstractmethod
-import wfdb
+import hashlib
+import os
+import re
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Union
+
+from utils.constants import SIGNAL_CACHE_DIR_NAME
+
+
+class MemmapSignal:
+    """Single channel of a memory-mapped WFDB format 16 file, converted to physical units on access."""
+
+    def __init__(self, samples: np.ndarray, gain: float, baseline: int):
+        self.samples = samples
+        self.gain = gain
+        self.baseline = baseline
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def __getitem__(self, key):
+        return ((self.samples[key] - self.baseline) / self.gain).astype(np.float32)
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self[:], dtype=dtype)
+
+
+class WindowView:
+    """
+    Random-access view of the normalized windows of a configured reader. Integer indices
+    return one window and go through a small LRU cache filled a block at a time, so playback
+    in either direction mostly hits it. Slices return a batched 2D array.
+    """
+    CACHE_SIZE = 128
+    CACHE_BLOCK_SIZE = 32
+
+    def __init__(self, reader: "SignalReader"):
+        self.reader = reader
+        self.cache: OrderedDict[int, np.ndarray] = OrderedDict()
+
+    def __len__(self) -> int:
+        if self.reader.signal is None or len(self.reader.signal) < self.reader.window_size:
+            return 0
+        return self.reader.last_window_index + 1
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return self.reader.normalized_windows(start, max(0, stop - start))
+            indices = range(start, stop, step)
+            if not indices:
+                return np.empty((0, self.reader.window_size), dtype=np.float64)
+            return np.stack([self[index] for index in indices])
+
+        index = int(key)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Window {key} out of range for {len(self)} windows")
+
+        if index not in self.cache:
+            # Aligned blocks serve forward and reverse playback alike
+            block_start = index - index % self.CACHE_BLOCK_SIZE
+            block = self.reader.normalized_windows(block_start, self.CACHE_BLOCK_SIZE)
+            for offset, window in enumerate(block):
+                self.cache[block_start + offset] = window
+            while len(self.cache) > self.CACHE_SIZE:
+                self.cache.popitem(last=False)
+
+        self.cache.move_to_end(index)
+        return self.cache[index]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def clear(self) -> None:
+        self.cache.clear()
+
 
 class SignalReader(ABC):
-    def __init__(self, ):
+    # Number of windows normalized together in one vectorized pass
+    NORMALIZATION_BLOCK_SIZE = 256
+
+    def __init__(self, lazy: bool = True, target_rate: Optional[float] = None):
+        # Lazy readers map the recording and only decode the windows that are requested
+        self.lazy = lazy
+        # Records at another rate are resampled to target_rate when they are configured
+        self.target_rate = target_rate
         self.signal = None
+        self.signal_path = None
+        self.sampling_rate = None
+        self.native_sampling_rate = None
+        self.header_sampling_rate = None
+        self.lead = None
+        self.metadata = {}
         self.window_size = None
         self.window_step = None
         self.current_position = 0
+        self.windows = WindowView(self)
 
-    def configure_reader(self, signal_path: str, window_size: int, window_step: int):
-        self.signal = self.read_signal(signal_path)
+    def configure_reader(self, signal_path: str, window_size: int, window_step: int,
+                         default_sampling_rate: Optional[float] = None):
+        """Opens a record, default_sampling_rate is taken as its rate when the header has none."""
+        self.signal_path = signal_path
+        # The header rate is read on every configure, so records at different rates each get their own resampling
+        self.header_sampling_rate = self.read_sampling_rate(signal_path)
+        self.native_sampling_rate = self.sampling_rate = self.header_sampling_rate or default_sampling_rate
+        self.signal = self.open_signal(signal_path) if self.lazy else np.asarray(self.read_signal(signal_path))
+        if self.is_resampled:
+            self.signal = self._resample(self.signal)
+            self.sampling_rate = float(self.target_rate)
         self.window_size = window_size
         self.window_step = window_step
         self.last_window_index = (len(self.signal) - self.window_size) // self.window_step
+        self.windows = WindowView(self)
 
     def clear_reader(self):
         self.signal = None
+        self.signal_path = None
+        self.sampling_rate = None
+        self.native_sampling_rate = None
+        self.header_sampling_rate = None
+        self.lead = None
+        self.metadata = {}
         self.window_size = None
         self.window_step = None
         self.current_position = 0
+        self.windows = WindowView(self)
+
+    @property
+    def first_window_index(self) -> int:
+        """Oldest window that can still be read, only above zero for bounded live buffers."""
+        return 0
+
+    @property
+    def is_resampled(self) -> bool:
+        """Whether the configured signal was resampled from the record's native rate."""
+        return bool(self.target_rate and self.native_sampling_rate and self.native_sampling_rate != self.target_rate)
+
+    def to_signal_samples(self, positions: np.ndarray) -> np.ndarray:
+        """Maps sample positions of the record, e.g. annotations, onto the configured signal."""
+        if not self.is_resampled:
+            return positions
+        return np.round(np.asarray(positions) * self.target_rate / self.native_sampling_rate).astype(np.int64)
+
+    def _resample(self, signal):
+        # Imported here so scipy is only loaded once a record actually needs resampling
+        from utils.resampling import open_resampled, resample_signal
+
+        if self.lazy:
+            return open_resampled(signal, self.signal_path, self.lead or "", self.native_sampling_rate, self.target_rate)
+        return resample_signal(signal, self.native_sampling_rate, self.target_rate)
 
     @abstractmethod
     def read_signal(self, signal_path: str) -> list[int]:
         pass
 
+    def open_signal(self, signal_path: str):
+        """Opens the signal for lazy access. Readers without a lazy path load it eagerly."""
+        return np.asarray(self.read_signal(signal_path))
+
+    def read_sampling_rate(self, signal_path: str) -> Optional[float]:
+        """Returns the sampling rate stored with the recording, if the format has one, and fills in the metadata."""
+        return None
+
+    def read_annotations(self, signal_path: str) -> Optional[np.ndarray]:
+        """Returns the reference beat positions in samples, if the recording ships with annotations."""
+        return None
+
     def stream_normalized_signal(self):
+        """Yields windows from current_position on, for sequential consumers. Random access goes through `windows`."""
         while self.current_position + self.window_size <= len(self.signal):
-            window = self.signal[self.current_position:self.current_position + self.window_size]
-            normalized_window = self._normalize_window(window)
+            index = self.current_position // self.window_step
             self.current_position += self.window_step
-            yield normalized_window
+            yield self.windows[index]
+
+    def normalized_windows(self, start_index: int, count: int) -> np.ndarray:
+        """Returns up to `count` consecutive normalized windows as a 2D array."""
+        return self._normalize_windows(self._window_block(start_index, count))
+
+    def window_range(self, index: int) -> tuple[float, float]:
+        """Returns the raw (min, max) of a window, i.e. its normalization statistics."""
+        window = self._window_block(index, 1)[0]
+        return float(window.min()), float(window.max())
+
+    def _window_block(self, start_index: int, count: int) -> np.ndarray:
+        """Returns a strided (zero-copy) view of up to `count` consecutive windows."""
+        start = start_index * self.window_step
+        stop = min(len(self.signal), start + (count - 1) * self.window_step + self.window_size)
+        if stop - start < self.window_size:
+            return np.empty((0, self.window_size), dtype=np.float64)
+
+        segment = np.asarray(self.signal[start:stop])
+        return sliding_window_view(segment, self.window_size)[::self.window_step]
 
     def reset_position(self):
         """Resets the current position to start streaming from the beginning."""
         self.current_position = 0
 
-    def go_back(self):
-        """Moves the current position back by one window step."""
-        self.current_position = max(0, self.current_position - self.window_step*2)
+    def _normalize_window(self, window: list[int]) -> np.ndarray:
+        return self._normalize_windows(np.asarray(window)[np.newaxis, :])[0]
 
-    def position_to_index(self) -> int:
-        return (self.current_position//self.window_step)-1
+    def _normalize_windows(self, windows: np.ndarray) -> np.ndarray:
+        min_vals = windows.min(axis=1, keepdims=True)
+        value_range = windows.max(axis=1, keepdims=True) - min_vals
 
-    def _normalize_window(self, window: list[int]) -> list[float]:
-        min_val = min(window)
-        max_val = max(window)
-        if max_val == min_val:
-            return [0.0] * len(window)
-        return [(value - min_val) / (max_val - min_val) for value in window]
+        # Flat windows are mapped to all zeros instead of dividing by zero
+        flat = value_range == 0
+        normalized = (windows - min_vals) / np.where(flat, 1, value_range)
+        normalized[flat[:, 0]] = 0.0
+        return normalized
 
 class AppleWatchSignalReader(SignalReader):
-    def read_signal(self, signal_path: str) -> list[int]:
-        with open(signal_path, 'r') as f:
-            data = f.read().split('\n')
+    # Header keys of Apple's localized exports
+    SAMPLING_RATE_KEYS = ("sample rate", "częstotliwość próbkowania")
+    LEAD_KEYS = ("lead", "odprowadzenie")
+    CHUNK_BYTES = 1 << 20
+
+    SAMPLE_LINE_PATTERN = re.compile(rb"^[-+]?\d+(?:[.,]\d+)?$")
+    SAMPLING_RATE_PATTERN = re.compile(r"(\d+(?:[.,]\d+)?)\s*(?:hz|hertz|herc)", re.IGNORECASE)
+
+    def read_header(self, signal_path: str) -> tuple[dict[str, str], int]:
+        """Returns the export metadata and the byte offset at which the samples start."""
+        metadata = {}
+        offset = 0
+        with open(signal_path, 'rb') as f:
+            for line in f:
+                if self.SAMPLE_LINE_PATTERN.match(line.strip()):
+                    break
+                offset += len(line)
+
+                key, _, value = line.decode('utf-8', errors='replace').strip().partition(',')
+                if key:
+                    metadata[key.strip().lower()] = value.strip().strip('"')
 
-        ecg_signal = [data_point[0] for data_point in [data_point.split(',') for data_point in data[13:]]][:-1]
-        ecg_signal = [int(data_point) for data_point in ecg_signal]
+        return metadata, offset
 
-        return ecg_signal
+    def read_sampling_rate(self, signal_path: str) -> Optional[float]:
+        metadata, _ = self.read_header(signal_path)
+        self.metadata = metadata
+        self.lead = self._metadata_value(metadata, self.LEAD_KEYS)
+
+        # Known keys first, then any header value that looks like a frequency
+        values = [self._metadata_value(metadata, self.SAMPLING_RATE_KEYS)] + list(metadata.values())
+        for value in values:
+            match = self.SAMPLING_RATE_PATTERN.search(value or "")
+            if match:
+                return float(match.group(1).replace(',', '.'))
+        return None
+
+    def read_signal(self, signal_path: str) -> np.ndarray:
+        return np.concatenate(list(self.iter_signal_chunks(signal_path)) or [np.empty(0, dtype=np.float32)])
+
+    def iter_signal_chunks(self, signal_path: str, chunk_bytes: int = None):
+        """Decodes the sample column in chunks of roughly chunk_bytes, split on line boundaries."""
+        _, offset = self.read_header(signal_path)
+        chunk_bytes = chunk_bytes or self.CHUNK_BYTES
+
+        with open(signal_path, 'rb') as f:
+            f.seek(offset)
+            remainder = b""
+            while True:
+                data = f.read(chunk_bytes)
+                if not data:
+                    break
+
+                data = remainder + data
+                split = data.rfind(b"\n") + 1
+                remainder = data[split:]
+                if split:
+                    yield self._decode_samples(data[:split])
+
+            if remainder.strip():
+                yield self._decode_samples(remainder)
+
+    def open_signal(self, signal_path: str) -> np.ndarray:
+        # The CSV is streamed once into a raw float32 cache which is then memory-mapped
+        cache_path = self._cache_path(signal_path)
+        if not os.path.exists(cache_path):
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                for chunk in self.iter_signal_chunks(signal_path):
+                    f.write(chunk.astype('<f4').tobytes())
+            os.replace(tmp_path, cache_path)
+
+        if os.path.getsize(cache_path) == 0:
+            return np.empty(0, dtype=np.float32)
+        return np.memmap(cache_path, dtype='<f4', mode='r')
+
+    @staticmethod
+    def _decode_samples(data: bytes) -> np.ndarray:
+        # Localized exports write the decimal separator as a comma, which is the only comma in a sample line
+        text = data.replace(b",", b".").decode('ascii', errors='ignore')
+        return np.fromstring(text, dtype=np.float32, sep=' ')
+
+    @staticmethod
+    def _metadata_value(metadata: dict[str, str], keys: tuple[str, ...]) -> Optional[str]:
+        for key in keys:
+            if key in metadata:
+                return metadata[key]
+        return None
+
+    @staticmethod
+    def _cache_path(signal_path: str) -> str:
+        stat = os.stat(signal_path)
+        key = f"{os.path.abspath(signal_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        name = os.path.splitext(os.path.basename(signal_path))[0]
+        return os.path.join(SIGNAL_CACHE_DIR_NAME, f"{name}_{digest}.f32")
 
 class PhysionetSignalReader(SignalReader):
     FILE_EXTENSIONS = ["atr", "dat", "hea"]
+    # Channel used when none is selected, the filtered lead of the sample records
+    DEFAULT_CHANNEL = 1
+    # MIT-BIH annotation codes of beats, other codes mark rhythm changes, T-waves, noise etc.
+    BEAT_SYMBOLS = set("NLRBAaJSVrFejnE/fQ?")
+
+    def __init__(self, lazy: bool = True, channel: Union[int, str, None] = None, target_rate: Optional[float] = None):
+        super().__init__(lazy, target_rate)
+        self.channel = channel
+        self.channel_index = None
+        self.channels = []
+        self.header = None
+
+    def clear_reader(self):
+        super().clear_reader()
+        self.channel_index = None
+        self.channels = []
+        self.header = None
+
+    @property
+    def channel_names(self) -> list[str]:
+        return list(self.header.sig_name) if self.header else []
+
+    def read_sampling_rate(self, signal_path: str) -> Optional[float]:
+        # wfdb pulls in pandas and scipy, so it is only imported once a PhysioNet record is opened
+        import wfdb
+
+        self.header = wfdb.rdheader(self._record_name(signal_path))
+        self.channel_index = self._channel_index(self.channel)
+        self.metadata = {"channels": self.channel_names, "units": list(self.header.units), "comments": self.header.comments}
+        self.lead = self.header.sig_name[self.channel_index]
+        return float(self.header.fs)
 
     def read_signal(self, signal_path: str) -> list[int]:
+        import wfdb
+
+        record_name = self._record_name(signal_path)
+        channel_index = self.channel_index if self.header else self._channel_index(self.channel, wfdb.rdheader(record_name))
+        record = wfdb.rdrecord(record_name, channels=[channel_index])
+        return record.p_signal[:, 0].astype(np.float32)
+
+    def open_signal(self, signal_path: str):
+        self.channels = self.open_channels(signal_path)
+        return self.channels[self.channel_index]
+
+    def open_channels(self, signal_path: str) -> list:
+        """Opens every channel of the record, memory-mapped where the format allows it."""
+        import wfdb
+
+        record_name = self._record_name(signal_path)
+        header = self.header or wfdb.rdheader(record_name)
+
+        # Only single-file, format 16 records can be mapped directly
+        if any(fmt != "16" for fmt in header.fmt) or len(set(header.file_name)) != 1:
+            record = wfdb.rdrecord(record_name)
+            return [record.p_signal[:, channel].astype(np.float32) for channel in range(header.n_sig)]
+
+        dat_path = os.path.join(os.path.dirname(record_name), header.file_name[0])
+        byte_offset = header.byte_offset[0] or 0
+        sig_len = header.sig_len or (os.path.getsize(dat_path) - byte_offset) // (2 * header.n_sig)
+
+        samples = np.memmap(dat_path, dtype='<i2', mode='r', offset=byte_offset, shape=(sig_len, header.n_sig))
+        return [MemmapSignal(samples[:, channel], header.adc_gain[channel], header.baseline[channel])
+                for channel in range(header.n_sig)]
+
+    def select_channel(self, channel: Union[int, str]) -> None:
+        """Switches the configured reader to another channel of the same record."""
+        self.channel = channel
+        self.channel_index = self._channel_index(channel)
+        self.lead = self.header.sig_name[self.channel_index]
+        if self.channels:
+            signal = self.channels[self.channel_index]
+            self.signal = self._resample(signal) if self.is_resampled else signal
+        self.last_window_index = (len(self.signal) - self.window_size) // self.window_step
+        self.windows.clear()
+
+    def read_annotations(self, signal_path: str, extension: str = "atr") -> Optional[np.ndarray]:
+        import wfdb
+
+        record_name = self._record_name(signal_path)
+        if not os.path.exists(f"{record_name}.{extension}"):
+            return None
+
+        annotation = wfdb.rdann(record_name, extension)
+        is_beat = np.array([symbol in self.BEAT_SYMBOLS for symbol in annotation.symbol], dtype=bool)
+        return self.to_signal_samples(np.asarray(annotation.sample, dtype=np.int64)[is_beat])
+
+    def _channel_index(self, channel: Union[int, str, None], header=None) -> int:
+        header = header or self.header
+        if channel is None:
+            return min(self.DEFAULT_CHANNEL, header.n_sig - 1)
+        if isinstance(channel, str):
+            if channel not in header.sig_name:
+                raise ValueError(f"Record has no channel named {channel!r}, available: {header.sig_name}")
+            return header.sig_name.index(channel)
+        if not 0 <= channel < header.n_sig:
+            raise ValueError(f"Channel {channel} out of range, record has {header.n_sig} channels")
+        return channel
+
+    def _record_name(self, signal_path: str) -> str:
         if signal_path[-3:] in self.FILE_EXTENSIONS:
             signal_path = signal_path[:-4]
+        return signal_path
 
-        record = wfdb.rdrecord(signal_path)
-        return record.p_signal[:,1].astype(np.float32)
 
-
-def get_signal_reader(reader_type: str) -> SignalReader:
+def get_signal_reader(reader_type: str, lazy: bool = True, channel: Union[int, str, None] = None,
+                      target_rate: Optional[float] = None) -> SignalReader:
     if reader_type == "apple":
-        return AppleWatchSignalReader()
+        return AppleWatchSignalReader(lazy, target_rate)
     elif reader_type == "physionet":
-        return PhysionetSignalReader()
+        return PhysionetSignalReader(lazy, channel, target_rate)
+
+
+def read_signals(signal_paths: list[str], reader_type: str, channel: Union[int, str, None] = None,
+                 workers: Optional[int] = None) -> list[np.ndarray]:
+    """Decodes several records eagerly on a thread pool, the file reads and NumPy conversions release the GIL."""
+    def read(signal_path: str) -> np.ndarray:
+        return np.asarray(get_signal_reader(reader_type, lazy=False, channel=channel).read_signal(signal_path))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(read, signal_paths))
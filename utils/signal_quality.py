@@ -0,0 +1,57 @@
+import numpy as np
+
+
+class SignalQualityGate:
+    """
+    Cheap quality checks run on blocks of normalized windows before the analysers. A window
+    is rejected for the first check it fails:
+    - flat: most consecutive samples are equal, e.g. a disconnected lead
+    - clipping: many samples sit on the window's min or max, i.e. the ADC saturated
+    - noise: first-difference energy close to the window's variance, as in broadband noise
+    - kurtosis: no dominant peaks, as in motion artefacts and baseline wander without QRS complexes
+    Thresholds were set on the sample recordings, clean windows stay far from all of them.
+    """
+    REASONS = ("flat", "clipping", "noise", "kurtosis")
+
+    MAX_FLAT_RATIO = 0.6
+    MAX_CLIPPING_RATIO = 0.02
+    MAX_NOISE_RATIO = 0.5
+    # ECG windows are peaky (kurtosis 4 and up), Gaussian noise is 3 and a sine 1.5
+    MIN_KURTOSIS = 3.5
+    # The noise ratio of a smooth signal grows with the square of the sample spacing,
+    # so it is rescaled to this rate before comparing
+    REFERENCE_SAMPLING_RATE = 512
+
+    def __init__(self, sampling_frequency: float = REFERENCE_SAMPLING_RATE):
+        self.sampling_frequency = sampling_frequency
+
+    def score(self, windows: np.ndarray) -> dict[str, np.ndarray]:
+        """Returns the flat ratio, clipping ratio, noise ratio and kurtosis of every window."""
+        windows = np.atleast_2d(np.asarray(windows, dtype=np.float64))
+        differences = np.diff(windows, axis=1)
+        low, high = windows.min(axis=1, keepdims=True), windows.max(axis=1, keepdims=True)
+
+        centered = windows - windows.mean(axis=1, keepdims=True)
+        variance = np.mean(centered ** 2, axis=1)
+        # Flat windows have no variance, their ratios are set so only the flat check fails
+        spread = np.where(variance > 0, variance, 1.0)
+
+        rate_scale = (self.sampling_frequency / self.REFERENCE_SAMPLING_RATE) ** 2
+        return {
+            "flat_ratio": np.mean(differences == 0, axis=1),
+            "clipping_ratio": np.mean((windows == low) | (windows == high), axis=1) * (variance > 0),
+            "noise_ratio": np.mean(differences ** 2, axis=1) / spread * rate_scale,
+            "kurtosis": np.where(variance > 0, np.mean(centered ** 4, axis=1) / spread ** 2, np.inf),
+        }
+
+    def reasons(self, windows: np.ndarray) -> np.ndarray:
+        """Returns the rejection reason of every window, an empty string for usable windows."""
+        scores = self.score(windows)
+        failed = [scores["flat_ratio"] > self.MAX_FLAT_RATIO,
+                  scores["clipping_ratio"] > self.MAX_CLIPPING_RATIO,
+                  scores["noise_ratio"] > self.MAX_NOISE_RATIO,
+                  scores["kurtosis"] < self.MIN_KURTOSIS]
+        return np.select(failed, self.REASONS, default="").astype(object)
+
+    def acceptable(self, windows: np.ndarray) -> np.ndarray:
+        return self.reasons(windows) == ""
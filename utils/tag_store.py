@@ -0,0 +1,253 @@
+import os
+import re
+import threading
+import numpy as np
+
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from utils.profiling import profiler
+from utils.tagging_helpers import TaggedSignal
+
+LEGACY_TAG_FILE_PATTERN = re.compile(r"^(?P<record>.+)_pos_(?P<position>\d+)\.json$")
+RATE_DIR_PATTERN = re.compile(r"^rate_(?P<rate>\d+(?:\.\d+)?)$")
+
+
+def rate_dir_name(sampling_rate: float) -> str:
+    return f"rate_{sampling_rate:g}"
+
+
+class TagStore:
+    """
+    Append-only store of the tagged windows of one record. Windows are kept as float32
+    in chunk_XXXXX.npz files of up to CHUNK_SIZE rows. Only the last, partially filled
+    chunk is ever rewritten, and an in-memory index maps tagged positions to chunks.
+    Window positions and contents depend on the rate the record was read at, so every
+    sampling rate gets its own store under size_N/step_N/rate_N/<record>.
+    """
+    CHUNK_SIZE = 256
+
+    def __init__(self, root_dir: str, record_name: str, window_size: int, window_step: int,
+                 sampling_rate: Optional[float] = None, adopt_unrated: bool = False):
+        self.record_name = record_name
+        self.window_size = window_size
+        self.sampling_rate = sampling_rate
+        step_dir = os.path.join(root_dir, f"size_{window_size}", f"step_{window_step}")
+        unrated_dir = os.path.join(step_dir, record_name)
+        self.dir_path = os.path.join(step_dir, rate_dir_name(sampling_rate), record_name) if sampling_rate else unrated_dir
+
+        # Stores written before rates were recorded hold windows at the record's native rate
+        if adopt_unrated and sampling_rate and os.path.isdir(unrated_dir) and not os.path.exists(self.dir_path):
+            os.makedirs(os.path.dirname(self.dir_path), exist_ok=True)
+            os.replace(unrated_dir, self.dir_path)
+
+        # position -> (chunk path, row); later chunks override earlier tags of the same position
+        self.index: dict[int, tuple[str, int]] = {}
+        self.chunk_paths = self._list_chunks()
+        for chunk_path in self.chunk_paths:
+            with np.load(chunk_path) as chunk:
+                for row, position in enumerate(chunk["positions"]):
+                    self.index[int(position)] = (chunk_path, row)
+
+        # Rows of the last chunk while it still has room, rewritten on every flush
+        self.open_rows: list[tuple[int, np.ndarray, np.ndarray, float]] = []
+        if self.chunk_paths and self._chunk_length(self.chunk_paths[-1]) < self.CHUNK_SIZE:
+            self.open_chunk_path = self.chunk_paths[-1]
+            self.open_rows = list(self._read_rows(self.open_chunk_path))
+        else:
+            self.open_chunk_path = self._chunk_path(len(self.chunk_paths))
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def is_tagged(self, position: int) -> bool:
+        return position in self.index
+
+    def append(self, position: int, tagged_signal: TaggedSignal) -> None:
+        window = np.asarray(tagged_signal.signal, dtype=np.float32)
+        peaks = np.asarray(tagged_signal.peaks, dtype=np.int32)
+        rmssd = np.nan if tagged_signal.rmssd is None else float(tagged_signal.rmssd)
+
+        self.open_rows.append((int(position), window, peaks, rmssd))
+        self.index[int(position)] = (self.open_chunk_path, len(self.open_rows) - 1)
+        self.dirty = True
+
+        if len(self.open_rows) >= self.CHUNK_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.dirty:
+            return
+
+        os.makedirs(self.dir_path, exist_ok=True)
+        positions, windows, peaks, rmssd = zip(*self.open_rows)
+        peak_offsets = np.cumsum([0] + [len(row_peaks) for row_peaks in peaks])
+
+        tmp_path = f"{self.open_chunk_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, positions=np.array(positions, dtype=np.int64), windows=np.stack(windows),
+                     peaks=np.concatenate(peaks).astype(np.int32), peak_offsets=peak_offsets.astype(np.int64),
+                     rmssd=np.array(rmssd, dtype=np.float32))
+        os.replace(tmp_path, self.open_chunk_path)
+
+        if self.open_chunk_path not in self.chunk_paths:
+            self.chunk_paths.append(self.open_chunk_path)
+        if len(self.open_rows) >= self.CHUNK_SIZE:
+            self.open_chunk_path = self._chunk_path(len(self.chunk_paths))
+            self.open_rows = []
+        self.dirty = False
+
+    def load(self, position: int) -> Optional[TaggedSignal]:
+        if position not in self.index:
+            return None
+
+        chunk_path, row = self.index[position]
+        if chunk_path == self.open_chunk_path:
+            _, window, peaks, rmssd = self.open_rows[row]
+        else:
+            with np.load(chunk_path) as chunk:
+                start, stop = chunk["peak_offsets"][row:row + 2]
+                window, peaks, rmssd = chunk["windows"][row], chunk["peaks"][start:stop], float(chunk["rmssd"][row])
+
+        return TaggedSignal(window.tolist(), peaks.tolist(), None if np.isnan(rmssd) else float(rmssd))
+
+    def load_all(self) -> dict[str, np.ndarray]:
+        """Loads the latest tag of every position as NumPy arrays, e.g. for training."""
+        self.flush()
+
+        positions, windows, peaks, rmssd = [], [], [], []
+        for chunk_path in self.chunk_paths:
+            with np.load(chunk_path) as chunk:
+                positions.append(chunk["positions"])
+                windows.append(chunk["windows"])
+                rmssd.append(chunk["rmssd"])
+                peaks.extend(np.split(chunk["peaks"], chunk["peak_offsets"][1:-1]))
+
+        if not positions:
+            return {"positions": np.empty(0, dtype=np.int64), "windows": np.empty((0, self.window_size), dtype=np.float32),
+                    "peaks": [], "rmssd": np.empty(0, dtype=np.float32)}
+
+        positions = np.concatenate(positions)
+        # Keep the last occurrence of positions that were tagged more than once
+        _, reversed_first = np.unique(positions[::-1], return_index=True)
+        latest = np.sort(len(positions) - 1 - reversed_first)
+
+        return {
+            "positions": positions[latest],
+            "windows": np.concatenate(windows)[latest],
+            "peaks": [peaks[row] for row in latest],
+            "rmssd": np.concatenate(rmssd)[latest],
+        }
+
+    def import_json(self, json_dir: str) -> int:
+        """Imports legacy per-window JSON tags of this record that are not in the store yet."""
+        if not os.path.isdir(json_dir):
+            return 0
+
+        imported = 0
+        for filename in sorted(os.listdir(json_dir)):
+            match = LEGACY_TAG_FILE_PATTERN.match(filename)
+            if not match or match["record"] != self.record_name or self.is_tagged(int(match["position"])):
+                continue
+
+            self.append(int(match["position"]), TaggedSignal.load_from_json(os.path.join(json_dir, filename)))
+            imported += 1
+
+        self.flush()
+        return imported
+
+    def _list_chunks(self) -> list[str]:
+        if not os.path.isdir(self.dir_path):
+            return []
+        return [os.path.join(self.dir_path, name) for name in sorted(os.listdir(self.dir_path))
+                if name.startswith("chunk_") and name.endswith(".npz")]
+
+    def _chunk_path(self, chunk_number: int) -> str:
+        return os.path.join(self.dir_path, f"chunk_{chunk_number:05d}.npz")
+
+    @staticmethod
+    def _chunk_length(chunk_path: str) -> int:
+        with np.load(chunk_path) as chunk:
+            return len(chunk["positions"])
+
+    @staticmethod
+    def _read_rows(chunk_path: str):
+        with np.load(chunk_path) as chunk:
+            peaks = np.split(chunk["peaks"], chunk["peak_offsets"][1:-1])
+            for position, window, row_peaks, rmssd in zip(chunk["positions"], chunk["windows"], peaks, chunk["rmssd"]):
+                yield int(position), window, row_peaks, float(rmssd)
+
+
+class TagWriter:
+    """
+    Applies appends to a TagStore on a background thread, so tagging never waits for the
+    disk. The open chunk is flushed once the queue drains, which batches bulk tagging into
+    a few writes. Tags appended in this session are served from memory, older ones are read
+    on the same thread as the writes, so reads see every queued tag and never wait on disk.
+    """
+    # Tags appended this session that are kept in memory for loading
+    RECENT_TAGS = 256
+
+    def __init__(self, tag_store: TagStore):
+        self.tag_store = tag_store
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tag-writer")
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.pending: set[int] = set()
+        self.recent: OrderedDict[int, TaggedSignal] = OrderedDict()
+
+    def append(self, position: int, tagged_signal: TaggedSignal) -> None:
+        with self.lock:
+            self.queued += 1
+            self.pending.add(position)
+            self.recent[position] = tagged_signal
+            self.recent.move_to_end(position)
+            while len(self.recent) > self.RECENT_TAGS:
+                self.recent.popitem(last=False)
+        self.executor.submit(self._write, position, tagged_signal)
+
+    def is_tagged(self, position: int) -> bool:
+        return position in self.pending or self.tag_store.is_tagged(position)
+
+    def load(self, position: int) -> Future:
+        """Returns a future of the tag at position, already resolved for tags appended this session."""
+        with self.lock:
+            tagged_signal = self.recent.get(position)
+        if tagged_signal is None:
+            return self.executor.submit(self.tag_store.load, position)
+
+        future = Future()
+        future.set_result(tagged_signal)
+        return future
+
+    def close(self) -> None:
+        """Waits for the queued tags to be written."""
+        self.executor.shutdown(wait=True)
+
+    def _write(self, position: int, tagged_signal: TaggedSignal) -> None:
+        # Nothing waits on the write, so failures are reported here
+        with profiler.section("tag.save"):
+            try:
+                self.tag_store.append(position, tagged_signal)
+            except Exception as error:
+                print(f"Could not save the tag of window {position}: {error}")
+
+            with self.lock:
+                self.queued -= 1
+                self.pending.discard(position)
+                drained = self.queued == 0
+
+            if drained:
+                try:
+                    self.tag_store.flush()
+                except OSError as error:
+                    print(f"Could not write tags to {self.tag_store.dir_path}: {error}")
+
+
+def import_json_tags(json_dir: str, root_dir: str, window_size: int, window_step: int) -> dict[str, int]:
+    """Imports every legacy JSON tag in json_dir into per-record stores, returning the count per record."""
+    record_names = sorted({match["record"] for match in map(LEGACY_TAG_FILE_PATTERN.match, os.listdir(json_dir)) if match})
+    return {record_name: TagStore(root_dir, record_name, window_size, window_step).import_json(json_dir)
+            for record_name in record_names}
@@ -1,13 +1,19 @@
 import os
 import json
-import matplotlib.pyplot as plt
+import numpy as np
 
-from typing import Callable
+from typing import Callable, TYPE_CHECKING
 
 from utils.metrics_calculations import calculate_rmssd
 
+# matplotlib is only imported once a window is tagged, it is slow to import and unused otherwise
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+
+
+def onclick_tagging(peaks: list[tuple[int, float]], ax: "plt.Axes") -> Callable:
+    import matplotlib.pyplot as plt
 
-def onclick_tagging(peaks: list[tuple[int, float]], ax: plt.Axes) -> Callable:
     original_xlim = ax.get_xlim()
     original_ylim = ax.get_ylim()
     # The actual event handler function
@@ -26,6 +32,42 @@ def onclick_tagging(peaks: list[tuple[int, float]], ax: plt.Axes) -> Callable:
 
     return handle_click
 
+def snap_to_peak(window: np.ndarray, sample: int, radius: int) -> int:
+    """Moves a clicked sample to the highest sample within `radius` of it."""
+    start, stop = max(0, sample - radius), min(len(window), sample + radius + 1)
+    return start + int(np.argmax(window[start:stop]))
+
+
+def toggle_peak(peaks: list[int], window: np.ndarray, sample: int, radius: int) -> list[int]:
+    """Removes the peak closest to a click within `radius`, otherwise adds the snapped peak."""
+    if peaks:
+        distances = np.abs(np.asarray(peaks) - sample)
+        closest = int(np.argmin(distances))
+        if distances[closest] <= radius:
+            return peaks[:closest] + peaks[closest + 1:]
+    return sorted(set(peaks) | {snap_to_peak(window, sample, radius)})
+
+
+def merge_peaks(primary, secondary, min_distance: int) -> list[int]:
+    """Adds the secondary peaks that are not within `min_distance` of a primary one."""
+    primary = sorted(int(peak) for peak in primary)
+    if len(primary) == 0:
+        return sorted(int(peak) for peak in secondary)
+
+    merged = list(primary)
+    for peak in secondary:
+        nearest = np.searchsorted(primary, peak)
+        neighbours = primary[max(0, nearest - 1):nearest + 1]
+        if all(abs(int(peak) - neighbour) > min_distance for neighbour in neighbours):
+            merged.append(int(peak))
+    return sorted(merged)
+
+
+def shift_peaks(peaks, offset: int, window_size: int) -> list[int]:
+    """Moves peaks of an overlapping window by `offset` samples, keeping the ones that fall inside."""
+    return [int(peak) - offset for peak in peaks if 0 <= int(peak) - offset < window_size]
+
+
 class TaggedSignal:
     def __init__(self, signal: list[float], peaks: list[tuple[int, float]] = [], rmssd: float = None):
         self.signal = signal
@@ -34,9 +76,9 @@ class TaggedSignal:
     
     def to_dict(self) -> dict:
         return {
-            "signal": self.signal,
-            "peaks": self.peaks,
-            "rmssd": self.rmssd
+            "signal": np.asarray(self.signal, dtype=float).tolist(),
+            "peaks": [int(peak) for peak in self.peaks],
+            "rmssd": None if self.rmssd is None else float(self.rmssd)
         }
     
     @classmethod
@@ -61,6 +103,8 @@ class TaggedSignal:
         return cls.from_dict(data)
     
     def tag_window(self, sampling_rate):
+        import matplotlib.pyplot as plt
+
         fig, ax = plt.subplots()
         plt.plot(self.signal)
         _ = fig.canvas.mpl_connect('button_press_event', onclick_tagging(self.peaks, ax))
@@ -0,0 +1,144 @@
+import json
+import os
+import numpy as np
+
+from typing import Iterator, Optional
+
+MANIFEST_NAME = "manifest.json"
+SHARD_FORMATS = ["npy", "tfrecord"]
+
+
+class ShardWriter:
+    """
+    Writes training examples into shards of up to `shard_size` windows. NumPy shards are a
+    float32 .npy file of windows, which readers memory-map, next to a small .npz of labels;
+    TFRecord shards hold one tf.train.Example per window. Finished shards are listed in the
+    manifest, which is written last so a partial export is never picked up.
+    """
+
+    def __init__(self, output_dir: str, window_size: int, shard_size: int = 4096, shard_format: str = "npy"):
+        if shard_format not in SHARD_FORMATS:
+            raise ValueError(f"Unknown shard format {shard_format!r}, available: {SHARD_FORMATS}")
+        self.output_dir = output_dir
+        self.window_size = window_size
+        self.shard_size = shard_size
+        self.shard_format = shard_format
+        self.shards: list[dict] = []
+        self.rows: list[tuple[np.ndarray, float, np.ndarray, str, int]] = []
+        os.makedirs(output_dir, exist_ok=True)
+
+    def add(self, window: np.ndarray, rmssd: float, peaks: np.ndarray, record: str, position: int) -> None:
+        self.rows.append((np.asarray(window, dtype=np.float32), float(rmssd), np.asarray(peaks, dtype=np.int32),
+                          record, int(position)))
+        if len(self.rows) >= self.shard_size:
+            self.write_shard()
+
+    def write_shard(self) -> None:
+        if not self.rows:
+            return
+
+        windows, rmssd, peaks, records, positions = zip(*self.rows)
+        name = f"shard_{len(self.shards):05d}"
+        if self.shard_format == "npy":
+            files = self._write_npy(name, np.stack(windows), np.array(rmssd, dtype=np.float32), peaks, records, positions)
+        else:
+            files = self._write_tfrecord(name, windows, rmssd, peaks, records, positions)
+
+        self.shards.append({"name": name, "files": files, "count": len(self.rows)})
+        self.rows = []
+
+    def close(self, **metadata) -> dict:
+        """Writes the last shard and the manifest, returning the manifest."""
+        self.write_shard()
+        manifest = {"format": self.shard_format, "window_size": self.window_size,
+                    "count": sum(shard["count"] for shard in self.shards), "shards": self.shards, **metadata}
+
+        manifest_path = os.path.join(self.output_dir, MANIFEST_NAME)
+        tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, manifest_path)
+        return manifest
+
+    def _write_npy(self, name: str, windows: np.ndarray, rmssd: np.ndarray, peaks, records, positions) -> list[str]:
+        windows_file, labels_file = f"{name}_windows.npy", f"{name}_labels.npz"
+        np.save(os.path.join(self.output_dir, windows_file), windows)
+        np.savez(os.path.join(self.output_dir, labels_file), rmssd=rmssd,
+                 peaks=np.concatenate(peaks).astype(np.int32),
+                 peak_offsets=np.cumsum([0] + [len(row_peaks) for row_peaks in peaks]).astype(np.int64),
+                 records=np.array(records), positions=np.array(positions, dtype=np.int64))
+        return [windows_file, labels_file]
+
+    def _write_tfrecord(self, name: str, windows, rmssd, peaks, records, positions) -> list[str]:
+        import tensorflow as tf
+
+        file_name = f"{name}.tfrecord"
+        with tf.io.TFRecordWriter(os.path.join(self.output_dir, file_name)) as writer:
+            for window, value, row_peaks, record, position in zip(windows, rmssd, peaks, records, positions):
+                features = {
+                    "window": tf.train.Feature(float_list=tf.train.FloatList(value=window)),
+                    "rmssd": tf.train.Feature(float_list=tf.train.FloatList(value=[value])),
+                    "peaks": tf.train.Feature(int64_list=tf.train.Int64List(value=row_peaks)),
+                    "record": tf.train.Feature(bytes_list=tf.train.BytesList(value=[record.encode()])),
+                    "position": tf.train.Feature(int64_list=tf.train.Int64List(value=[position])),
+                }
+                writer.write(tf.train.Example(features=tf.train.Features(feature=features)).SerializeToString())
+        return [file_name]
+
+
+def read_manifest(dataset_dir: str) -> dict:
+    with open(os.path.join(dataset_dir, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def iter_examples(dataset_dir: str, shuffle: bool = False, seed: Optional[int] = None) -> Iterator[tuple[np.ndarray, float]]:
+    """
+    Yields (window, rmssd) of a NumPy-sharded dataset one shard at a time. Windows are
+    memory-mapped, so only the pages of the current shard are ever read. Shuffling
+    permutes the shard order and the examples within each shard.
+    """
+    manifest = read_manifest(dataset_dir)
+    if manifest["format"] != "npy":
+        raise ValueError(f"iter_examples reads NumPy shards, {dataset_dir} holds {manifest['format']} shards")
+
+    rng = np.random.default_rng(seed)
+    shards = manifest["shards"]
+    for shard_number in (rng.permutation(len(shards)) if shuffle else range(len(shards))):
+        windows_file, labels_file = shards[shard_number]["files"]
+        windows = np.load(os.path.join(dataset_dir, windows_file), mmap_mode='r')
+        with np.load(os.path.join(dataset_dir, labels_file)) as labels:
+            rmssd = labels["rmssd"]
+
+        for row in (rng.permutation(len(rmssd)) if shuffle else range(len(rmssd))):
+            yield np.asarray(windows[row]), float(rmssd[row])
+
+
+def tf_dataset(dataset_dir: str, batch_size: int = 64, shuffle: bool = True, seed: Optional[int] = None):
+    """
+    Streams a sharded dataset into tf.data as batches of (windows[..., 1], rmssd), the shape
+    the E2E model takes. Nothing beyond the shards being read is held in memory.
+    """
+    import tensorflow as tf
+
+    manifest = read_manifest(dataset_dir)
+    window_size = manifest["window_size"]
+
+    if manifest["format"] == "tfrecord":
+        paths = [os.path.join(dataset_dir, shard["files"][0]) for shard in manifest["shards"]]
+        features = {"window": tf.io.FixedLenFeature([window_size], tf.float32),
+                    "rmssd": tf.io.FixedLenFeature([], tf.float32)}
+        dataset = tf.data.Dataset.from_tensor_slices(paths)
+        if shuffle:
+            dataset = dataset.shuffle(len(paths), seed=seed)
+        dataset = dataset.interleave(tf.data.TFRecordDataset, num_parallel_calls=tf.data.AUTOTUNE)
+        dataset = dataset.map(lambda record: tf.io.parse_single_example(record, features),
+                              num_parallel_calls=tf.data.AUTOTUNE)
+        dataset = dataset.map(lambda example: (example["window"][:, tf.newaxis], example["rmssd"]))
+        if shuffle:
+            dataset = dataset.shuffle(4 * batch_size, seed=seed)
+    else:
+        dataset = tf.data.Dataset.from_generator(
+            lambda: ((window[:, np.newaxis], rmssd) for window, rmssd in iter_examples(dataset_dir, shuffle, seed)),
+            output_signature=(tf.TensorSpec([window_size, 1], tf.float32), tf.TensorSpec([], tf.float32)))
+
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)